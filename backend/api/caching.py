@@ -0,0 +1,15 @@
+from __future__ import annotations
+
+"""HTTP 条件请求辅助函数。"""
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """按 RFC 9110 的弱比较判断 If-None-Match 是否命中。"""
+
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+"""按 Accept-Encoding 协商的流式响应压缩。
+
+gzip 由标准库 zlib 提供；安装了 zstandard 包时额外支持 zstd。每个数据块压缩后立即做一次块刷新，
+客户端无需等待整个响应结束即可开始解压。
+"""
+
+import zlib
+from typing import AsyncIterator, Callable
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+# 同等 q 值时按此顺序优先选择。
+SUPPORTED_ENCODINGS = ("zstd", "gzip") if zstandard is not None else ("gzip",)
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str | None:
+    """从 Accept-Encoding 中选出 q 值最高的受支持编码；都不可接受时返回 None（不压缩）。"""
+
+    if not accept_encoding:
+        return None
+    weights: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        weights[name.strip().lower()] = quality
+    wildcard = weights.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for encoding in SUPPORTED_ENCODINGS:
+        quality = weights.get(encoding, wildcard)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def _gzip_compressor() -> tuple[Callable[[bytes], bytes], Callable[[], bytes]]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return (
+        lambda data: compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH),
+        compressor.flush,
+    )
+
+
+def _zstd_compressor() -> tuple[Callable[[bytes], bytes], Callable[[], bytes]]:
+    compressor = zstandard.ZstdCompressor(level=3).compressobj()
+    return (
+        lambda data: compressor.compress(data) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+        compressor.flush,
+    )
+
+
+async def compress_stream(chunks: AsyncIterator[bytes], encoding: str | None) -> AsyncIterator[bytes]:
+    """逐块压缩（encoding 为 None 时原样转发），内存占用只与单个块的大小相关。"""
+
+    if encoding is None:
+        async for chunk in chunks:
+            yield chunk
+        return
+    compress, finish = _zstd_compressor() if encoding == "zstd" else _gzip_compressor()
+    async for chunk in chunks:
+        compressed = compress(chunk)
+        if compressed:
+            yield compressed
+    yield finish()
@@ -5,10 +5,35 @@ from __future__ import annotations
 接口返回的数据已经包含中文角色名，前端可直接展示。
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+from typing import Any, AsyncIterator, Iterator
 
-from backend.core.models import LifeStatus, Phase, RoleAssignment, RoleAttachment
-from backend.core.service import AuthorizationError, RoomPrincipal, RoomService
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+
+from backend.api.caching import etag_matches
+from backend.api.compression import compress_stream, negotiate_encoding
+from backend.core.config import get_settings
+from backend.core.encoding import dumps, wrap_frame
+from backend.core.commands import RoomCommandQueue
+from backend.core.events import RoomEventBus, RoomVersionWatcher
+from backend.core.models import (
+    ActionRecord,
+    LifeStatus,
+    Phase,
+    PlayerState,
+    RoleAssignment,
+    RoleAttachment,
+)
+from backend.core.patch import make_patch
+from backend.core.replay import RoomReplayCache
+from backend.core.service import (
+    AuthorizationError,
+    RoomCapacityError,
+    RoomNotFoundError,
+    RoomPrincipal,
+    RoomService,
+)
 from backend.core.users import UserStore
 from backend.schemas.rooms import (
     ActionRequest,
@@ -23,6 +48,8 @@ from backend.schemas.rooms import (
     NominationTotalRequest,
     PhaseChangeRequest,
     PlayerStatusRequest,
+    SpectateRoomRequest,
+    SpectateRoomResponse,
     UpdateSeatRequest,
     VoteRequest,
     ExecutionRequest,
@@ -31,18 +58,31 @@ from backend.security.auth import (
     AuthenticatedUser,
     create_token,
     principal_dependency,
+    stream_principal_dependency,
     user_dependency,
 )
-from backend.ws.rooms import RoomWebSocketManager
+from backend.ws.rooms import STATE_DIFF_MAX_OPS
+
+# 流式导出时每攒够这么多字节的 NDJSON 就压缩并发送一块。
+EXPORT_CHUNK_BYTES = 64 * 1024
 
 
 def create_rooms_router(
-    room_service: RoomService, ws_manager: RoomWebSocketManager, user_store: UserStore
+    room_service: RoomService,
+    event_bus: RoomEventBus,
+    user_store: UserStore,
+    commands: RoomCommandQueue,
+    replays: RoomReplayCache,
 ) -> APIRouter:
     router = APIRouter(prefix="/api/rooms", tags=["rooms"])
     # principal_dep 提供基于房间的鉴权依赖，减少重复代码。
     principal_dep = principal_dependency(room_service)
+    stream_principal_dep = stream_principal_dependency(room_service)
     require_user = user_dependency(user_store)
+    settings = get_settings()
+    # SSE 与长轮询共用的等待器：订阅事件总线，房间版本变化时唤醒挂起的请求。
+    watcher = RoomVersionWatcher()
+    event_bus.subscribe(watcher.notify)
 
     @router.post("", response_model=CreateRoomResponse)
     async def create_room(
@@ -52,11 +92,14 @@ def create_rooms_router(
         if not current_user.user.can_create_room:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="没有创建房间的权限")
         host_name = payload.host_name or current_user.user.nickname
-        room = room_service.create_room(
-            host_name,
-            host_user_id=current_user.user.id,
-            script_id=payload.script_id,
-        )
+        try:
+            room = room_service.create_room(
+                host_name,
+                host_user_id=current_user.user.id,
+                script_id=payload.script_id,
+            )
+        except RoomCapacityError as exc:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(exc)) from exc
         host_token = create_token(
             room.id,
             player_id=room.host_player_id,
@@ -75,40 +118,52 @@ def create_rooms_router(
         payload: JoinRoomRequest,
         current_user: AuthenticatedUser = Depends(require_user),
     ) -> JoinRoomResponse:
+        name = payload.name or current_user.user.nickname
         try:
-            room, player = room_service.join_room_by_code(
-                payload.code,
-                payload.name or current_user.user.nickname,
-                user_id=current_user.user.id,
+            room_id = room_service.resolve_join_code(payload.code)
+            player = await commands.submit(
+                room_id,
+                lambda: room_service.join_room(room_id, name, payload.code, user_id=current_user.user.id),
             )
         except AuthorizationError as exc:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(exc)) from exc
         player_token = create_token(
-            room.id,
+            room_id,
             player_id=player.id,
             seat=player.seat,
             role="host" if player.is_host else "player",
         )
-        await ws_manager.broadcast_state(room.id)
         return JoinRoomResponse(
-            room_id=room.id,
+            room_id=room_id,
             player_id=player.id,
             seat=player.seat,
             player_token=player_token,
         )
 
+    @router.post("/spectate", response_model=SpectateRoomResponse)
+    async def spectate_room(
+        payload: SpectateRoomRequest,
+        current_user: AuthenticatedUser = Depends(require_user),
+    ) -> SpectateRoomResponse:
+        try:
+            room = room_service.spectate_room_by_code(payload.code)
+        except AuthorizationError as exc:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(exc)) from exc
+        # 旁观者令牌不含 player_id，快照按公开视图脱敏。
+        spectator_token = create_token(room.id, player_id=None, seat=None, role="spectator")
+        return SpectateRoomResponse(room_id=room.id, spectator_token=spectator_token)
+
     @router.post("/{room_id}/join", response_model=JoinRoomResponse)
     async def join_room(
         room_id: str,
         payload: JoinRoomRequest,
         current_user: AuthenticatedUser = Depends(require_user),
     ) -> JoinRoomResponse:
+        name = payload.name or current_user.user.nickname
         try:
-            player = room_service.join_room(
+            player = await commands.submit(
                 room_id,
-                payload.name or current_user.user.nickname,
-                payload.code,
-                user_id=current_user.user.id,
+                lambda: room_service.join_room(room_id, name, payload.code, user_id=current_user.user.id),
             )
         except AuthorizationError as exc:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(exc)) from exc
@@ -118,7 +173,6 @@ def create_rooms_router(
             seat=player.seat,
             role="host" if player.is_host else "player",
         )
-        await ws_manager.broadcast_state(room_id)
         return JoinRoomResponse(
             room_id=room_id,
             player_id=player.id,
@@ -138,25 +192,97 @@ def create_rooms_router(
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="需要指定玩家")
         if payload.player_id and not principal.is_host:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="仅主持人可调整其他玩家的座位")
-        room = room_service.get_room(room_id)
-        if not principal.is_host and room.phase != Phase.LOBBY:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN, detail="仅在大厅阶段可自行调整座位"
-            )
-        try:
-            player = room_service.update_player_seat(
+
+        def update() -> PlayerState:
+            # 阶段检查与换座在同一条命令内完成，期间不会插入其他变更。
+            if not principal.is_host and room_service.get_room(room_id).phase != Phase.LOBBY:
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN, detail="仅在大厅阶段可自行调整座位"
+                )
+            return room_service.update_player_seat(
                 room_id, target_player_id, payload.seat, allow_override=principal.is_host
             )
+
+        try:
+            player = await commands.submit(room_id, update)
         except ValueError as exc:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
-        await ws_manager.broadcast_state(room_id)
         return {"seat": player.seat}
 
     @router.get("/{room_id}/state")
-    async def get_state(room_id: str, principal: RoomPrincipal = Depends(principal_dep)) -> dict:
+    async def get_state(
+        room_id: str,
+        principal: RoomPrincipal = Depends(principal_dep),
+        after_version: int | None = Query(None, ge=0, description="长轮询：等待房间版本超过该值后再返回"),
+        if_none_match: str | None = Header(None),
+    ) -> Response:
         ensure_same_room(room_id, principal)
-        # 对不同角色自动脱敏，避免玩家看到不该知道的信息。
-        return room_service.snapshot_for(room_id, principal)
+        ensure_undelayed_view(principal)
+        if after_version is not None and room_service.room_version(room_id) <= after_version:
+            # 长轮询：挂起直到房间变更或超时，超时后按未变化返回 304。
+            await watcher.wait(room_id, settings.long_poll_timeout_seconds)
+        version = room_service.room_version(room_id)
+        # 同一版本、同一视角的快照内容不变，ETag 由两者组成，命中时无需构建快照。
+        etag = f'"{version}:{principal.view_key}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        timed_out = after_version is not None and version <= after_version
+        if timed_out or etag_matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        # 对不同角色自动脱敏，避免玩家看到不该知道的信息；直接复用 WS 广播的编码结果。
+        return Response(
+            content=room_service.encoded_snapshot_for(room_id, principal),
+            media_type="application/json",
+            headers=headers,
+        )
+
+    @router.get("/{room_id}/events")
+    async def events(
+        room_id: str,
+        principal: RoomPrincipal = Depends(stream_principal_dep),
+        last_event_id: str | None = Header(None),
+    ) -> StreamingResponse:
+        ensure_same_room(room_id, principal)
+        ensure_undelayed_view(principal)
+        # EventSource 断线重连时带上最后收到的版本号，尽量只补发增量。
+        since = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+        return StreamingResponse(
+            room_event_stream(room_id, principal, since),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    async def room_event_stream(
+        room_id: str, principal: RoomPrincipal, since: int | None
+    ) -> AsyncIterator[bytes]:
+        """SSE 消息与 WebSocket 相同：首条为 snapshot，之后为 state_diff，事件 id 为房间版本号。"""
+
+        base = room_service.snapshot_at(room_id, principal, since) if since is not None else None
+        version = since if base is not None else None
+        try:
+            while True:
+                current = room_service.room_version(room_id)
+                if current == version:
+                    if not await watcher.wait(room_id, settings.sse_keepalive_seconds):
+                        yield b": keepalive\n\n"
+                    continue
+                snapshot = room_service.snapshot_for(room_id, principal)
+                patch = make_patch(base, snapshot) if base is not None else None
+                if patch is not None and len(patch) <= STATE_DIFF_MAX_OPS:
+                    data = dumps(
+                        {
+                            "type": "state_diff",
+                            "base_version": version,
+                            "version": current,
+                            "patch": patch,
+                        }
+                    )
+                else:
+                    encoded = room_service.encoded_snapshot_for(room_id, principal)
+                    data = wrap_frame("snapshot", encoded, version=current)
+                yield b"id: %d\ndata: %b\n\n" % (current, data)
+                base, version = snapshot, current
+        except RoomNotFoundError:
+            return
 
     @router.post("/{room_id}/assign")
     async def assign_roles(
@@ -178,15 +304,17 @@ def create_rooms_router(
                 for seat, assignment in payload.assignments.items()
             }
         try:
-            assignments = room_service.assign_roles(
+            assignments = await commands.submit(
                 room_id,
-                seed=payload.seed,
-                assignments=assignment_objects,
-                finalize=payload.finalize,
+                lambda: room_service.assign_roles(
+                    room_id,
+                    seed=payload.seed,
+                    assignments=assignment_objects,
+                    finalize=payload.finalize,
+                ),
             )
         except ValueError as exc:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
-        await ws_manager.broadcast_state(room_id)
         return {
             "assignments": {
                 str(seat): {
@@ -213,10 +341,9 @@ def create_rooms_router(
         except ValueError as exc:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid phase") from exc
         try:
-            new_phase = room_service.change_phase(room_id, to_phase)
+            new_phase = await commands.submit(room_id, lambda: room_service.change_phase(room_id, to_phase))
         except ValueError as exc:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
-        await ws_manager.broadcast_state(room_id)
         return {"phase": new_phase.value}
 
     @router.post("/{room_id}/reset")
@@ -224,8 +351,7 @@ def create_rooms_router(
         room_id: str, principal: RoomPrincipal = Depends(principal_dep)
     ) -> dict:
         ensure_host(principal)
-        room_service.reset_room(room_id)
-        await ws_manager.broadcast_state(room_id)
+        await commands.submit(room_id, lambda: room_service.reset_room(room_id))
         return {"status": "ok"}
 
     @router.post("/{room_id}/result")
@@ -236,10 +362,11 @@ def create_rooms_router(
     ) -> dict:
         ensure_host(principal)
         try:
-            result = room_service.set_game_result(room_id, payload.result)
+            result = await commands.submit(
+                room_id, lambda: room_service.set_game_result(room_id, payload.result)
+            )
         except ValueError as exc:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
-        await ws_manager.broadcast_state(room_id)
         return {"result": result}
 
     @router.post("/{room_id}/nominate")
@@ -251,12 +378,12 @@ def create_rooms_router(
         ensure_same_room(room_id, principal)
         ensure_host(principal)
         try:
-            nomination = room_service.add_nomination(
-                room_id, payload.nominee_seat, payload.nominator_seat
+            nomination = await commands.submit(
+                room_id,
+                lambda: room_service.add_nomination(room_id, payload.nominee_seat, payload.nominator_seat),
             )
         except ValueError as exc:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
-        await ws_manager.broadcast_state(room_id)
         return {"id": nomination.id}
 
     @router.post("/{room_id}/nominations/{nomination_id}/start")
@@ -268,10 +395,12 @@ def create_rooms_router(
         ensure_same_room(room_id, principal)
         ensure_host(principal)
         try:
-            session = room_service.start_vote(room_id, nomination_id)
+            # 投票开始后需尽快告知首位投票者，跳过合并窗口。
+            session = await commands.submit(
+                room_id, lambda: room_service.start_vote(room_id, nomination_id), flush=True
+            )
         except ValueError as exc:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
-        await ws_manager.broadcast_state(room_id)
         return {"nomination_id": session.nomination_id}
 
     @router.post("/{room_id}/nominations/{nomination_id}/revert")
@@ -283,10 +412,9 @@ def create_rooms_router(
         ensure_same_room(room_id, principal)
         ensure_host(principal)
         try:
-            room_service.revert_nomination(room_id, nomination_id)
+            await commands.submit(room_id, lambda: room_service.revert_nomination(room_id, nomination_id))
         except ValueError as exc:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
-        await ws_manager.broadcast_state(room_id)
         return {"status": "ok"}
 
     @router.post("/{room_id}/nominations/{nomination_id}/total")
@@ -299,10 +427,11 @@ def create_rooms_router(
         ensure_same_room(room_id, principal)
         ensure_host(principal)
         try:
-            room_service.update_nomination_total(room_id, nomination_id, payload.total)
+            await commands.submit(
+                room_id, lambda: room_service.update_nomination_total(room_id, nomination_id, payload.total)
+            )
         except ValueError as exc:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
-        await ws_manager.broadcast_state(room_id)
         return {"status": "ok"}
 
     @router.post("/{room_id}/vote")
@@ -318,12 +447,16 @@ def create_rooms_router(
         if payload.player_id and not principal.is_host:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="仅主持人可代投")
         try:
-            vote = room_service.record_vote(
-                room_id, payload.nomination_id, target_player_id, payload.value
+            # 当前投票者已切换，立即广播让下一位玩家尽快操作。
+            vote = await commands.submit(
+                room_id,
+                lambda: room_service.record_vote(
+                    room_id, payload.nomination_id, target_player_id, payload.value
+                ),
+                flush=True,
             )
         except ValueError as exc:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
-        await ws_manager.broadcast_state(room_id)
         return {"id": vote.id}
 
     @router.post("/{room_id}/players/{player_id}/status")
@@ -340,10 +473,11 @@ def create_rooms_router(
         except ValueError as exc:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="未知状态") from exc
         try:
-            player = room_service.set_player_status(room_id, player_id, status_enum)
+            player = await commands.submit(
+                room_id, lambda: room_service.set_player_status(room_id, player_id, status_enum)
+            )
         except ValueError as exc:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
-        await ws_manager.broadcast_state(room_id)
         return {"status": player.life_status.value}
 
     @router.post("/{room_id}/execution")
@@ -355,12 +489,14 @@ def create_rooms_router(
         ensure_same_room(room_id, principal)
         ensure_host(principal)
         try:
-            record = room_service.set_execution_result(
-                room_id, payload.nomination_id, payload.executed_seat
+            record = await commands.submit(
+                room_id,
+                lambda: room_service.set_execution_result(
+                    room_id, payload.nomination_id, payload.executed_seat
+                ),
             )
         except ValueError as exc:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
-        await ws_manager.broadcast_state(room_id)
         return {
             "day": record.day,
             "nomination_id": record.nomination_id,
@@ -376,33 +512,78 @@ def create_rooms_router(
         ensure_same_room(room_id, principal)
         if principal.seat is None and not principal.is_host:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Seat required")
-        room = room_service.get_room(room_id)
-        night = room.night if room.phase == Phase.NIGHT else max(room.night, 1)
-        action = room_service.record_action(
-            room_id,
-            night=night,
-            actor_seat=principal.seat or 0,
-            action_type=payload.type,
-            target=payload.target,
-            payload=payload.payload or {},
-        )
-        await ws_manager.broadcast_state(room_id)
+
+        def record() -> ActionRecord:
+            room = room_service.get_room(room_id)
+            night = room.night if room.phase == Phase.NIGHT else max(room.night, 1)
+            return room_service.record_action(
+                room_id,
+                night=night,
+                actor_seat=principal.seat or 0,
+                action_type=payload.type,
+                target=payload.target,
+                payload=payload.payload or {},
+            )
+
+        action = await commands.submit(room_id, record)
         return {"id": action.id}
 
     @router.get("/{room_id}/logs", response_model=list[dict])
     async def logs(
         room_id: str,
+        after: int | None = Query(None, ge=0, description="游标：上一页最后一条日志的 id"),
+        limit: int = Query(200, ge=1, le=1000),
+        kind: str | None = None,
+        day: int | None = None,
+        seat: int | None = None,
         principal: RoomPrincipal = Depends(principal_dep),
     ) -> list[dict]:
+        # 主持人轮询日志尾部时携带最后一条的 id 作为 after，只取新增条目；返回条数等于 limit 表示还有下一页。
+        ensure_same_room(room_id, principal)
         ensure_host(principal)
-        snapshot = room_service.log_export(room_id)
-        return snapshot["logs"]
+        return room_service.log_page(room_id, after=after, limit=limit, kind=kind, day=day, seat=seat)
 
-    @router.post("/{room_id}/export", response_model=ExportResponse)
+    @router.get("/{room_id}/replay")
+    async def replay(
+        room_id: str,
+        at: int = Query(..., ge=0, description="回放到该日志 id（含）为止"),
+        principal: RoomPrincipal = Depends(principal_dep),
+    ) -> dict:
+        # 回放快照为主持人视角（包含全部身份），仅主持人可用。
+        ensure_same_room(room_id, principal)
+        ensure_host(principal)
+        return replays.snapshot_at(room_id, at)
+
+    @router.get("/{room_id}/export")
+    async def export_stream(
+        room_id: str,
+        principal: RoomPrincipal = Depends(principal_dep),
+        accept_encoding: str | None = Header(None),
+    ) -> StreamingResponse:
+        """以 NDJSON 流式导出：首行为房间信息，之后每行一条日志，按 Accept-Encoding 压缩。"""
+
+        ensure_same_room(room_id, principal)
+        ensure_host(principal)
+        records = room_service.iter_log_export(room_id)
+        encoding = negotiate_encoding(accept_encoding)
+        headers = {
+            "Content-Disposition": f'attachment; filename="room-{room_id}.ndjson"',
+            "Vary": "Accept-Encoding",
+        }
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        return StreamingResponse(
+            compress_stream(ndjson_chunks(records), encoding),
+            media_type="application/x-ndjson",
+            headers=headers,
+        )
+
+    @router.post("/{room_id}/export", response_model=ExportResponse, deprecated=True)
     async def export(
         room_id: str,
         principal: RoomPrincipal = Depends(principal_dep),
     ) -> ExportResponse:
+        ensure_same_room(room_id, principal)
         ensure_host(principal)
         data = room_service.log_export(room_id)
         return ExportResponse(**data)
@@ -410,11 +591,31 @@ def create_rooms_router(
     return router
 
 
+async def ndjson_chunks(records: Iterator[dict[str, Any]]) -> AsyncIterator[bytes]:
+    buffer = bytearray()
+    for record in records:
+        buffer += dumps(record)
+        buffer += b"\n"
+        if len(buffer) >= EXPORT_CHUNK_BYTES:
+            yield bytes(buffer)
+            buffer.clear()
+            # 长日志导出期间让出事件循环，不阻塞其他请求。
+            await asyncio.sleep(0)
+    if buffer:
+        yield bytes(buffer)
+
+
 def ensure_same_room(room_id: str, principal: RoomPrincipal) -> None:
     if principal.room_id != room_id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access to room denied")
 
 
+def ensure_undelayed_view(principal: RoomPrincipal) -> None:
+    if principal.is_spectator and get_settings().public_view_delay_seconds > 0:
+        # 开启观战延迟时旁观者只能经由 WebSocket 公开频道获取状态，避免通过 REST / SSE 绕过延迟。
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="观战延迟已开启，请通过实时频道获取状态")
+
+
 def ensure_host(principal: RoomPrincipal) -> None:
     if not principal.is_host:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Host privileges required")
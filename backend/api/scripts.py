@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+"""剧本数据 API。
+
+快照只引用剧本 ID 与版本，完整剧本（含全部角色说明）由此接口提供，
+响应带 ETag，客户端可用 If-None-Match 复用本地缓存。
+"""
+
+from fastapi import APIRouter, Header, HTTPException, Query, Response, status
+
+from backend.api.caching import etag_matches
+from backend.core.scripts import encoded_script
+
+
+def create_scripts_router() -> APIRouter:
+    router = APIRouter(prefix="/api/scripts", tags=["scripts"])
+
+    @router.get("/{script_id}")
+    async def get_script(
+        script_id: str,
+        players: int | None = Query(None, ge=0, description="玩家人数，提供时附带对应的阵营人数"),
+        locale: str | None = Query(None, description="角色名称使用的语言，如 zh_CN"),
+        if_none_match: str | None = Header(None),
+    ) -> Response:
+        try:
+            encoded = encoded_script(script_id, players, locale)
+        except KeyError as exc:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="剧本不存在") from exc
+        headers = {"ETag": encoded.etag, "Cache-Control": "no-cache"}
+        if etag_matches(if_none_match, encoded.etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(content=encoded.data, media_type="application/json", headers=headers)
+
+    return router
+
@@ -2,28 +2,95 @@ from __future__ import annotations
 
 """FastAPI 应用入口。"""
 
+from contextlib import asynccontextmanager
 from pathlib import Path
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 
 from backend.api.auth import create_auth_router
 from backend.api.rooms import create_rooms_router
+from backend.api.scripts import create_scripts_router
+from backend.core.commands import RoomCommandQueue
 from backend.core.config import get_settings
+from backend.core.events import create_event_bus
+from backend.core.journal import RoomJournal
+from backend.core.lifecycle import RoomSweeper
 from backend.core.registration import RegistrationCodeStore
-from backend.core.service import RoomService
+from backend.core.replay import RoomReplayCache
+from backend.core.service import RoomNotFoundError, RoomService
+from backend.core.sharding import ShardSpec
 from backend.core.users import UserStore
 from backend.security.auth import principal_from_token
-from backend.ws.rooms import RoomWebSocketManager
+from backend.ws.rooms import CLOSE_ROOM_CLOSED, RoomWebSocketManager
 
 settings = get_settings()
 user_store = UserStore(Path(settings.user_db_path))
 code_store = RegistrationCodeStore(Path(settings.registration_codes_path))
-room_service = RoomService()
-ws_manager = RoomWebSocketManager(room_service)
+shard = ShardSpec(settings.shard_index, settings.shard_count) if settings.shard_count > 1 else None
+journal = None
+if settings.room_journal_path:
+    journal_path = Path(settings.room_journal_path)
+    if shard is not None:
+        # 每个分片使用独立的 journal，恢复时只载入本分片的房间。
+        journal_path = journal_path.with_stem(f"{journal_path.stem}-{shard.index}")
+    journal = RoomJournal(journal_path, flush_interval=settings.journal_flush_ms / 1000)
+room_service = RoomService(
+    replay_buffer_size=settings.replay_buffer_size,
+    replay_buffer_bytes=settings.replay_buffer_bytes,
+    max_rooms=settings.max_rooms,
+    journal=journal,
+    checkpoint_every=settings.room_checkpoint_every,
+    shard=shard,
+)
+ws_manager = RoomWebSocketManager(
+    room_service,
+    coalesce_window=settings.broadcast_coalesce_ms / 1000,
+    send_queue_size=settings.ws_send_queue_size,
+    max_send_lag=settings.ws_max_send_lag_seconds,
+    heartbeat_interval=settings.ws_heartbeat_interval,
+    heartbeat_timeout=settings.ws_heartbeat_timeout,
+    max_connections=settings.ws_max_connections,
+    max_connections_per_room=settings.ws_max_connections_per_room,
+    max_spectators_per_room=settings.ws_max_spectators_per_room,
+    public_view_delay=settings.public_view_delay_seconds,
+)
+event_bus = create_event_bus(redis_url=settings.redis_url, socket_path=settings.event_bus_socket)
+event_bus.subscribe(ws_manager.handle_room_changed)
+room_commands = RoomCommandQueue(room_service, event_bus)
+room_replays = RoomReplayCache(room_service, checkpoint_every=settings.replay_checkpoint_every)
+room_sweeper = RoomSweeper(
+    room_service,
+    idle_ttl=settings.room_idle_ttl_seconds,
+    finished_ttl=settings.room_finished_ttl_seconds,
+    interval=settings.room_sweep_interval_seconds,
+)
+room_sweeper.subscribe(ws_manager.close_room)
+room_sweeper.subscribe(room_replays.forget)
 
-app = FastAPI(title="Blood on the Clocktower Assistant", version="0.1.0")
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    # 先从 journal 恢复上次进程中的房间，再开始接受连接。
+    room_service.recover()
+    if journal is not None:
+        await journal.start()
+    await event_bus.start()
+    await ws_manager.start()
+    await room_sweeper.start()
+    try:
+        yield
+    finally:
+        await room_sweeper.stop()
+        await ws_manager.stop()
+        await event_bus.stop()
+        if journal is not None:
+            await journal.stop()
+
+
+app = FastAPI(title="Blood on the Clocktower Assistant", version="0.1.0", lifespan=lifespan)
 
 if settings.cors_origins:
     app.add_middleware(
@@ -34,8 +101,16 @@ if settings.cors_origins:
         allow_headers=["*"],
     )
 
+
+@app.exception_handler(RoomNotFoundError)
+async def room_not_found_handler(_: Request, __: RoomNotFoundError) -> JSONResponse:
+    # 房间可能已因空闲过期被回收，持有旧令牌的客户端收到 404 后应返回首页。
+    return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"detail": "房间不存在或已关闭"})
+
+
 app.include_router(create_auth_router(user_store, code_store))
-app.include_router(create_rooms_router(room_service, ws_manager, user_store))
+app.include_router(create_rooms_router(room_service, event_bus, user_store, room_commands, room_replays))
+app.include_router(create_scripts_router())
 
 
 @app.get("/health")
@@ -43,6 +118,11 @@ async def health() -> dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+async def metrics() -> dict[str, int]:
+    return {**ws_manager.metrics(), **room_sweeper.metrics(), **room_commands.metrics()}
+
+
 frontend_dist = Path(__file__).resolve().parent.parent / "frontend" / "dist"
 if frontend_dist.exists():
     app.mount("/", StaticFiles(directory=str(frontend_dist), html=True), name="spa")
@@ -56,13 +136,21 @@ async def websocket_endpoint(room_id: str, websocket: WebSocket):
         return
     try:
         principal = principal_from_token(room_service, token)
+    except RoomNotFoundError:
+        # 房间已被回收：完成握手后以 4410 关闭，客户端据此停止重连，而不是当作令牌无效。
+        await websocket.accept()
+        await websocket.close(code=CLOSE_ROOM_CLOSED)
+        return
     except Exception:  # pragma: no cover - network scenario
         await websocket.close(code=4401)
         return
     if principal.room_id != room_id:
         await websocket.close(code=4403)
         return
+    # 断线重连时客户端携带已持有的快照版本号，服务器尽量只补发增量。
+    since_param = websocket.query_params.get("since")
+    since = int(since_param) if since_param and since_param.isdigit() else None
     try:
-        await ws_manager.handle_client(websocket, principal)
+        await ws_manager.handle_client(websocket, principal, since=since)
     except WebSocketDisconnect:
         await ws_manager.disconnect(websocket)
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+"""房间命令队列基准。
+
+模拟大量并发请求同时修改房间：单个热点房间上的突发投票，以及分散在多个房间上的并发变更。
+统计每秒执行的命令数，以及命令数与实际发布的变更事件（广播）数之比。
+
+运行：python -m backend.benchmarks.commands [--rooms 200] [--commands 50]
+"""
+
+import argparse
+import asyncio
+import time
+
+from backend.core.commands import RoomCommandQueue
+from backend.core.events import InMemoryEventBus, RoomChanged
+from backend.core.service import RoomService
+
+
+class _CountingSubscriber:
+    def __init__(self) -> None:
+        self.events = 0
+
+    def __call__(self, _: RoomChanged) -> None:
+        self.events += 1
+
+
+async def _run(service: RoomService, room_ids: list[str], commands_per_room: int) -> tuple[int, int, float]:
+    bus = InMemoryEventBus()
+    counter = _CountingSubscriber()
+    bus.subscribe(counter)
+    queue = RoomCommandQueue(service, bus)
+
+    def act(room_id: str, index: int) -> None:
+        service.record_action(room_id, 1, index % 10 + 1, "check", index % 10 + 1, {})
+
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            queue.submit(room_id, lambda room_id=room_id, index=index: act(room_id, index))
+            for index in range(commands_per_room)
+            for room_id in room_ids
+        )
+    )
+    elapsed = time.perf_counter() - start
+    return len(room_ids) * commands_per_room, counter.events, elapsed
+
+
+def _setup(rooms: int) -> tuple[RoomService, list[str]]:
+    service = RoomService()
+    room_ids = []
+    for _ in range(rooms):
+        room = service.create_room("host", host_user_id=0)
+        for index in range(10):
+            service.join_room(room.id, f"player-{index + 1}", room.join_code)
+        room_ids.append(room.id)
+    return service, room_ids
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="房间命令队列基准")
+    parser.add_argument("--rooms", type=int, default=200)
+    parser.add_argument("--commands", type=int, default=50, help="每个房间的并发命令数")
+    args = parser.parse_args()
+
+    for label, rooms, commands in (
+        ("单房间突发", 1, args.rooms * args.commands),
+        ("多房间并发", args.rooms, args.commands),
+    ):
+        service, room_ids = _setup(rooms)
+        total, events, elapsed = asyncio.run(_run(service, room_ids, commands))
+        print(
+            f"{label:<8} {rooms} 个房间 × {commands} 条命令：{total / elapsed:10.0f} 命令/秒，"
+            f"发布 {events} 次变更事件（{total / max(events, 1):.1f} 条命令/次）"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+"""房间内存占用基准。
+
+用 tracemalloc 统计若干房间各自打完一整局游戏（见 recovery.play_game）后常驻的内存，
+按房间平均，并列出单条投票 / 日志 / 行动记录的大小。
+
+作为对照，随后把这些记录原地换成旧的记录格式（普通 dataclass 实例带 __dict__、uuid 十六进制 ID、
+datetime 时间戳、每条记录各自持有的 room_id 字符串）再统计一次，其余房间数据保持不变。
+
+运行：python -m backend.benchmarks.memory [--rooms 200] [--players 12] [--days 8]
+"""
+
+import argparse
+import gc
+import tracemalloc
+import uuid
+from dataclasses import fields, make_dataclass
+from datetime import datetime
+from typing import Any
+
+from backend.benchmarks.recovery import play_game
+from backend.core.models import ActionRecord, LogEntry, RoomState, VoteRecord
+from backend.core.service import RoomService
+
+_LEGACY_CLASSES = {
+    cls: make_dataclass(f"Legacy{cls.__name__}", [(item.name, Any) for item in fields(cls)])
+    for cls in (VoteRecord, LogEntry, ActionRecord)
+}
+
+
+def _record_size(record: object, shared: set[int]) -> int:
+    """单条记录自身及其独占的字段对象的大小（不含 payload 内容与房间内共享的 ID 字符串）。"""
+
+    size = record.__sizeof__()
+    if hasattr(record, "__dict__"):
+        size += record.__dict__.__sizeof__()
+    for name in _field_names(record):
+        value = getattr(record, name)
+        if id(value) in shared or isinstance(value, (bool, type(None))) or name == "payload":
+            continue
+        size += value.__sizeof__()
+    return size
+
+
+def _field_names(record: object) -> list[str]:
+    slots = getattr(type(record), "__slots__", None)
+    if slots:
+        return list(slots)
+    return list(vars(record))
+
+
+def _to_legacy(record: Any) -> Any:
+    values = {item.name: getattr(record, item.name) for item in fields(record)}
+    values["id"] = uuid.uuid4().hex
+    # 旧代码直接保存请求参数中的 room_id，每条记录各是一个字符串对象。
+    values["room_id"] = values["room_id"].encode().decode()
+    values["ts"] = datetime.fromtimestamp(values["ts"] / 1000)
+    return _LEGACY_CLASSES[type(record)](**values)
+
+
+def _convert_to_legacy(room: RoomState) -> None:
+    for bucket in room.votes.values():
+        bucket.votes[:] = map(_to_legacy, bucket.votes)
+    room.actions[:] = map(_to_legacy, room.actions)
+    # 只替换日志分段中的条目，分段与索引结构保持不变。
+    for segment in room.logs._segments:
+        segment[:] = map(_to_legacy, segment)
+
+
+def _print_records(room: RoomState) -> None:
+    # 与房间 / 玩家 / 提名共享的字符串不计入单条记录。
+    shared = {id(room.id), *map(id, room.players), *map(id, room.nominations)}
+    vote = next(vote for bucket in room.votes.values() for vote in bucket.votes)
+    for label, record in (("投票", vote), ("日志", room.logs[-1]), ("行动", room.actions[-1])):
+        print(f"  单条{label}记录：{_record_size(record, shared):5d} 字节")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="房间内存占用基准")
+    parser.add_argument("--rooms", type=int, default=200)
+    parser.add_argument("--players", type=int, default=12)
+    parser.add_argument("--days", type=int, default=8)
+    args = parser.parse_args()
+
+    service = RoomService()
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    for _ in range(args.rooms):
+        play_game(service, args.players, args.days)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - baseline
+    room = next(iter(service.list_rooms()))
+    records = sum(len(bucket.votes) for bucket in room.votes.values()) + len(room.logs) + len(room.actions)
+    print(f"{args.rooms} 个房间（{args.players} 名玩家、{args.days} 天，每房间 {records} 条记录）：")
+    print(f"当前记录格式：{used / args.rooms / 1024:8.1f} KiB/房间")
+    _print_records(room)
+
+    for each in service.list_rooms():
+        _convert_to_legacy(each)
+    gc.collect()
+    legacy_used = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    print(f"旧记录格式：  {legacy_used / args.rooms / 1024:8.1f} KiB/房间")
+    _print_records(room)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+"""持久化恢复基准。
+
+在临时目录中用 journal 记录若干房间完整的一局游戏（加入、分配角色、夜晚行动、提名投票、处决），
+然后分别测量“纯 journal 重放”和“检查点 + journal 尾部”两种情况下重启恢复全部房间的耗时，
+并校验恢复后的快照与崩溃前一致。
+
+运行：python -m backend.benchmarks.recovery [--rooms 1000] [--players 10] [--days 3]
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from backend.core.journal import RoomJournal
+from backend.core.models import LifeStatus, Phase
+from backend.core.service import RoomPrincipal, RoomService
+
+
+def play_game(service: RoomService, player_count: int, days: int) -> str:
+    room = service.create_room("host", host_user_id=0)
+    players = [
+        service.join_room(room.id, f"player-{index + 1}", room.join_code) for index in range(player_count)
+    ]
+    service.assign_roles(room.id, seed=room.id)
+    service.assign_roles(room.id, finalize=True)
+    for day in range(days):
+        service.change_phase(room.id, Phase.NIGHT)
+        for player in players:
+            service.record_action(room.id, room.night, player.seat, "check", (player.seat % player_count) + 1, {})
+        service.change_phase(room.id, Phase.DAY)
+        nominee = players[day % player_count]
+        nomination = service.add_nomination(room.id, nominee.seat, players[-1 - day % player_count].seat)
+        session = service.start_vote(room.id, nomination.id)
+        while not session.finished:
+            voter = session.current_player_id()
+            assert voter is not None
+            service.record_vote(room.id, nomination.id, voter, value=len(session.votes) % 2 == 0)
+        service.set_execution_result(room.id, nomination.id, nominee.seat)
+        service.set_player_status(room.id, nominee.id, LifeStatus.DEAD_VOTE)
+        # 经由 DAY_END 进入下一夜，白天计数才会递增（直接 DAY -> NIGHT 视为回退）。
+        service.change_phase(room.id, Phase.DAY_END)
+    service.set_game_result(room.id, "blue")
+    return room.id
+
+
+def _host_snapshots(service: RoomService) -> dict[str, object]:
+    snapshots = {}
+    for room in service.list_rooms():
+        host = RoomPrincipal(room_id=room.id, player_id=room.host_player_id, seat=0, is_host=True)
+        snapshots[room.id] = service.snapshot_for(room.id, host)
+    return snapshots
+
+
+def _measure(path: Path, expected: dict[str, object]) -> float:
+    journal = RoomJournal(path)
+    start = time.perf_counter()
+    service = RoomService(journal=journal)
+    recovered = service.recover()
+    elapsed = time.perf_counter() - start
+    assert recovered == len(expected), (recovered, len(expected))
+    assert _host_snapshots(service) == expected, "恢复后的快照与崩溃前不一致"
+    journal.close()
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="持久化恢复基准")
+    parser.add_argument("--rooms", type=int, default=1000)
+    parser.add_argument("--players", type=int, default=10)
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--checkpoint-every", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for label, checkpoint_every in (
+            ("纯 journal 重放", 10**9),
+            ("检查点 + 尾部", args.checkpoint_every),
+        ):
+            path = Path(directory) / f"rooms-{checkpoint_every}.db"
+            journal = RoomJournal(path)
+            service = RoomService(journal=journal, checkpoint_every=checkpoint_every)
+            start = time.perf_counter()
+            for _ in range(args.rooms):
+                play_game(service, args.players, args.days)
+            journal.flush()
+            recorded = time.perf_counter() - start
+            expected = _host_snapshots(service)
+            entries = journal._conn.execute("SELECT COUNT(*) FROM journal").fetchone()[0]
+            journal.close()
+
+            elapsed = _measure(path, expected)
+            print(
+                f"{label:<14} {args.rooms} 个房间，记录 {recorded:6.2f}s，磁盘上 {entries} 条 journal；"
+                f"恢复 {elapsed:6.2f}s（{elapsed / args.rooms * 1000:.2f} ms/房间）"
+            )
+
+
+if __name__ == "__main__":
+    main()
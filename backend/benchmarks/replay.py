@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+"""日志回放跳转基准。
+
+打一局约 5000 条日志的长对局，然后在随机位置跳转回放，对比“每次从头重放”与“检查点 + 剩余条目”
+两种方式的平均耗时，并校验：回放到最后一条日志的快照与房间实时快照一致，两种方式在同一位置的快照一致。
+
+运行：python -m backend.benchmarks.replay [--events 5000] [--players 15] [--seeks 200] [--checkpoint-every 100]
+"""
+
+import argparse
+import random
+import time
+from typing import Callable
+
+from backend.benchmarks.recovery import play_game
+from backend.core.replay import RoomReplay, RoomReplayCache
+from backend.core.service import RoomPrincipal, RoomService
+
+# play_game 中每个游戏日大约产生的日志条数（每人一次夜晚行动、一轮投票，外加阶段切换等）。
+_ENTRIES_PER_DAY_PER_PLAYER = 2.5
+
+
+def _without_version(snapshot: dict) -> dict:
+    return {**snapshot, "room": {key: value for key, value in snapshot["room"].items() if key != "version"}}
+
+
+def _average_ms(seek: Callable[[int], object], log_ids: list[int]) -> float:
+    start = time.perf_counter()
+    for log_id in log_ids:
+        seek(log_id)
+    return (time.perf_counter() - start) / len(log_ids) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="日志回放跳转基准")
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--players", type=int, default=15)
+    parser.add_argument("--seeks", type=int, default=200)
+    parser.add_argument("--checkpoint-every", type=int, default=100)
+    args = parser.parse_args()
+
+    service = RoomService()
+    days = max(1, round(args.events / (args.players * _ENTRIES_PER_DAY_PER_PLAYER)))
+    room_id = play_game(service, args.players, days)
+    room = service.get_room(room_id)
+    log_ids = [entry.id for entry in room.logs]
+    targets = random.Random(0).choices(log_ids, k=args.seeks)
+
+    full = RoomReplayCache(service, checkpoint_every=len(log_ids) + 1)
+    indexed = RoomReplayCache(service, checkpoint_every=args.checkpoint_every)
+
+    host = RoomPrincipal(room_id=room_id, player_id=room.host_player_id, seat=0, is_host=True)
+    final = indexed.snapshot_at(room_id, log_ids[-1])["snapshot"]
+    assert _without_version(final) == _without_version(service.snapshot_for(room_id, host)), "回放终点与实时快照不一致"
+    for log_id in targets[:20]:
+        assert full.snapshot_at(room_id, log_id) == indexed.snapshot_at(room_id, log_id), log_id
+
+    build_start = time.perf_counter()
+    indexed = RoomReplayCache(service, checkpoint_every=args.checkpoint_every)
+    indexed.snapshot_at(room_id, log_ids[-1])
+    build = time.perf_counter() - build_start
+
+    print(f"{len(log_ids)} 条日志（{args.players} 名玩家、{days} 天），随机跳转 {args.seeks} 次，平均每次：")
+    print("                      重建状态   含快照构建")
+    for label, checkpoint_every, replays in (
+        ("从头重放", len(log_ids) + 1, full),
+        (f"检查点（每 {args.checkpoint_every} 条）", args.checkpoint_every, indexed),
+    ):
+        replay = RoomReplay(room, checkpoint_every=checkpoint_every)
+        replay.state_at(log_ids[-1])
+        state_ms = _average_ms(replay.state_at, targets)
+        snapshot_ms = _average_ms(lambda log_id: replays.snapshot_at(room_id, log_id), targets)
+        print(f"  {label:<18} {state_ms:8.2f} ms {snapshot_ms:8.2f} ms")
+    print(f"首次建立全部检查点 {build * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+"""座位索引微基准。
+
+对比 20 人房间中“每次调用都重新排序 / 线性查找”（旧实现）与缓存的座位排序列表、
+座位索引的耗时，覆盖快照构建和投票顺序计算两条热路径。
+
+运行：python -m backend.benchmarks.seating [--players 20] [--rounds 2000]
+"""
+
+import argparse
+import time
+from typing import Callable
+
+from backend.core.models import RoomState
+from backend.core.service import RoomPrincipal, RoomService, build_snapshot
+
+
+def _prepare_room(player_count: int) -> tuple[RoomService, RoomState]:
+    service = RoomService()
+    room = service.create_room("host", host_user_id=0)
+    for index in range(player_count):
+        service.join_room(room.id, f"player-{index + 1}", room.join_code)
+    service.assign_roles(room.id, seed="benchmark")
+    return service, room
+
+
+def _measure(rounds: int, func: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) / rounds * 1_000_000
+
+
+def _report(name: str, uncached: float, cached: float) -> None:
+    print(f"{name:<18} 旧实现 {uncached:9.2f} µs   缓存 {cached:9.2f} µs   提升 {uncached / cached:5.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="座位索引微基准")
+    parser.add_argument("--players", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    service, room = _prepare_room(args.players)
+    host = RoomPrincipal(room_id=room.id, player_id=room.host_player_id, seat=0, is_host=True)
+    seats = [player.seat for player in room.list_players() if player.seat > 0]
+
+    def uncached(func: Callable[[], object]) -> Callable[[], object]:
+        # 每次调用前清空缓存，等价于旧实现中每次都重新排序 / 线性扫描。
+        def run() -> object:
+            room._invalidate_seating()
+            return func()
+
+        return run
+
+    def list_players() -> object:
+        return room.list_players()
+
+    def lookup_all_seats() -> object:
+        return [room.player_by_seat(seat) for seat in seats]
+
+    def vote_order() -> object:
+        return service._build_vote_order(room, seats[len(seats) // 2])
+
+    def snapshot() -> object:
+        return build_snapshot(room, host)
+
+    def lookup_all_seats_uncached() -> object:
+        lookups = []
+        for seat in seats:
+            room._invalidate_seating()
+            lookups.append(room.player_by_seat(seat))
+        return lookups
+
+    print(f"{args.players} 人房间，每项 {args.rounds} 轮，单次平均耗时：")
+    for name, baseline, func in (
+        ("list_players", uncached(list_players), list_players),
+        ("player_by_seat×N", lookup_all_seats_uncached, lookup_all_seats),
+        ("vote_order", uncached(vote_order), vote_order),
+        ("build_snapshot", uncached(snapshot), snapshot),
+    ):
+        _report(name, _measure(args.rounds, baseline), _measure(args.rounds, func))
+
+
+if __name__ == "__main__":
+    main()
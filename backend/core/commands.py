@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+"""按房间串行执行的命令队列。
+
+每个房间一个单消费者队列：接口把变更包装成命令入队，命令按入队顺序依次执行，
+执行后的房间版本号即该命令的序号（同一房间内单调递增，无需额外计数）。
+同一批连续执行的命令只发布一次房间变更事件（携带执行后的版本号与本批各命令的序号）。不同房间的队列相互独立。
+队列为空时消费协程随即退出，空闲房间不占用任何任务。
+"""
+
+import asyncio
+import contextlib
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Tuple, TypeVar
+
+from backend.core.events import RoomChanged, RoomEventBus
+from backend.core.service import RoomNotFoundError, RoomService
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class RoomCommand:
+    apply: Callable[[], Any]
+    future: asyncio.Future
+    # True 表示结果需跳过广播合并窗口立即推送。
+    flush: bool = False
+    # 命令执行后的房间版本号，执行前（或执行后房间已不存在）为 None。
+    seq: int | None = None
+
+
+class RoomCommandQueue:
+    def __init__(self, room_service: RoomService, event_bus: RoomEventBus) -> None:
+        self.room_service = room_service
+        self.event_bus = event_bus
+        self._queues: Dict[str, Deque[RoomCommand]] = {}
+        self._consumers: Dict[str, asyncio.Task] = {}
+        self._applied_total = 0
+        self._batches_total = 0
+
+    async def submit(self, room_id: str, apply: Callable[[], T], *, flush: bool = False) -> T:
+        """把命令加入房间队列并等待其执行结果；命令抛出的异常原样传给调用方。"""
+
+        result, _ = await self.submit_sequenced(room_id, apply, flush=flush)
+        return result
+
+    async def submit_sequenced(
+        self, room_id: str, apply: Callable[[], T], *, flush: bool = False
+    ) -> Tuple[T, int | None]:
+        """同 submit，额外返回命令的序号，调用方可据此对应到随后的变更事件 / 广播版本。"""
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(room_id, deque()).append(RoomCommand(apply, future, flush))
+        if room_id not in self._consumers:
+            self._consumers[room_id] = asyncio.create_task(self._consume(room_id))
+        return await future
+
+    def metrics(self) -> dict[str, int]:
+        return {
+            "command_queues": len(self._consumers),
+            "commands_pending": sum(len(queue) for queue in self._queues.values()),
+            "commands_applied_total": self._applied_total,
+            "command_batches_total": self._batches_total,
+        }
+
+    async def _consume(self, room_id: str) -> None:
+        queue = self._queues[room_id]
+        try:
+            while queue:
+                # 取出当前已排队的全部命令依次执行，整批只广播一次结果版本。
+                batch = list(queue)
+                queue.clear()
+                results: list[tuple[RoomCommand, Any]] = []
+                for command in batch:
+                    try:
+                        result = command.apply()
+                    except Exception as exc:
+                        _resolve(command.future, exception=exc)
+                        continue
+                    with contextlib.suppress(RoomNotFoundError):
+                        command.seq = self.room_service.room_version(room_id)
+                    results.append((command, result))
+                if not results:
+                    continue
+                self._applied_total += len(results)
+                self._batches_total += 1
+                try:
+                    version = self.room_service.room_version(room_id)
+                    flush = any(command.flush for command, _ in results)
+                    seqs = tuple(command.seq for command, _ in results if command.seq is not None)
+                    await self.event_bus.publish(
+                        RoomChanged(room_id=room_id, version=version, flush=flush, seqs=seqs)
+                    )
+                except RoomNotFoundError:
+                    pass
+                except Exception:  # pragma: no cover - network scenario
+                    # 变更已生效，广播失败不应影响调用方；客户端下一次变更或重连时会同步。
+                    logger.warning("房间 %s 的变更事件发布失败（%d 条命令）", room_id, len(results), exc_info=True)
+                for command, result in results:
+                    _resolve(command.future, result=(result, command.seq))
+        finally:
+            # 检查与移除之间没有 await，新命令要么已在本轮处理，要么会启动新的消费协程。
+            self._consumers.pop(room_id, None)
+            if not queue:
+                self._queues.pop(room_id, None)
+
+
+def _resolve(future: asyncio.Future, *, result: Any = None, exception: BaseException | None = None) -> None:
+    # 调用方可能已取消等待（如客户端断开），此时命令照常生效，只是无人接收结果。
+    if future.done():
+        return
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
@@ -7,10 +7,45 @@ class Settings:
     app_secret: str = os.getenv("APP_SECRET", "dev-secret")
     db_url: str = os.getenv("DB_URL", "sqlite+aiosqlite:///./app.db")
     redis_url: str | None = os.getenv("REDIS_URL") or None
+    # 本机事件 broker 的 Unix socket 路径，未配置 REDIS_URL 时可用于本地多 worker 测试。
+    event_bus_socket: str | None = os.getenv("EVENT_BUS_SOCKET") or None
     user_db_path: str = os.getenv("USER_DB_PATH", "./backend/data/users.db")
     registration_codes_path: str = os.getenv(
         "REGISTRATION_CODES_PATH", "./backend/data/registration_codes.txt"
     )
+    # WebSocket 广播合并窗口（毫秒），0 表示每次变更立即广播。
+    broadcast_coalesce_ms: int = int(os.getenv("BROADCAST_COALESCE_MS", "20"))
+    # 每个 WebSocket 连接的出站队列长度上限，以及允许的最长发送滞后（秒）。
+    ws_send_queue_size: int = int(os.getenv("WS_SEND_QUEUE_SIZE", "32"))
+    ws_max_send_lag_seconds: float = float(os.getenv("WS_MAX_SEND_LAG_SECONDS", "10"))
+    # 每个房间保留的历史快照版本数与字节数上限（0 表示不限制字节数），供断线重连时计算增量。
+    replay_buffer_size: int = int(os.getenv("REPLAY_BUFFER_SIZE", "16"))
+    replay_buffer_bytes: int = int(os.getenv("REPLAY_BUFFER_BYTES", "262144"))
+    # WebSocket 心跳间隔与超时（秒），以及单进程 / 单房间的连接数上限（0 表示不限制）。
+    ws_heartbeat_interval: float = float(os.getenv("WS_HEARTBEAT_INTERVAL", "20"))
+    ws_heartbeat_timeout: float = float(os.getenv("WS_HEARTBEAT_TIMEOUT", "60"))
+    ws_max_connections: int = int(os.getenv("WS_MAX_CONNECTIONS", "5000"))
+    ws_max_connections_per_room: int = int(os.getenv("WS_MAX_CONNECTIONS_PER_ROOM", "64"))
+    # 单个房间的旁观者连接上限（不计入 WS_MAX_CONNECTIONS_PER_ROOM），以及公开视图推送延迟（秒）。
+    ws_max_spectators_per_room: int = int(os.getenv("WS_MAX_SPECTATORS_PER_ROOM", "500"))
+    public_view_delay_seconds: float = float(os.getenv("PUBLIC_VIEW_DELAY_SECONDS", "0"))
+    # 长轮询最长挂起时间与 SSE 保活注释的发送间隔（秒）。
+    long_poll_timeout_seconds: float = float(os.getenv("LONG_POLL_TIMEOUT_SECONDS", "25"))
+    sse_keepalive_seconds: float = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+    # 房间回收：空闲时限、公布结局后的保留时限与清理间隔（秒，0 表示不回收），以及常驻房间数上限（0 表示不限制）。
+    room_idle_ttl_seconds: float = float(os.getenv("ROOM_IDLE_TTL_SECONDS", "21600"))
+    room_finished_ttl_seconds: float = float(os.getenv("ROOM_FINISHED_TTL_SECONDS", "1800"))
+    room_sweep_interval_seconds: float = float(os.getenv("ROOM_SWEEP_INTERVAL_SECONDS", "60"))
+    max_rooms: int = int(os.getenv("MAX_ROOMS", "2000"))
+    # 房间持久化：journal 数据库路径（留空表示不持久化）、批量提交间隔（毫秒）与每个房间写入检查点的条目间隔。
+    room_journal_path: str = os.getenv("ROOM_JOURNAL_PATH", "./backend/data/rooms.db")
+    journal_flush_ms: int = int(os.getenv("JOURNAL_FLUSH_MS", "50"))
+    room_checkpoint_every: int = int(os.getenv("ROOM_CHECKPOINT_EVERY", "200"))
+    # 日志回放：每隔多少条日志保存一份回放检查点。
+    replay_checkpoint_every: int = int(os.getenv("REPLAY_CHECKPOINT_EVERY", "100"))
+    # 分片部署：本 worker 的分片编号与分片总数，由 backend.router 启动 worker 时设置。
+    shard_index: int = int(os.getenv("SHARD_INDEX", "0"))
+    shard_count: int = int(os.getenv("SHARD_COUNT", "1"))
     cors_origins: list[str]
 
     def __init__(self) -> None:
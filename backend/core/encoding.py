@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+"""JSON 编码工具。
+
+优先使用 orjson（比标准库快数倍），未安装时退回标准库 json，输出格式保持一致：
+紧凑分隔符、UTF-8 原样输出中文。
+"""
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+def dumps(data: Any) -> bytes:
+    """把数据编码为 UTF-8 JSON 字节串。"""
+
+    if orjson is not None:
+        # 剧本的 team_distribution 使用整数 key，需要显式允许。
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: bytes | str) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def wrap_frame(message_type: str, data: bytes, **fields: Any) -> bytes:
+    """把已编码的 data 嵌入 {"type": ..., **fields, "data": ...} 消息，避免重复编码大对象。"""
+
+    header = {"type": message_type, **fields}
+    return dumps(header)[:-1] + b',"data":' + data + b"}"
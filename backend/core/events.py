@@ -0,0 +1,272 @@
+from __future__ import annotations
+
+"""房间变更事件总线。
+
+REST 接口在修改房间后发布 “房间 X 已变更到版本 V” 事件，各 worker 内的 WebSocket
+管理器订阅后只向自己持有的连接推送。提供三种实现：
+
+- InMemoryEventBus：单进程内直接分发（默认）；
+- RedisEventBus：基于 REDIS_URL 的 Pub/Sub，跨进程、跨主机；
+- LocalSocketEventBus：连接本机 Unix socket 上的 LocalEventBroker，便于在本地测试多 worker。
+"""
+
+import abc
+import argparse
+import asyncio
+import contextlib
+import json
+from dataclasses import asdict, dataclass
+from typing import Callable
+
+from backend.core.encoding import dumps
+
+CHANNEL = "botc:room_changed"
+# 跨进程总线断线后的重连间隔（秒）。
+RECONNECT_DELAY = 1.0
+# 启动时等待连上本机 broker 的最长时间（秒），超时即启动失败，而不是让应用无限期挂起。
+CONNECT_TIMEOUT = 10.0
+
+
+@dataclass(frozen=True)
+class RoomChanged:
+    room_id: str
+    version: int
+    # True 表示跳过广播合并窗口立即推送。
+    flush: bool = False
+    # 本批执行的命令序号（即各命令执行后的房间版本号），供发起方对应自己的命令。
+    seqs: tuple[int, ...] = ()
+
+    def encode(self) -> bytes:
+        return dumps(asdict(self))
+
+    @classmethod
+    def decode(cls, raw: bytes | str) -> RoomChanged:
+        data = json.loads(raw)
+        return cls(
+            room_id=data["room_id"],
+            version=int(data["version"]),
+            flush=bool(data.get("flush")),
+            seqs=tuple(int(seq) for seq in data.get("seqs", ())),
+        )
+
+
+Subscriber = Callable[[RoomChanged], None]
+
+
+class RoomEventBus(abc.ABC):
+    """事件总线基类：订阅者为同步回调，只应做入队/调度等轻量操作。
+
+    各实现需提供 start / stop / publish；漏实现时在创建实例时即报错，而不是等到首次发布。
+    """
+
+    def __init__(self) -> None:
+        self._subscribers: list[Subscriber] = []
+
+    def subscribe(self, callback: Subscriber) -> None:
+        self._subscribers.append(callback)
+
+    @abc.abstractmethod
+    async def start(self) -> None:
+        """建立连接、启动后台读取任务等。"""
+
+    @abc.abstractmethod
+    async def stop(self) -> None:
+        """停止后台任务并释放连接。"""
+
+    @abc.abstractmethod
+    async def publish(self, event: RoomChanged) -> None:
+        """发布事件；是否同步回调本进程的订阅者由实现决定。"""
+
+    def _dispatch(self, event: RoomChanged) -> None:
+        for callback in self._subscribers:
+            callback(event)
+
+
+class InMemoryEventBus(RoomEventBus):
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def publish(self, event: RoomChanged) -> None:
+        self._dispatch(event)
+
+
+class RedisEventBus(RoomEventBus):
+    """通过 Redis Pub/Sub 分发事件；本进程发布的事件同样经由 Redis 回到本进程的订阅者。"""
+
+    def __init__(self, url: str, *, channel: str = CHANNEL) -> None:
+        super().__init__()
+        try:
+            from redis import asyncio as aioredis
+        except ImportError as exc:  # pragma: no cover - optional dependency
+            raise RuntimeError("使用 Redis 事件总线需要先安装 redis 包") from exc
+        self._client = aioredis.from_url(url)
+        self._channel = channel
+        self._reader: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self._reader = asyncio.create_task(self._read_loop())
+
+    async def stop(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._reader
+        await self._client.aclose()
+
+    async def publish(self, event: RoomChanged) -> None:
+        await self._client.publish(self._channel, event.encode())
+
+    async def _read_loop(self) -> None:
+        while True:
+            try:
+                async with self._client.pubsub() as pubsub:
+                    await pubsub.subscribe(self._channel)
+                    async for message in pubsub.listen():
+                        if message.get("type") == "message":
+                            self._dispatch(RoomChanged.decode(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # pragma: no cover - network scenario
+                await asyncio.sleep(RECONNECT_DELAY)
+
+
+class LocalSocketEventBus(RoomEventBus):
+    """连接本机 LocalEventBroker 的事件总线，消息为按行分隔的 JSON。"""
+
+    def __init__(self, path: str, *, connect_timeout: float = CONNECT_TIMEOUT) -> None:
+        super().__init__()
+        self._path = path
+        self._connect_timeout = connect_timeout
+        self._writer: asyncio.StreamWriter | None = None
+        self._reader_task: asyncio.Task | None = None
+        self._connected = asyncio.Event()
+
+    async def start(self) -> None:
+        self._reader_task = asyncio.create_task(self._read_loop())
+        try:
+            await asyncio.wait_for(self._connected.wait(), self._connect_timeout)
+        except asyncio.TimeoutError:
+            await self.stop()
+            raise RuntimeError(
+                f"未能在 {self._connect_timeout} 秒内连接事件总线 {self._path}，请确认 LocalEventBroker 已启动"
+            ) from None
+
+    async def stop(self) -> None:
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._reader_task
+        if self._writer is not None:
+            self._writer.close()
+
+    async def publish(self, event: RoomChanged) -> None:
+        await self._connected.wait()
+        assert self._writer is not None
+        self._writer.write(event.encode() + b"\n")
+        await self._writer.drain()
+
+    async def _read_loop(self) -> None:
+        while True:
+            try:
+                reader, self._writer = await asyncio.open_unix_connection(self._path)
+                self._connected.set()
+                while line := await reader.readline():
+                    self._dispatch(RoomChanged.decode(line))
+            except asyncio.CancelledError:
+                raise
+            except OSError:  # pragma: no cover - broker restart
+                pass
+            self._connected.clear()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+
+class RoomVersionWatcher:
+    """让 SSE / 长轮询请求挂起等待房间变更的订阅者。
+
+    每个被等待的房间只有一个 asyncio.Event，收到变更事件时唤醒全部等待者并换新；
+    没有等待者的房间不占用任何资源。
+    """
+
+    def __init__(self) -> None:
+        self._events: dict[str, asyncio.Event] = {}
+        self._waiters: dict[str, int] = {}
+
+    def notify(self, event: RoomChanged) -> None:
+        changed = self._events.pop(event.room_id, None)
+        if changed is not None:
+            changed.set()
+
+    async def wait(self, room_id: str, timeout: float) -> bool:
+        """等待房间下一次变更，超时返回 False。调用方应先检查版本再等待，两者之间不能有 await。"""
+
+        changed = self._events.get(room_id)
+        if changed is None:
+            changed = self._events[room_id] = asyncio.Event()
+        self._waiters[room_id] = self._waiters.get(room_id, 0) + 1
+        try:
+            await asyncio.wait_for(changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            remaining = self._waiters[room_id] - 1
+            if remaining:
+                self._waiters[room_id] = remaining
+            else:
+                del self._waiters[room_id]
+                if self._events.get(room_id) is changed:
+                    del self._events[room_id]
+
+
+class LocalEventBroker:
+    """极简的本机广播服务：把任一客户端发来的每一行转发给所有客户端（包括发送者）。"""
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._clients: set[asyncio.StreamWriter] = set()
+        self._server: asyncio.AbstractServer | None = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_unix_server(self._handle, path=self._path)
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        assert self._server is not None
+        await self._server.serve_forever()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._clients.add(writer)
+        try:
+            while line := await reader.readline():
+                for client in list(self._clients):
+                    client.write(line)
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+
+def create_event_bus(*, redis_url: str | None, socket_path: str | None) -> RoomEventBus:
+    if redis_url:
+        return RedisEventBus(redis_url)
+    if socket_path:
+        return LocalSocketEventBus(socket_path)
+    return InMemoryEventBus()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="本机房间事件 broker，供多个 worker 共享")
+    parser.add_argument("--socket", required=True, help="Unix socket 路径")
+    args = parser.parse_args()
+    asyncio.run(LocalEventBroker(args.socket).serve_forever())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+from __future__ import annotations
+
+"""房间持久化：追加写入的变更日志（journal）与按房间的检查点（checkpoint）。
+
+RoomService 的每次变更记录为一条 journal 条目（操作名、参数以及执行时生成的随机 ID / 时间戳），
+重放条目即可确定性地得到相同状态；每个房间累计若干条目后写入完整状态的检查点，
+并删除检查点之前的条目。启动时按“最新检查点 + 之后的条目”重建房间。
+
+存储使用 SQLite WAL 模式：append 只写入内存缓冲，后台任务按 flush_interval 批量提交，
+一次提交（一次 fsync）覆盖窗口内的全部变更；flush_interval 为 0 时每次写入都同步提交。
+"""
+
+import asyncio
+import contextlib
+import logging
+import sqlite3
+from dataclasses import fields, is_dataclass
+from enum import Enum
+from pathlib import Path
+from typing import Any
+
+from backend.core.encoding import dumps, loads
+from backend.core.models import (
+    ActionRecord,
+    ExecutionRecord,
+    LifeStatus,
+    LogEntry,
+    NominationRecord,
+    Phase,
+    PlayerState,
+    RoleAssignment,
+    RoleAttachment,
+    RoomLog,
+    RoomState,
+    VoteBucket,
+    VoteRecord,
+    VoteSessionState,
+)
+
+logger = logging.getLogger(__name__)
+
+# 条目与检查点的编码格式版本（PRAGMA user_version）；格式不兼容时旧数据无法重放。
+FORMAT_VERSION = 3
+
+# 缓冲中的写操作：追加条目、写入检查点、删除房间。
+_ENTRY = "entry"
+_CHECKPOINT = "checkpoint"
+_DROP = "drop"
+# 批量提交失败后的重试间隔（秒）：从 flush_interval 起逐次翻倍，最长不超过该值。
+WRITE_RETRY_MAX_DELAY = 5.0
+
+
+class RoomJournal:
+    """基于 SQLite 的房间变更日志，写入批量提交，读取只在启动恢复时发生。"""
+
+    def __init__(self, path: Path, *, flush_interval: float = 0.05) -> None:
+        self._path = path
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._flush_interval = flush_interval
+        self._conn = sqlite3.connect(self._path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + FULL：每次提交都 fsync，批量提交把 fsync 次数降到每个刷新窗口一次。
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._initialize()
+        row = self._conn.execute(
+            "SELECT MAX(seq) FROM (SELECT MAX(seq) AS seq FROM journal UNION ALL SELECT MAX(seq) FROM checkpoints)"
+        ).fetchone()
+        self._seq = row[0] or 0
+        self._pending: list[tuple[Any, ...]] = []
+        self._task: asyncio.Task | None = None
+        self._stopping = asyncio.Event()
+
+    def _initialize(self) -> None:
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != FORMAT_VERSION:
+            tables = {row[0] for row in self._conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            if {"journal", "checkpoints"} & tables:
+                # 旧格式的随机值序列与当前代码不一致，重放只会得到错误状态，直接丢弃。
+                logger.warning("journal 格式版本 %s 与当前版本 %s 不兼容，丢弃其中的房间", version, FORMAT_VERSION)
+                self._conn.executescript("DROP TABLE IF EXISTS journal; DROP TABLE IF EXISTS checkpoints;")
+            self._conn.execute(f"PRAGMA user_version = {FORMAT_VERSION}")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS journal (
+                seq INTEGER PRIMARY KEY,
+                room_id TEXT NOT NULL,
+                entry BLOB NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS journal_room ON journal (room_id, seq);
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                room_id TEXT PRIMARY KEY,
+                seq INTEGER NOT NULL,
+                state BLOB NOT NULL
+            );
+            """
+        )
+
+    # Writes -------------------------------------------------------------
+    def append(self, room_id: str, entry: bytes) -> int:
+        self._seq += 1
+        self._buffer((_ENTRY, self._seq, room_id, entry))
+        return self._seq
+
+    def checkpoint(self, room_id: str, state: bytes) -> None:
+        """写入房间当前的完整状态；该房间此前的条目随之删除。"""
+
+        self._buffer((_CHECKPOINT, self._seq, room_id, state))
+
+    def drop(self, room_id: str) -> None:
+        self._buffer((_DROP, self._seq, room_id, None))
+
+    def _buffer(self, operation: tuple[Any, ...]) -> None:
+        self._pending.append(operation)
+        if self._flush_interval <= 0:
+            # 不做批量提交：每次写入立即同步提交，没有后台任务。
+            self.flush()
+
+    def flush(self) -> None:
+        batch, self._pending = self._pending, []
+        if batch:
+            self._write(batch)
+
+    def _write(self, batch: list[tuple[Any, ...]]) -> None:
+        with _transaction(self._conn):
+            for kind, seq, room_id, data in batch:
+                if kind == _ENTRY:
+                    self._conn.execute(
+                        "INSERT INTO journal (seq, room_id, entry) VALUES (?, ?, ?)", (seq, room_id, data)
+                    )
+                elif kind == _CHECKPOINT:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO checkpoints (room_id, seq, state) VALUES (?, ?, ?)",
+                        (room_id, seq, data),
+                    )
+                    self._conn.execute("DELETE FROM journal WHERE room_id = ? AND seq <= ?", (room_id, seq))
+                else:
+                    self._conn.execute("DELETE FROM checkpoints WHERE room_id = ?", (room_id,))
+                    self._conn.execute("DELETE FROM journal WHERE room_id = ?", (room_id,))
+
+    async def start(self) -> None:
+        if self._flush_interval > 0:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            # 不能取消刷新任务：取消只会中断等待，线程仍在事务中写入，随后的 flush 会撞上嵌套 BEGIN。
+            # 改为通知循环退出，并等待进行中的写入提交完成。
+            self._stopping.set()
+            await self._task
+            self._task = None
+        self.flush()
+
+    def close(self) -> None:
+        self.flush()
+        self._conn.close()
+
+    async def _flush_loop(self) -> None:
+        delay = self._flush_interval
+        while not self._stopping.is_set():
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._stopping.wait(), delay)
+            batch, self._pending = self._pending, []
+            if not batch:
+                continue
+            try:
+                # 提交与 fsync 放到线程中执行，不阻塞事件循环；同一时刻只有这一个写入者。
+                await asyncio.to_thread(self._write, batch)
+            except Exception:
+                # 磁盘已满、数据库被锁等：整批放回缓冲最前面保持顺序，退避后重试，不能让刷新任务就此退出。
+                self._pending[:0] = batch
+                delay = min(delay * 2, WRITE_RETRY_MAX_DELAY)
+                logger.exception("journal 批量提交失败（%d 项），%.2f 秒后重试", len(batch), delay)
+            else:
+                delay = self._flush_interval
+
+    # Recovery -----------------------------------------------------------
+    def load(self) -> tuple[dict[str, bytes], list[tuple[str, bytes]]]:
+        """返回各房间最新检查点，以及检查点之后按写入顺序排列的 (room_id, entry)。"""
+
+        checkpoints = {
+            room_id: state for room_id, state in self._conn.execute("SELECT room_id, state FROM checkpoints")
+        }
+        entries = self._conn.execute(
+            """
+            SELECT journal.room_id, journal.entry FROM journal
+            LEFT JOIN checkpoints ON checkpoints.room_id = journal.room_id
+            WHERE checkpoints.seq IS NULL OR journal.seq > checkpoints.seq
+            ORDER BY journal.seq
+            """
+        ).fetchall()
+        return checkpoints, entries
+
+
+@contextlib.contextmanager
+def _transaction(conn: sqlite3.Connection):
+    conn.execute("BEGIN")
+    try:
+        yield
+        conn.execute("COMMIT")
+    except BaseException:
+        # COMMIT 本身也可能失败（如磁盘已满），此时事务仍未结束，需回滚后才能开始下一次写入。
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+
+
+# Serialization ----------------------------------------------------------
+def to_plain(value: Any) -> Any:
+    """把 dataclass / 枚举等转换为可 JSON 编码的基础类型（只保留构造参数字段）。"""
+
+    cls = type(value)
+    if cls in _SCALARS:
+        return value
+    if cls is dict:
+        return {key: to_plain(item) for key, item in value.items()}
+    if cls is list or cls is tuple or cls is RoomLog:
+        return [to_plain(item) for item in value]
+    names = _init_fields(cls)
+    if names is not None:
+        return {name: to_plain(getattr(value, name)) for name in names}
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+_SCALARS = frozenset({str, int, float, bool, type(None)})
+# dataclass 类型 -> 构造参数字段名；检查点会遍历成千上万条记录，逐个调用 fields() 开销明显。
+_FIELD_NAMES: dict[type, tuple[str, ...] | None] = {}
+
+
+def _init_fields(cls: type) -> tuple[str, ...] | None:
+    try:
+        return _FIELD_NAMES[cls]
+    except KeyError:
+        names = tuple(f.name for f in fields(cls) if f.init) if is_dataclass(cls) else None
+        _FIELD_NAMES[cls] = names
+        return names
+
+
+def encode_room(room: RoomState) -> bytes:
+    return dumps(to_plain(room))
+
+
+def decode_room(data: bytes) -> RoomState:
+    raw = loads(data)
+    room_id = raw["id"]
+    # 各记录里的 room_id / 玩家 ID / 提名 ID 复用同一个字符串对象，与运行期间一样不为每条记录各存一份。
+    players = {
+        player["id"]: PlayerState(
+            **{
+                **player,
+                "room_id": room_id,
+                "life_status": LifeStatus(player["life_status"]),
+                "role_attachments": [RoleAttachment(**att) for att in player["role_attachments"]],
+            }
+        )
+        for player in raw["players"].values()
+    }
+    nominations = {
+        nomination["id"]: NominationRecord(**{**nomination, "room_id": room_id})
+        for nomination in raw["nominations"].values()
+    }
+    shared_ids = {key: key for key in (*players, *nominations)}
+
+    def shared(value: str) -> str:
+        return shared_ids.get(value, value)
+
+    session = raw["vote_session"]
+    room = RoomState(
+        id=room_id,
+        code=raw["code"],
+        join_code=raw["join_code"],
+        script_id=raw["script_id"],
+        phase=Phase(raw["phase"]),
+        created_at=raw["created_at"],
+        host_player_id=shared(raw["host_player_id"]),
+        day=raw["day"],
+        night=raw["night"],
+        assignments_seed=raw["assignments_seed"],
+        nominations=nominations,
+        votes={
+            shared(nomination_id): VoteBucket(
+                votes=[
+                    VoteRecord(
+                        **{
+                            **vote,
+                            "room_id": room_id,
+                            "nomination_id": shared(vote["nomination_id"]),
+                            "player_id": shared(vote["player_id"]),
+                        }
+                    )
+                    for vote in bucket["votes"]
+                ],
+                yes=bucket["yes"],
+                no=bucket["no"],
+            )
+            for nomination_id, bucket in raw["votes"].items()
+        },
+        actions=[ActionRecord(**{**action, "room_id": room_id}) for action in raw["actions"]],
+        logs=RoomLog(LogEntry(**{**log, "room_id": room_id}) for log in raw["logs"]),
+        pending_assignments={
+            int(seat): decode_assignment(assignment) for seat, assignment in raw["pending_assignments"].items()
+        },
+        game_result=raw["game_result"],
+        vote_session=(
+            VoteSessionState(
+                **{
+                    **session,
+                    "nomination_id": shared(session["nomination_id"]),
+                    "order": [shared(player_id) for player_id in session["order"]],
+                }
+            )
+            if session is not None
+            else None
+        ),
+        executions=[ExecutionRecord(**record) for record in raw["executions"]],
+        version=raw["version"],
+        last_record_id=raw["last_record_id"],
+    )
+    for player in players.values():
+        room.add_player(player)
+    return room
+
+
+def decode_assignment(raw: dict[str, Any]) -> RoleAssignment:
+    return RoleAssignment(
+        role_id=raw["role_id"],
+        attachments=[RoleAttachment(**att) for att in raw.get("attachments", [])],
+    )
+
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+"""房间生命周期管理：定期回收空闲或已结束的房间，避免常驻内存无限增长。"""
+
+import asyncio
+import contextlib
+import time
+from typing import Callable
+
+from backend.core.service import RoomService
+
+EvictionCallback = Callable[[str], None]
+
+
+class RoomSweeper:
+    """后台清理任务：每隔 interval 秒移除超过空闲 / 结束时限的房间，并通知订阅者清理关联资源。"""
+
+    def __init__(
+        self,
+        room_service: RoomService,
+        *,
+        idle_ttl: float,
+        finished_ttl: float,
+        interval: float = 60.0,
+    ) -> None:
+        self.room_service = room_service
+        self._idle_ttl = idle_ttl
+        self._finished_ttl = finished_ttl
+        self._interval = interval
+        self._subscribers: list[EvictionCallback] = []
+        self._task: asyncio.Task | None = None
+        self._evicted_total = 0
+
+    def subscribe(self, callback: EvictionCallback) -> None:
+        self._subscribers.append(callback)
+
+    async def start(self) -> None:
+        if self._interval > 0 and (self._idle_ttl > 0 or self._finished_ttl > 0):
+            self._task = asyncio.create_task(self._sweep_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    def sweep(self, now: float | None = None) -> list[str]:
+        """执行一次清理，返回被移除的房间 ID。"""
+
+        now = time.monotonic() if now is None else now
+        evicted = self.room_service.expired_rooms(
+            idle_ttl=self._idle_ttl, finished_ttl=self._finished_ttl, now=now
+        )
+        for room_id in evicted:
+            self.room_service.remove_room(room_id)
+            for callback in self._subscribers:
+                callback(room_id)
+        self._evicted_total += len(evicted)
+        return evicted
+
+    def metrics(self) -> dict[str, int]:
+        return {
+            "rooms": self.room_service.room_count(),
+            "rooms_evicted_total": self._evicted_total,
+        }
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            self.sweep()
@@ -4,12 +4,19 @@ from __future__ import annotations
 
 这一层主要通过 dataclass 对房间、玩家、投票等实体进行建模，
 方便在服务层内以 Python 对象的形式操作，并在接口层再序列化为 JSON。
+
+一局游戏会累积成千上万条投票 / 日志 / 行动记录，因此房间内的实体均使用 __slots__；
+记录 ID 为房间内递增的整数，时间统一保存为 epoch 毫秒整数，只在序列化时转换为 ISO 字符串。
 """
 
+import time
+from array import array
+from bisect import bisect_right
 from dataclasses import dataclass, field
-from datetime import datetime
+from datetime import datetime, timezone
 from enum import Enum
-from typing import Any, List, Optional
+from itertools import chain, islice
+from typing import Any, Iterable, Iterator, List, Optional
 
 
 class Phase(str, Enum):
@@ -31,7 +38,25 @@ class LifeStatus(str, Enum):
     DEAD_NO_VOTE = "dead_no_vote"
 
 
-@dataclass
+def now_ms() -> int:
+    """当前时间的 epoch 毫秒数。"""
+
+    return time.time_ns() // 1_000_000
+
+
+def iso_local(ms: int) -> str:
+    """按本地时间渲染为精确到秒的 ISO 字符串，如 2024-05-01T20:15:03，保持接口原有的时间格式。"""
+
+    return datetime.fromtimestamp(ms / 1000).isoformat(timespec="seconds")
+
+
+def iso_utc(ms: int) -> str:
+    """按 UTC 渲染为不带时区后缀、精确到秒的 ISO 字符串。"""
+
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).replace(tzinfo=None).isoformat(timespec="seconds")
+
+
+@dataclass(slots=True)
 class PlayerState:
     id: str
     room_id: str
@@ -39,7 +64,7 @@ class PlayerState:
     seat: int
     is_alive: bool = True
     role_id: str | None = None
-    joined_at: datetime = field(default_factory=datetime.utcnow)
+    joined_at: int = field(default_factory=now_ms)
     is_host: bool = False
     user_id: int | None = None
     ghost_vote_used: bool = False
@@ -47,10 +72,26 @@ class PlayerState:
     role_attachments: list["RoleAttachment"] = field(default_factory=list)
     life_status: LifeStatus = LifeStatus.ALIVE
 
+    def set_life_status(self, status: LifeStatus) -> None:
+        self.life_status = status
+        # 假死状态对外仍算存活；“无票”表示遗言票已用掉。
+        self.is_alive = status in (LifeStatus.ALIVE, LifeStatus.FAKE_DEAD_VOTE, LifeStatus.FAKE_DEAD_NO_VOTE)
+        self.ghost_vote_used = status in (LifeStatus.FAKE_DEAD_NO_VOTE, LifeStatus.DEAD_NO_VOTE)
 
-@dataclass
+    def spend_ghost_vote(self) -> None:
+        """死亡（含假死）且仍有遗言票的玩家投出赞成票后，遗言票即被用掉。"""
+
+        if self.life_status == LifeStatus.DEAD_VOTE:
+            self.ghost_vote_used = True
+            self.life_status = LifeStatus.DEAD_NO_VOTE
+        elif self.life_status == LifeStatus.FAKE_DEAD_VOTE:
+            self.ghost_vote_used = True
+            self.life_status = LifeStatus.FAKE_DEAD_NO_VOTE
+
+
+@dataclass(slots=True)
 class VoteRecord:
-    id: str
+    id: int
     room_id: str
     day: int
     nomination_id: str
@@ -58,12 +99,12 @@ class VoteRecord:
     voter_seat: int
     player_id: str
     value: bool
-    ts: datetime = field(default_factory=datetime.utcnow)
+    ts: int = field(default_factory=now_ms)
 
 
-@dataclass
+@dataclass(slots=True)
 class ActionRecord:
-    id: str
+    id: int
     room_id: str
     night: int
     actor_seat: int
@@ -71,67 +112,249 @@ class ActionRecord:
     target: int | None
     payload: dict[str, Any]
     resolved: bool = False
-    ts: datetime = field(default_factory=datetime.utcnow)
+    ts: int = field(default_factory=now_ms)
 
 
-@dataclass
+@dataclass(slots=True)
 class NominationRecord:
     id: str
     room_id: str
     day: int
     nominee_seat: int
     nominator_seat: int
-    ts: datetime = field(default_factory=datetime.utcnow)
+    ts: int = field(default_factory=now_ms)
     confirmed: bool = False
     vote_started: bool = False
     vote_completed: bool = False
     manual_vote_total: int | None = None
 
 
-@dataclass
+@dataclass(slots=True)
+class VoteBucket:
+    """单个提名下的投票记录（按投票先后排列）及赞成/反对票的累计数。"""
+
+    votes: list[VoteRecord] = field(default_factory=list)
+    yes: int = 0
+    no: int = 0
+
+    def add(self, vote: VoteRecord) -> None:
+        self.votes.append(vote)
+        if vote.value:
+            self.yes += 1
+        else:
+            self.no += 1
+
+
+@dataclass(slots=True)
 class LogEntry:
-    id: str
+    id: int
     room_id: str
-    ts: datetime
+    ts: int
+    # 写入时房间所处的天数，供按天筛选。
+    day: int
     kind: str
     payload: dict[str, Any]
 
 
-@dataclass
+# 日志 payload 中表示座位号的字段，按座位筛选时命中任一字段即可。
+LOG_SEAT_FIELDS = ("seat", "actor", "target", "voter", "nominee", "by", "executed")
+# 每个日志分段容纳的条目数。
+LOG_SEGMENT_SIZE = 256
+
+
+def log_seats(entry: LogEntry) -> set[int]:
+    seats = set()
+    for name in LOG_SEAT_FIELDS:
+        value = entry.payload.get(name)
+        if type(value) is int:
+            seats.add(value)
+    return seats
+
+
+class RoomLog:
+    """房间日志：只追加的分段存储，按类型 / 天数 / 座位维护二级索引。
+
+    索引保存条目位置（紧凑的整数数组），条目 ID 单调递增，可以直接作为分页游标：
+    查询只二分定位游标之后的位置，再顺序取出至多 limit 条，耗时与新增条目数相关，与整局长度无关。
+    """
+
+    __slots__ = ("_segments", "_segment_first_ids", "_by_kind", "_by_day", "_by_seat", "_count")
+
+    def __init__(self, entries: Iterable[LogEntry] = ()) -> None:
+        self._segments: list[list[LogEntry]] = []
+        # 各分段首条目的 ID，用于按游标二分定位分段。
+        self._segment_first_ids = array("q")
+        self._by_kind: dict[str, array] = {}
+        self._by_day: dict[int, array] = {}
+        self._by_seat: dict[int, array] = {}
+        self._count = 0
+        for entry in entries:
+            self.append(entry)
+
+    def append(self, entry: LogEntry) -> None:
+        if not self._segments or len(self._segments[-1]) >= LOG_SEGMENT_SIZE:
+            self._segments.append([])
+            self._segment_first_ids.append(entry.id)
+        self._segments[-1].append(entry)
+        position = self._count
+        self._count += 1
+        _index(self._by_kind, entry.kind, position)
+        _index(self._by_day, entry.day, position)
+        for seat in log_seats(entry):
+            _index(self._by_seat, seat, position)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[LogEntry]:
+        return chain.from_iterable(self._segments)
+
+    def __getitem__(self, position: int) -> LogEntry:
+        if position < 0:
+            position += self._count
+        if not 0 <= position < self._count:
+            raise IndexError(position)
+        return self._segments[position // LOG_SEGMENT_SIZE][position % LOG_SEGMENT_SIZE]
+
+    def position_after(self, entry_id: int) -> int:
+        """ID 大于 entry_id 的第一条日志的位置。"""
+
+        segment_index = bisect_right(self._segment_first_ids, entry_id) - 1
+        if segment_index < 0:
+            return 0
+        segment = self._segments[segment_index]
+        return segment_index * LOG_SEGMENT_SIZE + bisect_right(segment, entry_id, key=_entry_id)
+
+    def query(
+        self,
+        *,
+        after: int | None = None,
+        limit: int | None = None,
+        kind: str | None = None,
+        day: int | None = None,
+        seat: int | None = None,
+    ) -> list[LogEntry]:
+        """返回游标 after（日志 ID）之后、满足全部筛选条件的至多 limit 条日志。"""
+
+        start = self.position_after(after) if after is not None else 0
+        candidates = [
+            index.get(key, _EMPTY_POSITIONS)
+            for index, key in ((self._by_kind, kind), (self._by_day, day), (self._by_seat, seat))
+            if key is not None
+        ]
+        if not candidates:
+            positions: Iterable[int] = range(start, self._count)
+        else:
+            # 从最短的索引出发，其余条件逐条检查。
+            shortest = min(candidates, key=len)
+            first = bisect_right(shortest, start - 1)
+            positions = (shortest[index] for index in range(first, len(shortest)))
+        entries = (self[position] for position in positions)
+        if len(candidates) > 1:
+            entries = (
+                entry
+                for entry in entries
+                if (kind is None or entry.kind == kind)
+                and (day is None or entry.day == day)
+                and (seat is None or seat in log_seats(entry))
+            )
+        return list(islice(entries, limit))
+
+
+_EMPTY_POSITIONS = array("i")
+
+
+def _index(index: dict[Any, array], key: Any, position: int) -> None:
+    positions = index.get(key)
+    if positions is None:
+        positions = index[key] = array("i")
+    positions.append(position)
+
+
+def _entry_id(entry: LogEntry) -> int:
+    return entry.id
+
+
+@dataclass(slots=True)
 class RoomState:
     id: str
     code: str
     join_code: str
     script_id: str
     phase: Phase
-    created_at: datetime
+    created_at: int
     host_player_id: str
     day: int = 0
     night: int = 0
     assignments_seed: str | None = None
     players: dict[str, PlayerState] = field(default_factory=dict)
-    nominations: list[NominationRecord] = field(default_factory=list)
-    votes: list[VoteRecord] = field(default_factory=list)
+    # 提名按 id 索引（dict 保持提名先后顺序），投票按提名分桶，查找与撤销无需遍历整局历史。
+    nominations: dict[str, NominationRecord] = field(default_factory=dict)
+    votes: dict[str, VoteBucket] = field(default_factory=dict)
     actions: list[ActionRecord] = field(default_factory=list)
-    logs: list[LogEntry] = field(default_factory=list)
+    logs: RoomLog = field(default_factory=RoomLog)
     pending_assignments: dict[int, "RoleAssignment"] = field(default_factory=dict)
     game_result: str | None = None
     vote_session: Optional["VoteSessionState"] = None
     executions: list["ExecutionRecord"] = field(default_factory=list)
+    # 每次状态变更递增的版本号，用于快照缓存与增量同步。
+    version: int = 0
+    # 房间内投票 / 日志 / 行动记录共用的递增 ID，重放时按相同顺序分配，无需写入 journal 的随机值。
+    last_record_id: int = 0
+    # 最近一次变更的单调时钟时间（time.monotonic），用于空闲 / 已结束房间的过期回收。
+    last_active_at: float = field(default_factory=time.monotonic, compare=False)
+    # 按座位排序的玩家列表与座位索引，只在加入、离开、换座时失效，避免每次快照都重新排序。
+    _seat_order: list[PlayerState] | None = field(default=None, init=False, repr=False, compare=False)
+    _seat_index: dict[int, PlayerState] | None = field(default=None, init=False, repr=False, compare=False)
+
+    def next_record_id(self) -> int:
+        self.last_record_id += 1
+        return self.last_record_id
 
     def next_seat(self) -> int:
         if not self.players:
             return 1
         return max(player.seat for player in self.players.values()) + 1
 
+    def add_player(self, player: PlayerState) -> None:
+        self.players[player.id] = player
+        self._invalidate_seating()
+
+    def remove_player(self, player_id: str) -> PlayerState | None:
+        player = self.players.pop(player_id, None)
+        if player is not None:
+            self._invalidate_seating()
+        return player
+
+    def set_seat(self, player: PlayerState, seat: int) -> None:
+        player.seat = seat
+        self._invalidate_seating()
+
     def list_players(self) -> list[PlayerState]:
-        return sorted(self.players.values(), key=lambda player: player.seat)
+        """按座位号排序的玩家列表（同座位保持加入顺序）。返回缓存对象，调用方不得修改。"""
+
+        if self._seat_order is None:
+            self._seat_order = sorted(self.players.values(), key=lambda player: player.seat)
+        return self._seat_order
 
     def player_by_seat(self, seat: int) -> PlayerState | None:
-        for player in self.players.values():
-            if player.seat == seat:
-                return player
-        return None
+        if self._seat_index is None:
+            index: dict[int, PlayerState] = {}
+            for player in self.players.values():
+                # 座位允许重复，与原先的线性查找一致，取最先加入的玩家。
+                index.setdefault(player.seat, player)
+            self._seat_index = index
+        return self._seat_index.get(seat)
+
+    def votes_for(self, nomination_id: str) -> VoteBucket:
+        bucket = self.votes.get(nomination_id)
+        if bucket is None:
+            bucket = self.votes[nomination_id] = VoteBucket()
+        return bucket
+
+    def _invalidate_seating(self) -> None:
+        self._seat_order = None
+        self._seat_index = None
 
 
 @dataclass
@@ -156,7 +379,7 @@ class Script:
     rules: dict[str, Any] = field(default_factory=dict)
 
 
-@dataclass
+@dataclass(slots=True)
 class RoleAttachment:
     """表示附带角色（如酒鬼误以为的身份、恶魔伪装等）。"""
 
@@ -165,7 +388,7 @@ class RoleAttachment:
     role_id: str
 
 
-@dataclass
+@dataclass(slots=True)
 class RoleAssignment:
     """房间中的角色分配结果，包含主身份和附带身份。"""
 
@@ -173,7 +396,7 @@ class RoleAssignment:
     attachments: list[RoleAttachment] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class VoteSessionState:
     """记录当前投票的轮次进度。"""
 
@@ -189,7 +412,7 @@ class VoteSessionState:
         return self.order[self.current_index]
 
 
-@dataclass
+@dataclass(slots=True)
 class ExecutionRecord:
     """记录每日处决结果，便于前端展示。"""
 
@@ -199,4 +422,4 @@ class ExecutionRecord:
     votes_for: int
     alive_count: int
     nomination_id: str | None = None
-    ts: datetime = field(default_factory=datetime.utcnow)
+    ts: int = field(default_factory=now_ms)
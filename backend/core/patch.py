@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+"""快照增量计算。
+
+生成 RFC 6902 (JSON Patch) 子集：仅使用 add / remove / replace 三种操作，
+前端按顺序应用即可把旧快照推进到新快照。
+"""
+
+from typing import Any
+
+
+def make_patch(old: Any, new: Any) -> list[dict[str, Any]]:
+    """计算从 old 到 new 的补丁操作列表，两者完全相同时返回空列表。"""
+
+    operations: list[dict[str, Any]] = []
+    _diff(old, new, "", operations)
+    return operations
+
+
+def _escape(token: Any) -> str:
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+
+def _diff(old: Any, new: Any, path: str, operations: list[dict[str, Any]]) -> None:
+    if old is new:
+        return
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in old:
+            if key not in new:
+                operations.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        for key, value in new.items():
+            child_path = f"{path}/{_escape(key)}"
+            if key not in old:
+                operations.append({"op": "add", "path": child_path, "value": value})
+            else:
+                _diff(old[key], value, child_path, operations)
+        return
+    if isinstance(old, list) and isinstance(new, list):
+        common = min(len(old), len(new))
+        for index in range(common):
+            _diff(old[index], new[index], f"{path}/{index}", operations)
+        for index in range(len(old) - 1, common - 1, -1):
+            # 从尾部向前删除，保证前端逐条应用时下标依旧有效。
+            operations.append({"op": "remove", "path": f"{path}/{index}"})
+        for value in new[common:]:
+            operations.append({"op": "add", "path": f"{path}/-", "value": value})
+        return
+    # bool 是 int 的子类，需同时比较类型，避免 True -> 1 被视为未变化。
+    if type(old) is not type(new) or old != new:
+        operations.append({"op": "replace", "path": path, "value": new})
@@ -0,0 +1,383 @@
+from __future__ import annotations
+
+"""按日志回放房间：主持人可以拖动到对局中任意一条日志，查看当时的魔典（主持人视角快照）。
+
+回放只依赖房间的 LogEntry 流：从空房间开始逐条应用日志即可重建 RoomState。为了让跳转不必每次
+从头重放，每隔 checkpoint_every 条日志保存一份状态副本（检查点），跳转到第 k 条时从最近的检查点
+复制一份状态再重放剩余条目，耗时与到检查点的距离相关。日志只追加不修改，已建立的检查点一直有效。
+
+日志中不包含夜晚行动的 payload 与未确认的预分配方案，回放状态里这两部分为空；
+其余快照内容（座位、身份、生死、提名、投票、处决、结局）与当时一致。
+"""
+
+import copy
+from collections import OrderedDict
+from typing import Any, Callable
+
+from backend.core.models import (
+    ActionRecord,
+    ExecutionRecord,
+    LifeStatus,
+    LogEntry,
+    NominationRecord,
+    Phase,
+    PlayerState,
+    RoleAssignment,
+    RoleAttachment,
+    RoomState,
+    VoteBucket,
+    VoteRecord,
+    VoteSessionState,
+)
+from backend.core.service import RoomPrincipal, RoomService, build_snapshot
+
+# 最多为多少个房间保留回放检查点，超过后淘汰最久未使用的房间。
+REPLAY_CACHED_ROOMS = 64
+
+
+class RoomReplay:
+    """单个房间的回放状态与检查点。"""
+
+    def __init__(self, room: RoomState, *, checkpoint_every: int) -> None:
+        self._room = room
+        self._checkpoint_every = max(1, checkpoint_every)
+        # _checkpoints[i] 为应用前 i * checkpoint_every 条日志之后的状态，只读，使用前先复制。
+        self._checkpoints = [_empty_state(room)]
+
+    def state_at(self, log_id: int) -> RoomState:
+        """应用 ID 不大于 log_id 的全部日志后的房间状态（调用方可以随意修改返回值）。"""
+
+        logs = self._room.logs
+        count = logs.position_after(log_id)
+        nearest = count // self._checkpoint_every
+        while len(self._checkpoints) <= nearest:
+            # 逐个补齐缺少的检查点，之后的跳转都能从附近的检查点开始。
+            state = _copy_state(self._checkpoints[-1])
+            start = (len(self._checkpoints) - 1) * self._checkpoint_every
+            for position in range(start, start + self._checkpoint_every):
+                apply_entry(state, logs[position])
+            self._checkpoints.append(state)
+        state = _copy_state(self._checkpoints[nearest])
+        for position in range(nearest * self._checkpoint_every, count):
+            apply_entry(state, logs[position])
+        return state
+
+
+class RoomReplayCache:
+    """按房间缓存 RoomReplay，房间被回收时由 RoomSweeper 通知清理。"""
+
+    def __init__(self, room_service: RoomService, *, checkpoint_every: int = 100) -> None:
+        self.room_service = room_service
+        self._checkpoint_every = checkpoint_every
+        self._replays: OrderedDict[str, RoomReplay] = OrderedDict()
+
+    def snapshot_at(self, room_id: str, log_id: int) -> dict[str, Any]:
+        """返回应用到 log_id（含）为止时的主持人视角快照，以及实际对应的最后一条日志。"""
+
+        room = self.room_service.get_room(room_id)
+        replay = self._replays.get(room_id)
+        if replay is None:
+            replay = self._replays[room_id] = RoomReplay(room, checkpoint_every=self._checkpoint_every)
+            if len(self._replays) > REPLAY_CACHED_ROOMS:
+                self._replays.popitem(last=False)
+        else:
+            self._replays.move_to_end(room_id)
+        state = replay.state_at(log_id)
+        host = RoomPrincipal(room_id=room.id, player_id=room.host_player_id, seat=0, is_host=True)
+        count = room.logs.position_after(log_id)
+        return {
+            "at": room.logs[count - 1].id if count else None,
+            "snapshot": build_snapshot(state, host),
+        }
+
+    def forget(self, room_id: str) -> None:
+        self._replays.pop(room_id, None)
+
+
+# Applying log entries -----------------------------------------------------
+def apply_entry(room: RoomState, entry: LogEntry) -> None:
+    """把一条日志应用到回放状态上，规则与 RoomService 中产生该日志的操作一致。"""
+
+    handler = _HANDLERS.get(entry.kind)
+    if handler is not None:
+        # 未知类型的日志（例如之后新增的纯记录型日志）不影响状态，直接跳过。
+        handler(room, entry, entry.payload)
+    room.version = entry.id
+
+
+def _room_created(room: RoomState, entry: LogEntry, payload: dict[str, Any]) -> None:
+    room.add_player(
+        PlayerState(
+            id=room.host_player_id,
+            room_id=room.id,
+            name=payload["host_name"],
+            seat=0,
+            joined_at=entry.ts,
+            is_host=True,
+        )
+    )
+
+
+def _player_joined(room: RoomState, entry: LogEntry, payload: dict[str, Any]) -> None:
+    room.add_player(
+        PlayerState(
+            id=payload.get("player_id") or f"log-{entry.id}",
+            room_id=room.id,
+            name=payload["name"],
+            seat=payload["seat"],
+            joined_at=entry.ts,
+        )
+    )
+
+
+def _seat_changed(room: RoomState, entry: LogEntry, payload: dict[str, Any]) -> None:
+    player = _find_player(room, payload)
+    if player is not None:
+        room.set_seat(player, payload["seat"])
+
+
+def _roles_assigned(room: RoomState, entry: LogEntry, payload: dict[str, Any]) -> None:
+    # 检查点经 JSON 往返后座位键变为字符串，统一转回整数。
+    assignments = {
+        int(seat): RoleAssignment(
+            role_id=bundle["role"],
+            attachments=[
+                RoleAttachment(slot=att["slot"], index=att["index"], role_id=att["role"])
+                for att in bundle["attachments"]
+            ],
+        )
+        for seat, bundle in payload["player_roles"].items()
+    }
+    for player in room.list_players():
+        if player.seat <= 0:
+            continue
+        bundle = assignments.get(player.seat)
+        player.role_id = bundle.role_id if bundle else None
+        player.role_attachments = list(bundle.attachments) if bundle else []
+    room.assignments_seed = payload.get("seed")
+    room.pending_assignments = assignments
+
+
+def _phase_changed(room: RoomState, entry: LogEntry, payload: dict[str, Any]) -> None:
+    phase = Phase(payload["to"])
+    if phase != Phase.VOTE:
+        room.vote_session = None
+    room.phase = phase
+    room.day = payload["day"]
+    room.night = payload["night"]
+
+
+def _game_reset(room: RoomState, entry: LogEntry, payload: dict[str, Any]) -> None:
+    room.phase = Phase.LOBBY
+    room.day = 1
+    room.night = 0
+    room.assignments_seed = None
+    room.pending_assignments = {}
+    room.nominations = {}
+    room.votes = {}
+    room.actions = []
+    room.game_result = None
+    room.vote_session = None
+    room.executions = []
+    for player in room.players.values():
+        player.set_life_status(LifeStatus.ALIVE)
+        player.role_id = None
+        player.role_attachments = []
+
+
+def _game_result_set(room: RoomState, entry: LogEntry, payload: dict[str, Any]) -> None:
+    room.game_result = payload["result"]
+
+
+def _status_changed(room: RoomState, entry: LogEntry, payload: dict[str, Any]) -> None:
+    player = _find_player(room, payload)
+    if player is not None:
+        player.set_life_status(LifeStatus(payload["status"]))
+
+
+def _nominated(room: RoomState, entry: LogEntry, payload: dict[str, Any]) -> None:
+    nomination = NominationRecord(
+        id=payload.get("nomination_id") or f"log-{entry.id}",
+        room_id=room.id,
+        day=room.day,
+        nominee_seat=payload["nominee"],
+        nominator_seat=payload["by"],
+        ts=entry.ts,
+        confirmed=True,
+    )
+    room.nominations[nomination.id] = nomination
+    room.vote_session = None
+
+
+def _vote_started(room: RoomState, entry: LogEntry, payload: dict[str, Any]) -> None:
+    nomination = room.nominations.get(payload["nomination_id"])
+    if nomination is None:
+        return
+    nomination.vote_started = True
+    nomination.vote_completed = False
+    room.vote_session = VoteSessionState(nomination_id=nomination.id, order=payload.get("order", []))
+    room.votes.pop(nomination.id, None)
+    _settle_vote_session(room, nomination)
+
+
+def _vote_cast(room: RoomState, entry: LogEntry, payload: dict[str, Any]) -> None:
+    nomination = room.nominations.get(payload["nomination_id"])
+    session = room.vote_session
+    if nomination is None or session is None:
+        return
+    player = _find_player(room, payload) or room.player_by_seat(payload["voter"])
+    if player is None:
+        return
+    value = payload["value"]
+    room.votes_for(nomination.id).add(
+        VoteRecord(
+            id=entry.id,
+            room_id=room.id,
+            day=room.day,
+            nomination_id=nomination.id,
+            nominee_seat=nomination.nominee_seat,
+            voter_seat=player.seat,
+            player_id=player.id,
+            value=value,
+            ts=entry.ts,
+        )
+    )
+    session.votes[player.id] = value
+    session.current_index += 1
+    if value:
+        player.spend_ghost_vote()
+    _settle_vote_session(room, nomination)
+
+
+def _nomination_reverted(room: RoomState, entry: LogEntry, payload: dict[str, Any]) -> None:
+    nomination_id = payload["nomination_id"]
+    room.nominations.pop(nomination_id, None)
+    room.votes.pop(nomination_id, None)
+    if room.vote_session and room.vote_session.nomination_id == nomination_id:
+        room.vote_session = None
+
+
+def _nomination_total_updated(room: RoomState, entry: LogEntry, payload: dict[str, Any]) -> None:
+    nomination = room.nominations.get(payload["nomination_id"])
+    if nomination is not None:
+        nomination.manual_vote_total = payload["total"]
+
+
+def _execution_recorded(room: RoomState, entry: LogEntry, payload: dict[str, Any]) -> None:
+    nomination_id = payload["nomination_id"]
+    nomination = room.nominations.get(nomination_id) if nomination_id else None
+    record = ExecutionRecord(
+        day=room.day,
+        nominee_seat=nomination.nominee_seat if nomination else None,
+        executed_seat=payload["executed"],
+        votes_for=payload["votes_for"],
+        alive_count=payload["alive_count"],
+        nomination_id=nomination_id,
+        ts=entry.ts,
+    )
+    room.executions = [rec for rec in room.executions if rec.day != room.day]
+    room.executions.append(record)
+
+
+def _action_recorded(room: RoomState, entry: LogEntry, payload: dict[str, Any]) -> None:
+    room.actions.append(
+        ActionRecord(
+            id=entry.id,
+            room_id=room.id,
+            night=payload["night"],
+            actor_seat=payload["actor"],
+            action_type=payload["type"],
+            target=payload["target"],
+            payload={},
+            ts=entry.ts,
+        )
+    )
+
+
+_HANDLERS: dict[str, Callable[[RoomState, LogEntry, dict[str, Any]], None]] = {
+    "room_created": _room_created,
+    "player_joined": _player_joined,
+    "seat_changed": _seat_changed,
+    "roles_assigned": _roles_assigned,
+    "phase_changed": _phase_changed,
+    "game_reset": _game_reset,
+    "game_result_set": _game_result_set,
+    "status_changed": _status_changed,
+    "nominated": _nominated,
+    "vote_started": _vote_started,
+    "vote_cast": _vote_cast,
+    "nomination_reverted": _nomination_reverted,
+    "nomination_total_updated": _nomination_total_updated,
+    "execution_recorded": _execution_recorded,
+    "action_recorded": _action_recorded,
+}
+
+
+def _settle_vote_session(room: RoomState, nomination: NominationRecord) -> None:
+    # 与 RoomService._advance_vote_session 一致：跳过已不在房间的玩家（不产生日志），轮空即结束。
+    # 无票玩家的自动反对票会作为单独的 vote_cast 日志出现，这里不代为投出。
+    session = room.vote_session
+    if session is None or session.finished:
+        return
+    while True:
+        current_id = session.current_player_id()
+        if current_id is None:
+            session.finished = True
+            nomination.vote_completed = True
+            return
+        if current_id in room.players:
+            return
+        session.votes[current_id] = False
+        session.current_index += 1
+
+
+def _find_player(room: RoomState, payload: dict[str, Any]) -> PlayerState | None:
+    player_id = payload.get("player_id")
+    if player_id is not None:
+        return room.players.get(player_id)
+    # 早期日志只记录了玩家名字。
+    name = payload.get("player")
+    return next((player for player in room.players.values() if player.name == name), None)
+
+
+# State copies -------------------------------------------------------------
+def _empty_state(room: RoomState) -> RoomState:
+    return RoomState(
+        id=room.id,
+        code=room.code,
+        join_code=room.join_code,
+        script_id=room.script_id,
+        phase=Phase.LOBBY,
+        created_at=room.created_at,
+        host_player_id=room.host_player_id,
+    )
+
+
+def _copy_state(room: RoomState) -> RoomState:
+    """复制回放状态。投票 / 行动 / 处决记录写入后不再修改，只复制容器；玩家、提名与投票进度逐个复制。"""
+
+    state = copy.copy(room)
+    players = {player_id: copy.copy(player) for player_id, player in room.players.items()}
+    state.players = {}
+    for player in players.values():
+        state.add_player(player)
+    state.nominations = {
+        nomination_id: copy.copy(nomination) for nomination_id, nomination in room.nominations.items()
+    }
+    state.votes = {
+        nomination_id: VoteBucket(votes=list(bucket.votes), yes=bucket.yes, no=bucket.no)
+        for nomination_id, bucket in room.votes.items()
+    }
+    state.actions = list(room.actions)
+    state.executions = list(room.executions)
+    state.pending_assignments = dict(room.pending_assignments)
+    session = room.vote_session
+    if session is not None:
+        state.vote_session = VoteSessionState(
+            nomination_id=session.nomination_id,
+            order=session.order,
+            current_index=session.current_index,
+            finished=session.finished,
+            votes=dict(session.votes),
+        )
+    return state
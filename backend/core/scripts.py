@@ -1,11 +1,32 @@
 from __future__ import annotations
 
-"""内置剧本定义。"""
+"""内置剧本定义。
 
-from backend.core.models import Script
+剧本在加载时编译为 CompiledScript：角色索引、阵营分组、规范化的附加槽定义、
+按人数直接下标访问的阵营人数表，以及下发给前端的剧本数据，都只计算一次。
+完整剧本数据由 GET /api/scripts/{id} 单独提供，快照中只引用剧本 ID 与版本。
+"""
+
+import hashlib
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Mapping
+
+from backend.core.encoding import dumps
+from backend.core.models import Script, ScriptRole
 from backend.core.roles import iter_roles
 
 
+TEAM_LABELS = {
+    "townsfolk": "镇民",
+    "outsider": "外来者",
+    "minion": "爪牙",
+    "demon": "恶魔",
+}
+
+
 TROUBLE_BREWING_ROLE_IDS = [
     "washerwoman",
     "librarian",
@@ -59,4 +80,212 @@ DEFAULT_SCRIPT = Script(
     },
 )
 
-SCRIPTS = {DEFAULT_SCRIPT.id: DEFAULT_SCRIPT}
+
+
+@dataclass(frozen=True)
+class SlotDefinition:
+    """角色附加槽（如酒鬼误以为的角色、恶魔伪装）的规范化定义。"""
+
+    id: str
+    label: str
+    count: int
+    allow_duplicates: bool
+    team_filter: tuple[str, ...] | None
+    owner_view: str | None
+    # 原始定义，原样下发给前端。
+    raw: Mapping[str, Any]
+
+
+@dataclass(frozen=True)
+class CompiledScript:
+    """剧本的只读索引形式，由 compile_script 生成，运行期间不应修改。"""
+
+    source: Script
+    role_by_id: Mapping[str, ScriptRole]
+    roles_by_team: Mapping[str, tuple[ScriptRole, ...]]
+    slots_by_role: Mapping[str, tuple[SlotDefinition, ...]]
+    # 角色 ID -> {槽位 ID: 槽位定义}，快照与分配校验按槽位 ID 查找时直接使用。
+    slot_map_by_role: Mapping[str, Mapping[str, SlotDefinition]]
+    # team_count_table[n] 为 n 名玩家时的阵营人数；超出表长时取最后一项。
+    team_count_table: tuple[Mapping[str, int], ...]
+    # 下发给前端的剧本数据（角色列表、各人数配置），多处共享同一对象，调用方不得修改。
+    roles_payload: list[dict[str, Any]]
+    team_distribution_payload: dict[int, dict[str, int]]
+
+    @property
+    def id(self) -> str:
+        return self.source.id
+
+    @property
+    def name(self) -> str:
+        return self.source.name
+
+    @property
+    def version(self) -> str:
+        return self.source.version
+
+    @property
+    def roles(self) -> list[ScriptRole]:
+        return self.source.roles
+
+    @property
+    def rules(self) -> dict[str, Any]:
+        return self.source.rules
+
+    def team_counts(self, player_count: int) -> Mapping[str, int]:
+        return self.team_count_table[self.player_count_key(player_count)]
+
+    def player_count_key(self, player_count: int) -> int:
+        """把人数收敛到阵营人数表的下标范围内，人数超出表长时阵营配置不再变化。"""
+
+        return min(max(player_count, 0), len(self.team_count_table) - 1)
+
+    def slots_for(self, role: ScriptRole | None) -> tuple[SlotDefinition, ...]:
+        if role is None:
+            return ()
+        return self.slots_by_role.get(role.id, ())
+
+    def slot_map(self, role: ScriptRole | None) -> Mapping[str, SlotDefinition]:
+        if role is None:
+            return _NO_SLOTS
+        return self.slot_map_by_role.get(role.id, _NO_SLOTS)
+
+
+_NO_SLOTS: Mapping[str, SlotDefinition] = MappingProxyType({})
+
+
+def compile_script(script: Script) -> CompiledScript:
+    role_by_id = {role.id: role for role in script.roles}
+    roles_by_team: dict[str, list[ScriptRole]] = {}
+    for role in script.roles:
+        roles_by_team.setdefault(role.team, []).append(role)
+    slots_by_role = {role.id: _compile_slots(role) for role in script.roles}
+    return CompiledScript(
+        source=script,
+        role_by_id=MappingProxyType(role_by_id),
+        roles_by_team=MappingProxyType({team: tuple(roles) for team, roles in roles_by_team.items()}),
+        slots_by_role=MappingProxyType(slots_by_role),
+        slot_map_by_role=MappingProxyType(
+            {
+                role_id: MappingProxyType({slot.id: slot for slot in slots})
+                for role_id, slots in slots_by_role.items()
+            }
+        ),
+        team_count_table=_team_count_table(script),
+        roles_payload=[_role_payload(role, slots_by_role[role.id]) for role in script.roles],
+        team_distribution_payload={
+            players: dict(counts) for players, counts in script.team_distribution.items()
+        },
+    )
+
+
+def _compile_slots(role: ScriptRole) -> tuple[SlotDefinition, ...]:
+    slots: list[SlotDefinition] = []
+    for slot_def in (role.meta or {}).get("attachment_slots", []):
+        if not isinstance(slot_def, dict) or not slot_def.get("id"):
+            continue
+        team_filter = slot_def.get("team_filter")
+        slots.append(
+            SlotDefinition(
+                id=slot_def["id"],
+                label=slot_def.get("label", slot_def["id"]),
+                count=int(slot_def.get("count", 1)),
+                allow_duplicates=bool(slot_def.get("allow_duplicates", False)),
+                team_filter=tuple(team_filter) if team_filter else None,
+                owner_view=slot_def.get("owner_view"),
+                raw=MappingProxyType(dict(slot_def)),
+            )
+        )
+    return tuple(slots)
+
+
+def _team_count_table(script: Script) -> tuple[Mapping[str, int], ...]:
+    distribution = script.team_distribution
+    if not distribution:
+        # 未配置人数表时，任何人数都按剧本中各阵营的角色数量计算。
+        return (MappingProxyType(dict(Counter(role.team for role in script.roles))),)
+    sorted_keys = sorted(distribution)
+    table: list[Mapping[str, int]] = []
+    for player_count in range(sorted_keys[-1] + 1):
+        # 人数不在表中时取不超过该人数的最大配置，人数过少时取最小配置。
+        fallback_key = sorted_keys[0]
+        for key in sorted_keys:
+            if key <= player_count:
+                fallback_key = key
+        table.append(MappingProxyType(dict(distribution[fallback_key])))
+    return tuple(table)
+
+
+def _role_payload(role: ScriptRole, slots: tuple[SlotDefinition, ...]) -> dict[str, Any]:
+    return {
+        "id": role.id,
+        "name": role.name,
+        "name_localized": role.name_localized,
+        "team": role.team,
+        "team_label": TEAM_LABELS.get(role.team),
+        "description": role.meta.get("description") if role.meta else None,
+        "attachment_slots": [dict(slot.raw) for slot in slots],
+    }
+
+
+SCRIPTS = {DEFAULT_SCRIPT.id: compile_script(DEFAULT_SCRIPT)}
+DEFAULT_COMPILED_SCRIPT = SCRIPTS[DEFAULT_SCRIPT.id]
+
+# 已编码剧本数据的缓存上限：key 为（剧本、收敛后的人数、语言），数量有限，上限只是兜底。
+SCRIPT_PAYLOAD_CACHE_SIZE = 128
+
+
+@dataclass(frozen=True)
+class EncodedScript:
+    data: bytes
+    etag: str
+
+
+def script_reference(script: CompiledScript, player_count: int) -> dict[str, Any]:
+    """快照中的剧本引用：前端按 id 与 version 获取并缓存完整剧本数据。"""
+
+    return {
+        "id": script.id,
+        "version": script.version,
+        "team_counts": dict(script.team_counts(player_count)),
+    }
+
+
+def script_payload(
+    script: CompiledScript, player_count: int | None = None, locale: str | None = None
+) -> dict[str, Any]:
+    """完整的剧本数据；指定 locale 时角色 name 使用对应语言的名称（若有）。"""
+
+    roles = script.roles_payload
+    if locale:
+        roles = [
+            {**role, "name": role["name_localized"].get(locale, role["name"])} for role in roles
+        ]
+    payload: dict[str, Any] = {
+        "id": script.id,
+        "name": script.name,
+        "version": script.version,
+        "team_distribution": script.team_distribution_payload,
+        "roles": roles,
+        "rules": dict(script.rules),
+    }
+    if player_count is not None:
+        payload["team_counts"] = dict(script.team_counts(player_count))
+    return payload
+
+
+def encoded_script(
+    script_id: str, player_count: int | None = None, locale: str | None = None
+) -> EncodedScript:
+    """返回已编码的剧本数据及其 ETag；剧本不存在时抛出 KeyError。"""
+
+    script = SCRIPTS[script_id]
+    if player_count is not None:
+        player_count = script.player_count_key(player_count)
+    return _encoded_script(script_id, player_count, locale)
+
+
+@lru_cache(maxsize=SCRIPT_PAYLOAD_CACHE_SIZE)
+def _encoded_script(script_id: str, player_count: int | None, locale: str | None) -> EncodedScript:
+    data = dumps(script_payload(SCRIPTS[script_id], player_count, locale))
+    return EncodedScript(data=data, etag=f'"{hashlib.sha1(data).hexdigest()}"')
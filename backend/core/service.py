@@ -6,13 +6,21 @@ RoomService 负责管理房间生命周期、玩家状态、阶段切换等核
 
 from __future__ import annotations
 
+import functools
+import inspect
+import logging
 import random
 import secrets
+import time
 import uuid
-from collections import Counter, defaultdict
-from datetime import datetime
-from typing import Any, Iterable
-
+import zlib
+from collections import Counter, defaultdict, deque
+from dataclasses import dataclass, field
+from itertools import chain, islice
+from typing import Any, Callable, Iterable, Iterator, Mapping, TypeVar
+
+from backend.core.encoding import dumps, loads
+from backend.core.journal import RoomJournal, decode_assignment, decode_room, encode_room, to_plain
 from backend.core.models import (
     ActionRecord,
     ExecutionRecord,
@@ -24,22 +32,51 @@ from backend.core.models import (
     RoleAssignment,
     RoleAttachment,
     RoomState,
-    Script,
     ScriptRole,
+    VoteBucket,
     VoteRecord,
     VoteSessionState,
+    iso_local,
+    iso_utc,
+    now_ms,
 )
-from backend.core.scripts import DEFAULT_SCRIPT, SCRIPTS
-
-TEAM_LABELS = {
-    "townsfolk": "镇民",
-    "outsider": "外来者",
-    "minion": "爪牙",
-    "demon": "恶魔",
-}
+from backend.core.scripts import (
+    DEFAULT_COMPILED_SCRIPT,
+    SCRIPTS,
+    TEAM_LABELS,
+    CompiledScript,
+    script_reference,
+)
+from backend.core.sharding import ShardSpec
 
 TEAM_DISPLAY_ORDER = ["townsfolk", "outsider", "minion", "demon"]
 
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _SnapshotCache:
+    version: int
+    snapshots: dict[str, dict[str, Any]] = field(default_factory=dict)
+    encoded: dict[str, bytes] = field(default_factory=dict)
+
+
+@dataclass
+class _SnapshotHistory:
+    """回放缓冲中的一个历史版本：各视角快照编码后拼接为一段再整体压缩，按需解压出单个视角。"""
+
+    version: int
+    # view_key -> 该视角在解压后数据中的 (起, 止) 偏移。
+    spans: dict[str, tuple[int, int]]
+    compressed: bytes
+
+    def snapshot(self, view_key: str) -> dict[str, Any] | None:
+        span = self.spans.get(view_key)
+        if span is None:
+            return None
+        start, end = span
+        return loads(zlib.decompress(self.compressed)[start:end])
+
 
 class RoomNotFoundError(KeyError):
     pass
@@ -49,20 +86,105 @@ class AuthorizationError(RuntimeError):
     pass
 
 
+class RoomCapacityError(RuntimeError):
+    pass
+
+
+_Method = TypeVar("_Method", bound=Callable[..., Any])
+
+
+def _journaled(method: _Method) -> _Method:
+    """把成功执行的变更写入 journal：记录操作名、参数与执行期间生成的随机值。
+
+    嵌套调用（变更方法内部调用另一个变更方法）与恢复时的重放不会重复记录。
+    """
+
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self: RoomService, *args: Any, **kwargs: Any) -> Any:
+        if self._journal is None or self._entropy is not None or self._replaying is not None:
+            return method(self, *args, **kwargs)
+        arguments = signature.bind(self, *args, **kwargs).arguments
+        # 先把参数转为基础类型再执行，方法内部修改参数对象也不影响记录内容。
+        recorded = {name: to_plain(value) for name, value in arguments.items() if name != "self"}
+        self._entropy = []
+        try:
+            result = method(self, *args, **kwargs)
+        finally:
+            entropy, self._entropy = self._entropy, None
+        room_id = recorded["room_id"] if "room_id" in recorded else result.id
+        self._record(room_id, method.__name__, recorded, entropy)
+        return result
+
+    return wrapper  # type: ignore[return-value]
+
+
+def _decode_assign_roles(arguments: dict[str, Any]) -> dict[str, Any]:
+    assignments = arguments.get("assignments")
+    if assignments is not None:
+        arguments["assignments"] = {
+            int(seat): decode_assignment(assignment) for seat, assignment in assignments.items()
+        }
+    return arguments
+
+
+# journal 中的参数为 JSON 基础类型，重放前需还原为方法期望的类型。
+_REPLAY_DECODERS: dict[str, Callable[[dict[str, Any]], dict[str, Any]]] = {
+    "assign_roles": _decode_assign_roles,
+    "change_phase": lambda arguments: {**arguments, "to_phase": Phase(arguments["to_phase"])},
+    "set_player_status": lambda arguments: {**arguments, "status": LifeStatus(arguments["status"])},
+}
+
+
 class RoomService:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        *,
+        replay_buffer_size: int = 16,
+        replay_buffer_bytes: int = 256 * 1024,
+        max_rooms: int = 0,
+        journal: RoomJournal | None = None,
+        checkpoint_every: int = 200,
+        shard: ShardSpec | None = None,
+    ) -> None:
         self._rooms: dict[str, RoomState] = {}
+        # 常驻房间数上限，0 表示不限制；达到上限时拒绝创建新房间，而不是任由内存增长。
+        self._max_rooms = max_rooms
+        # 快照缓存：room_id -> 某一版本下各视角的快照及其编码结果，版本号变化即整体失效。
+        self._snapshot_cache: dict[str, _SnapshotCache] = {}
+        # 回放缓冲：每个房间保留最近若干个版本已构建过的快照（编码后的字节），供断线重连的客户端计算增量；
+        # 同时按版本数与字节数（0 表示不限制）封顶，超出时丢弃最旧的版本。
+        self._replay_buffer_size = replay_buffer_size
+        self._replay_buffer_bytes = replay_buffer_bytes
+        self._snapshot_history: dict[str, deque[_SnapshotHistory]] = {}
+        self._snapshot_history_bytes: dict[str, int] = {}
+        # 加入码 / 房间码 -> room_id 索引，加入与观战时 O(1) 查找，避免每次遍历所有房间。
+        self._join_codes: dict[str, str] = {}
+        self._room_codes: dict[str, str] = {}
+        # 分片部署时只生成归属本分片的房间 ID、加入码与房间码，路由进程据此转发请求。
+        self._shard = shard
+        # 持久化：每次变更追加 journal 条目，每个房间累计 checkpoint_every 条后写入检查点。
+        self._journal = journal
+        self._checkpoint_every = checkpoint_every
+        self._entries_since_checkpoint: dict[str, int] = {}
+        # 变更执行期间生成的随机 ID / 时间戳（记录时）或待取用的已记录值（重放时）。
+        self._entropy: list[Any] | None = None
+        self._replaying: deque[Any] | None = None
 
     # Room lifecycle -----------------------------------------------------
+    @_journaled
     def create_room(
         self, host_name: str, *, host_user_id: int, script_id: str | None = None
     ) -> RoomState:
         # 创建房间时默认加载剧本，并生成主持人与加入验证码。
+        if self._max_rooms and len(self._rooms) >= self._max_rooms and self._replaying is None:
+            raise RoomCapacityError("当前房间数量已达上限，请稍后再试")
         script = self._get_script(script_id)
-        room_id = uuid.uuid4().hex
-        join_code = secrets.token_urlsafe(4)
-        access_code = secrets.token_urlsafe(6)
-        host_player_id = uuid.uuid4().hex
+        room_id = self._new_room_id()
+        join_code = self._unique_code(self._join_codes, 4)
+        access_code = self._unique_code(self._room_codes, 6)
+        host_player_id = self._new_id()
 
         room = RoomState(
             id=room_id,
@@ -70,53 +192,144 @@ class RoomService:
             join_code=join_code,
             script_id=script.id,
             phase=Phase.LOBBY,
-            created_at=datetime.now(),
+            created_at=self._now_ms(),
             host_player_id=host_player_id,
         )
 
         # Host is also a player for auditing purposes but does not occupy a seat yet.
-        room.players[host_player_id] = PlayerState(
-            id=host_player_id,
-            room_id=room_id,
-            name=host_name,
-            seat=0,
-            is_host=True,
-            user_id=host_user_id,
+        room.add_player(
+            PlayerState(
+                id=host_player_id,
+                room_id=room.id,
+                name=host_name,
+                seat=0,
+                joined_at=self._now_ms(),
+                is_host=True,
+                user_id=host_user_id,
+            )
         )
 
         room.logs.append(
             LogEntry(
-                id=uuid.uuid4().hex,
-                room_id=room_id,
-                ts=datetime.now(),
+                id=room.next_record_id(),
+                room_id=room.id,
+                ts=self._now_ms(),
+                day=room.day,
                 kind="room_created",
                 payload={"script_id": script.id, "host_name": host_name},
             )
         )
-        self._rooms[room_id] = room
+        self._register(room)
+        return room
+
+    def remove_room(self, room_id: str) -> RoomState:
+        """移除房间并清理加入码索引与快照缓存。"""
+
+        room = self.get_room(room_id)
+        del self._rooms[room_id]
+        if self._join_codes.get(room.join_code) == room_id:
+            del self._join_codes[room.join_code]
+        if self._room_codes.get(room.code) == room_id:
+            del self._room_codes[room.code]
+        self._snapshot_cache.pop(room_id, None)
+        self.release_history(room_id)
+        self._entries_since_checkpoint.pop(room_id, None)
+        if self._journal is not None:
+            self._journal.drop(room_id)
         return room
 
+    def recover(self) -> int:
+        """从 journal 重建房间：先载入各房间最新检查点，再按顺序重放之后的条目，返回恢复的房间数。"""
+
+        if self._journal is None:
+            return 0
+        checkpoints, entries = self._journal.load()
+        for data in checkpoints.values():
+            self._register(decode_room(data))
+        replayed: Counter[str] = Counter()
+        for room_id, raw in entries:
+            entry = loads(raw)
+            operation = entry["op"]
+            decoder = _REPLAY_DECODERS.get(operation)
+            arguments = decoder(entry["args"]) if decoder else entry["args"]
+            self._replaying = deque(entry["entropy"])
+            try:
+                getattr(self, operation)(**arguments)
+            except Exception:
+                # 记录的都是执行成功的变更，重放失败说明条目损坏（或与当前代码不兼容），
+                # 任何异常都只跳过该条目并继续恢复其余房间，不让单条坏数据阻止服务启动。
+                logger.warning("跳过无法重放的 journal 条目：%s %s", room_id, operation, exc_info=True)
+            finally:
+                self._replaying = None
+            replayed[room_id] += 1
+        # 重放过的条目计入检查点计数，房间继续变更时照常按阈值写入检查点。
+        for room_id, count in replayed.items():
+            if room_id in self._rooms:
+                self._entries_since_checkpoint[room_id] = count
+        return len(self._rooms)
+
+    def _register(self, room: RoomState) -> None:
+        self._rooms[room.id] = room
+        self._join_codes[room.join_code] = room.id
+        self._room_codes[room.code] = room.id
+
+    def expired_rooms(
+        self, *, idle_ttl: float, finished_ttl: float, now: float | None = None
+    ) -> list[str]:
+        """返回超过空闲时限、或已公布结局且超过结束时限的房间 ID（时限为 0 表示不回收）。"""
+
+        now = time.monotonic() if now is None else now
+        expired = []
+        for room_id, room in self._rooms.items():
+            idle = now - room.last_active_at
+            if idle_ttl and idle >= idle_ttl:
+                expired.append(room_id)
+            elif finished_ttl and room.game_result is not None and idle >= finished_ttl:
+                expired.append(room_id)
+        return expired
+
     def list_rooms(self) -> Iterable[RoomState]:
         return self._rooms.values()
 
+    def room_count(self) -> int:
+        return len(self._rooms)
+
     def get_room(self, room_id: str) -> RoomState:
         try:
             return self._rooms[room_id]
         except KeyError as exc:  # pragma: no cover - trivial
             raise RoomNotFoundError(room_id) from exc
 
+    def room_version(self, room_id: str) -> int:
+        return self.get_room(room_id).version
+
     # Player management --------------------------------------------------
     def join_room_by_code(
         self, join_code: str, name: str, *, user_id: int | None = None
     ) -> tuple[RoomState, PlayerState]:
         """允许玩家通过加入码进入房间，初始座位号默认为 0。"""
 
-        for room in self._rooms.values():
-            if room.join_code == join_code:
-                player = self._add_player(room, name, user_id=user_id)
-                return room, player
-        raise AuthorizationError("Invalid join code")
+        room_id = self.resolve_join_code(join_code)
+        player = self.join_room(room_id, name, join_code, user_id=user_id)
+        return self._rooms[room_id], player
+
+    def resolve_join_code(self, join_code: str) -> str:
+        """把加入码解析为房间 ID，加入本身交由调用方按房间顺序执行。"""
+
+        room_id = self._join_codes.get(join_code)
+        if room_id is None:
+            raise AuthorizationError("Invalid join code")
+        return room_id
+
+    def spectate_room_by_code(self, code: str) -> RoomState:
+        """旁观者通过房间码进入，只能看到对所有人公开的信息，不占用座位。"""
 
+        room_id = self._room_codes.get(code)
+        if room_id is None:
+            raise AuthorizationError("Invalid room code")
+        return self._rooms[room_id]
+
+    @_journaled
     def join_room(
         self, room_id: str, name: str, code: str, *, user_id: int | None = None
     ) -> PlayerState:
@@ -127,6 +340,7 @@ class RoomService:
             raise AuthorizationError("Invalid join code")
         return self._add_player(room, name, user_id=user_id)
 
+    @_journaled
     def update_player_seat(
         self, room_id: str, player_id: str, seat: int, *, allow_override: bool = False
     ) -> PlayerState:
@@ -143,22 +357,24 @@ class RoomService:
         if not allow_override and room.phase != Phase.LOBBY:
             raise ValueError("仅在大厅阶段可以自行调整座位")
 
-        player.seat = seat
+        room.set_seat(player, seat)
         room.logs.append(
             LogEntry(
-                id=uuid.uuid4().hex,
-                room_id=room_id,
-                ts=datetime.now(),
+                id=room.next_record_id(),
+                room_id=room.id,
+                ts=self._now_ms(),
+                day=room.day,
                 kind="seat_changed",
-                payload={"player": player.name, "seat": seat},
+                payload={"player": player.name, "player_id": player.id, "seat": seat},
             )
         )
+        self._touch(room)
         return player
 
     def _add_player(
         self, room: RoomState, name: str, *, user_id: int | None = None
     ) -> PlayerState:
-        player_id = uuid.uuid4().hex
+        player_id = self._new_id()
         player_count = sum(1 for existing in room.players.values() if not existing.is_host)
         seat = player_count + 1
         player = PlayerState(
@@ -166,21 +382,25 @@ class RoomService:
             room_id=room.id,
             name=name,
             seat=seat,
+            joined_at=self._now_ms(),
             user_id=user_id,
         )
-        room.players[player_id] = player
+        room.add_player(player)
         room.logs.append(
             LogEntry(
-                id=uuid.uuid4().hex,
+                id=room.next_record_id(),
                 room_id=room.id,
-                ts=datetime.now(),
+                ts=self._now_ms(),
+                day=room.day,
                 kind="player_joined",
-                payload={"seat": player.seat, "name": name},
+                payload={"seat": player.seat, "name": name, "player_id": player.id},
             )
         )
+        self._touch(room)
         return player
 
     # Role assignment ----------------------------------------------------
+    @_journaled
     def assign_roles(
         self,
         room_id: str,
@@ -216,9 +436,10 @@ class RoomService:
             room.pending_assignments = validated
             room.logs.append(
                 LogEntry(
-                    id=uuid.uuid4().hex,
-                    room_id=room_id,
-                    ts=datetime.now(),
+                    id=room.next_record_id(),
+                    room_id=room.id,
+                    ts=self._now_ms(),
+                    day=room.day,
                     kind="roles_assigned",
                     payload={
                         "seed": room.assignments_seed,
@@ -239,24 +460,28 @@ class RoomService:
                     },
                 )
             )
+            self._touch(room)
             return validated
 
         if assignments is not None:
             validated = self._validate_assignments(
                 room, assignments, script, require_full=False
             )
-            seed_value = room.assignments_seed or secrets.token_hex(8)
+            seed_value = room.assignments_seed or self._random_seed()
             if not room.assignments_seed:
                 room.assignments_seed = seed_value
             self._auto_fill_attachments(script, validated, random.Random(seed_value))
             room.pending_assignments = validated
+            self._touch(room)
             return validated
 
         generated = self._generate_random_assignments(room, script, seed)
         room.pending_assignments = generated
+        self._touch(room)
         return generated
 
     # Phase transitions --------------------------------------------------
+    @_journaled
     def change_phase(self, room_id: str, to_phase: Phase) -> Phase:
         room = self.get_room(room_id)
         if room.phase == to_phase:
@@ -288,15 +513,18 @@ class RoomService:
 
         room.logs.append(
             LogEntry(
-                id=uuid.uuid4().hex,
-                room_id=room_id,
-                ts=datetime.now(),
+                id=room.next_record_id(),
+                room_id=room.id,
+                ts=self._now_ms(),
+                day=room.day,
                 kind="phase_changed",
                 payload={"to": to_phase.value, "day": room.day, "night": room.night},
             )
         )
+        self._touch(room)
         return room.phase
 
+    @_journaled
     def reset_room(self, room_id: str) -> RoomState:
         room = self.get_room(room_id)
         room.phase = Phase.LOBBY
@@ -320,15 +548,18 @@ class RoomService:
 
         room.logs.append(
             LogEntry(
-                id=uuid.uuid4().hex,
-                room_id=room_id,
-                ts=datetime.now(),
+                id=room.next_record_id(),
+                room_id=room.id,
+                ts=self._now_ms(),
+                day=room.day,
                 kind="game_reset",
                 payload={},
             )
         )
+        self._touch(room)
         return room
 
+    @_journaled
     def set_game_result(self, room_id: str, result: str | None) -> str | None:
         room = self.get_room(room_id)
         script = self._get_script(room.script_id)
@@ -340,15 +571,18 @@ class RoomService:
         room.game_result = result
         room.logs.append(
             LogEntry(
-                id=uuid.uuid4().hex,
-                room_id=room_id,
-                ts=datetime.now(),
+                id=room.next_record_id(),
+                room_id=room.id,
+                ts=self._now_ms(),
+                day=room.day,
                 kind="game_result_set",
                 payload={"result": result},
             )
         )
+        self._touch(room)
         return room.game_result
 
+    @_journaled
     def set_player_status(
         self, room_id: str, player_id: str, status: LifeStatus
     ) -> PlayerState:
@@ -358,38 +592,36 @@ class RoomService:
         except KeyError as exc:
             raise ValueError("找不到玩家") from exc
 
-        player.life_status = status
-        if status == LifeStatus.ALIVE:
-            player.is_alive = True
-            player.ghost_vote_used = False
-        elif status == LifeStatus.FAKE_DEAD_VOTE:
-            player.is_alive = True
-            player.ghost_vote_used = False
-        elif status == LifeStatus.FAKE_DEAD_NO_VOTE:
-            player.is_alive = True
-            player.ghost_vote_used = True
-        elif status == LifeStatus.DEAD_VOTE:
-            player.is_alive = False
-            player.ghost_vote_used = False
-        elif status == LifeStatus.DEAD_NO_VOTE:
-            player.is_alive = False
-            player.ghost_vote_used = True
+        player.set_life_status(status)
 
         room.logs.append(
             LogEntry(
-                id=uuid.uuid4().hex,
-                room_id=room_id,
-                ts=datetime.now(),
+                id=room.next_record_id(),
+                room_id=room.id,
+                ts=self._now_ms(),
+                day=room.day,
                 kind="status_changed",
-                payload={"player": player.name, "status": status.value},
+                payload={
+                    "player": player.name,
+                    "player_id": player.id,
+                    "seat": player.seat,
+                    "status": status.value,
+                },
             )
         )
+        self._touch(room)
         return player
 
+    @_journaled
     def add_nomination(self, room_id: str, nominee_seat: int, nominator_seat: int) -> NominationRecord:
         room = self.get_room(room_id)
-        current_day_nominations = [n for n in room.nominations if n.day == room.day]
-        if len(current_day_nominations) >= 3:
+        current_day_nominations = 0
+        # 提名按时间先后存放，从最新的开始数，遇到更早的日期即可停止。
+        for existing in reversed(room.nominations.values()):
+            if existing.day != room.day:
+                break
+            current_day_nominations += 1
+        if current_day_nominations >= 3:
             raise ValueError("当天提名次数已达 3 次上限")
         nominee = room.player_by_seat(nominee_seat)
         nominator = room.player_by_seat(nominator_seat)
@@ -398,34 +630,37 @@ class RoomService:
         if nominator is None:
             raise ValueError("找不到提名者")
         nomination = NominationRecord(
-            id=uuid.uuid4().hex,
-            room_id=room_id,
+            id=self._new_id(),
+            room_id=room.id,
             day=room.day,
             nominee_seat=nominee_seat,
             nominator_seat=nominator_seat,
+            ts=self._now_ms(),
             confirmed=True,
             vote_started=False,
             vote_completed=False,
         )
-        room.nominations.append(nomination)
+        room.nominations[nomination.id] = nomination
         room.vote_session = None
         room.logs.append(
             LogEntry(
-                id=uuid.uuid4().hex,
-                room_id=room_id,
-                ts=datetime.now(),
+                id=room.next_record_id(),
+                room_id=room.id,
+                ts=nomination.ts,
+                day=room.day,
                 kind="nominated",
-                payload={"nominee": nominee_seat, "by": nominator_seat},
+                payload={"nominee": nominee_seat, "by": nominator_seat, "nomination_id": nomination.id},
             )
         )
+        self._touch(room)
         return nomination
 
+    @_journaled
     def start_vote(self, room_id: str, nomination_id: str) -> VoteSessionState:
         room = self.get_room(room_id)
-        try:
-            nomination = next(n for n in room.nominations if n.id == nomination_id)
-        except StopIteration as exc:
-            raise ValueError("找不到对应的提名记录") from exc
+        nomination = room.nominations.get(nomination_id)
+        if nomination is None:
+            raise ValueError("找不到对应的提名记录")
         if nomination.day != room.day:
             raise ValueError("只能对当前日期的提名进行投票")
         order = self._build_vote_order(room, nomination.nominee_seat)
@@ -436,59 +671,62 @@ class RoomService:
         nomination.vote_started = True
         nomination.vote_completed = False
         room.vote_session = session
-        room.votes = [vote for vote in room.votes if vote.nomination_id != nomination_id]
-        self._advance_vote_session(room, nomination)
+        room.votes.pop(nomination_id, None)
+        # 先记录投票开始（含投票顺序），之后自动跳过的无票玩家各自记录 vote_cast，回放时按日志顺序即可重建。
         room.logs.append(
             LogEntry(
-                id=uuid.uuid4().hex,
-                room_id=room_id,
-                ts=datetime.now(),
+                id=room.next_record_id(),
+                room_id=room.id,
+                ts=self._now_ms(),
+                day=room.day,
                 kind="vote_started",
-                payload={"nomination_id": nomination_id},
+                payload={"nomination_id": nomination.id, "order": order},
             )
         )
+        self._advance_vote_session(room, nomination)
+        self._touch(room)
         return session
 
+    @_journaled
     def revert_nomination(self, room_id: str, nomination_id: str) -> None:
         room = self.get_room(room_id)
-        index = None
-        for idx, nomination in enumerate(room.nominations):
-            if nomination.id == nomination_id:
-                index = idx
-                break
-        if index is None:
+        if room.nominations.pop(nomination_id, None) is None:
             raise ValueError("找不到需要撤销的提名")
-        nomination = room.nominations.pop(index)
-        room.votes = [vote for vote in room.votes if vote.nomination_id != nomination_id]
+        room.votes.pop(nomination_id, None)
         if room.vote_session and room.vote_session.nomination_id == nomination_id:
             room.vote_session = None
         room.logs.append(
             LogEntry(
-                id=uuid.uuid4().hex,
-                room_id=room_id,
-                ts=datetime.now(),
+                id=room.next_record_id(),
+                room_id=room.id,
+                ts=self._now_ms(),
+                day=room.day,
                 kind="nomination_reverted",
                 payload={"nomination_id": nomination_id},
             )
         )
+        self._touch(room)
 
+    @_journaled
     def update_nomination_total(self, room_id: str, nomination_id: str, total: int | None) -> None:
         room = self.get_room(room_id)
-        try:
-            nomination = next(n for n in room.nominations if n.id == nomination_id)
-        except StopIteration as exc:
-            raise ValueError("找不到对应的提名记录") from exc
+        nomination = room.nominations.get(nomination_id)
+        if nomination is None:
+            raise ValueError("找不到对应的提名记录")
         nomination.manual_vote_total = total
         room.logs.append(
             LogEntry(
-                id=uuid.uuid4().hex,
-                room_id=room_id,
-                ts=datetime.now(),
+                id=room.next_record_id(),
+                room_id=room.id,
+                ts=self._now_ms(),
+                day=room.day,
                 kind="nomination_total_updated",
                 payload={"nomination_id": nomination_id, "total": total},
             )
         )
+        self._touch(room)
 
+    @_journaled
     def record_vote(
         self,
         room_id: str,
@@ -502,10 +740,9 @@ class RoomService:
         session = room.vote_session
         if session is None or session.nomination_id != nomination_id:
             raise ValueError("当前没有进行中的投票")
-        try:
-            nomination = next(n for n in room.nominations if n.id == nomination_id)
-        except StopIteration as exc:
-            raise ValueError("找不到对应的提名记录") from exc
+        nomination = room.nominations.get(nomination_id)
+        if nomination is None:
+            raise ValueError("找不到对应的提名记录")
         if nomination.day != room.day:
             raise ValueError("只能对当前日期的提名进行投票")
         if session.finished:
@@ -521,8 +758,10 @@ class RoomService:
         vote = self._apply_vote(room, nomination, session, player, value, auto=auto)
         if not auto:
             self._advance_vote_session(room, nomination)
+        self._touch(room)
         return vote
 
+    @_journaled
     def record_action(
         self,
         room_id: str,
@@ -535,20 +774,22 @@ class RoomService:
         room = self.get_room(room_id)
         # 夜晚行动统一记录，payload 里可保存剧本特定的详细数据。
         action = ActionRecord(
-            id=uuid.uuid4().hex,
-            room_id=room_id,
+            id=room.next_record_id(),
+            room_id=room.id,
             night=night,
             actor_seat=actor_seat,
             action_type=action_type,
             target=target,
             payload=payload,
+            ts=self._now_ms(),
         )
         room.actions.append(action)
         room.logs.append(
             LogEntry(
-                id=uuid.uuid4().hex,
-                room_id=room_id,
-                ts=datetime.now(),
+                id=room.next_record_id(),
+                room_id=room.id,
+                ts=self._now_ms(),
+                day=room.day,
                 kind="action_recorded",
                 payload={
                     "night": night,
@@ -558,38 +799,179 @@ class RoomService:
                 },
             )
         )
+        self._touch(room)
         return action
 
     # Snapshots ----------------------------------------------------------
     def snapshot_for(self, room_id: str, principal: RoomPrincipal) -> dict[str, Any]:
+        """返回指定视角的快照，同一版本下每种视角只构建一次。
+
+        返回的字典会被多个接收方共享，调用方不得修改。
+        """
+
+        room = self.get_room(room_id)
+        cache = self._cache_for(room)
+        view_key = principal.view_key
+        snapshot = cache.snapshots.get(view_key)
+        if snapshot is None:
+            # snapshot_for 是所有前端视图数据的来源，保持只读纯函数便于测试。
+            snapshot = build_snapshot(room, principal)
+            cache.snapshots[view_key] = snapshot
+        return snapshot
+
+    def snapshot_at(
+        self, room_id: str, principal: RoomPrincipal, version: int
+    ) -> dict[str, Any] | None:
+        """返回该视角在指定历史版本的快照；已移出回放缓冲或从未构建过时返回 None。"""
+
         room = self.get_room(room_id)
-        # snapshot_for 是所有前端视图数据的来源，保持只读纯函数便于测试。
-        return build_snapshot(room, principal)
+        if version == room.version:
+            return self.snapshot_for(room_id, principal)
+        # 版本变更后、新版本首次构建前，上一版本的缓存尚未移入回放缓冲。
+        current = self._snapshot_cache.get(room_id)
+        if current is not None and current.version == version:
+            return current.snapshots.get(principal.view_key)
+        for entry in self._snapshot_history.get(room_id, ()):
+            if entry.version == version:
+                return entry.snapshot(principal.view_key)
+        return None
+
+    def release_history(self, room_id: str) -> None:
+        """丢弃房间的回放缓冲；房间已没有可能断线重连的实时连接时由连接层调用。"""
+
+        self._snapshot_history.pop(room_id, None)
+        self._snapshot_history_bytes.pop(room_id, None)
+
+    def encoded_snapshot_for(self, room_id: str, principal: RoomPrincipal) -> bytes:
+        """返回已编码为 JSON 的快照，同一版本下每种视角只编码一次。"""
+
+        room = self.get_room(room_id)
+        cache = self._cache_for(room)
+        view_key = principal.view_key
+        encoded = cache.encoded.get(view_key)
+        if encoded is None:
+            encoded = dumps(self.snapshot_for(room_id, principal))
+            cache.encoded[view_key] = encoded
+        return encoded
 
     def log_export(self, room_id: str) -> dict[str, Any]:
         room = self.get_room(room_id)
         return {
-            "room": {
-                "id": room.id,
-                "script_id": room.script_id,
-                "phase": room.phase.value,
-                "day": room.day,
-                "night": room.night,
-            },
-            "logs": [
-                {
-                    "id": log.id,
-                    "ts": log.ts.isoformat(),
-                    "kind": log.kind,
-                    "payload": log.payload,
-                }
-                for log in room.logs
-            ],
+            "room": _export_room_payload(room),
+            "logs": [_log_payload(log) for log in room.logs],
         }
 
+    def iter_log_export(self, room_id: str) -> Iterator[dict[str, Any]]:
+        """逐条产出导出内容：首条为房间信息，之后每条日志一项，不在内存中构建完整列表。
+
+        只导出调用时已有的日志；导出过程中新增的日志不包含在内，保证结果对应同一时刻。
+        """
+
+        room = self.get_room(room_id)
+        header = {"room": _export_room_payload(room)}
+        return chain((header,), (_log_payload(log) for log in islice(room.logs, len(room.logs))))
+
+    def log_page(
+        self,
+        room_id: str,
+        *,
+        after: int | None = None,
+        limit: int | None = None,
+        kind: str | None = None,
+        day: int | None = None,
+        seat: int | None = None,
+    ) -> list[dict[str, Any]]:
+        """按游标分页读取日志：返回 ID 大于 after 且满足筛选条件的至多 limit 条。"""
+
+        room = self.get_room(room_id)
+        entries = room.logs.query(after=after, limit=limit, kind=kind, day=day, seat=seat)
+        return [_log_payload(log) for log in entries]
+
     # Helpers ------------------------------------------------------------
+    def _cache_for(self, room: RoomState) -> _SnapshotCache:
+        cache = self._snapshot_cache.get(room.id)
+        if cache is None or cache.version != room.version:
+            if cache is not None and cache.snapshots and self._replay_buffer_size > 0:
+                self._remember(room.id, cache)
+            cache = _SnapshotCache(version=room.version)
+            self._snapshot_cache[room.id] = cache
+        return cache
+
+    def _remember(self, room_id: str, cache: _SnapshotCache) -> None:
+        # 历史版本只在断线重连时读取，不保留字典：同一版本各视角内容大多相同，拼接后整体压缩
+        # 通常只有原字典的百分之一左右；已编码过的视角直接复用编码结果。
+        spans: dict[str, tuple[int, int]] = {}
+        chunks: list[bytes] = []
+        offset = 0
+        for view_key, snapshot in cache.snapshots.items():
+            encoded = cache.encoded.get(view_key) or dumps(snapshot)
+            spans[view_key] = (offset, offset + len(encoded))
+            chunks.append(encoded)
+            offset += len(encoded)
+        entry = _SnapshotHistory(cache.version, spans, zlib.compress(b"".join(chunks), 1))
+        history = self._snapshot_history.setdefault(room_id, deque())
+        history.append(entry)
+        size = self._snapshot_history_bytes.get(room_id, 0) + len(entry.compressed)
+        limit = self._replay_buffer_bytes
+        while history and (len(history) > self._replay_buffer_size or (limit and size > limit)):
+            size -= len(history.popleft().compressed)
+        self._snapshot_history_bytes[room_id] = size
+
+    def _touch(self, room: RoomState) -> None:
+        """房间发生任何变更后递增版本号，使旧版本的快照缓存失效，并刷新最近活跃时间。"""
+
+        room.version += 1
+        room.last_active_at = time.monotonic()
+
+    def _record(self, room_id: str, operation: str, arguments: dict[str, Any], entropy: list[Any]) -> None:
+        assert self._journal is not None
+        self._journal.append(room_id, dumps({"op": operation, "args": arguments, "entropy": entropy}))
+        count = self._entries_since_checkpoint.get(room_id, 0) + 1
+        room = self._rooms.get(room_id)
+        if count >= self._checkpoint_every and room is not None:
+            self._checkpoint(room)
+        else:
+            self._entries_since_checkpoint[room_id] = count
+
+    def _checkpoint(self, room: RoomState) -> None:
+        assert self._journal is not None
+        self._journal.checkpoint(room.id, encode_room(room))
+        self._entries_since_checkpoint[room.id] = 0
+
+    def _draw(self, generate: Callable[[], Any]) -> Any:
+        """生成一个随机值；记录变更时同时写入 entropy，重放时按顺序取回当时的值。"""
+
+        if self._replaying is not None:
+            return self._replaying.popleft()
+        value = generate()
+        if self._entropy is not None:
+            self._entropy.append(value)
+        return value
+
+    def _new_id(self) -> str:
+        return self._draw(lambda: uuid.uuid4().hex)
+
+    def _now_ms(self) -> int:
+        return self._draw(now_ms)
+
+    def _random_seed(self) -> str:
+        return self._draw(lambda: secrets.token_hex(8))
+
+    def _new_room_id(self) -> str:
+        while True:
+            room_id = self._new_id()
+            if self._shard is None or self._shard.owns(room_id):
+                return room_id
+
+    def _unique_code(self, index: dict[str, str], nbytes: int) -> str:
+        # token_urlsafe 的碰撞概率虽低，但房间多时仍可能重复，重复则重新生成。
+        while True:
+            code = self._draw(lambda: secrets.token_urlsafe(nbytes))
+            if code not in index and (self._shard is None or self._shard.owns(code)):
+                return code
+
     def _generate_random_assignments(
-        self, room: RoomState, script: Script, seed: str | None
+        self, room: RoomState, script: CompiledScript, seed: str | None
     ) -> dict[int, RoleAssignment]:
         players = [player for player in room.list_players() if player.seat > 0]
         if not players:
@@ -597,15 +979,12 @@ class RoomService:
         if len(script.roles) < len(players):
             raise ValueError("剧本中角色数量不足，无法覆盖所有玩家")
 
-        seed_value = seed or secrets.token_hex(8)
+        seed_value = seed or self._random_seed()
         prng = random.Random(seed_value)
         room.assignments_seed = seed_value
 
-        roles = list(script.roles)
-        team_counts = self._resolve_team_counts(script, len(players))
-        roles_by_team: dict[str, list[ScriptRole]] = defaultdict(list)
-        for role in roles:
-            roles_by_team[role.team].append(role)
+        team_counts = script.team_counts(len(players))
+        roles_by_team = {team: list(roles) for team, roles in script.roles_by_team.items()}
         for bucket in roles_by_team.values():
             prng.shuffle(bucket)
 
@@ -635,70 +1014,43 @@ class RoomService:
         self._auto_fill_attachments(script, assigned, prng)
         return assigned
 
-    def _resolve_team_counts(self, script: Script, player_count: int) -> dict[str, int]:
-        if not script.team_distribution:
-            teams = Counter(role.team for role in script.roles)
-            return dict(teams)
-        if player_count in script.team_distribution:
-            return dict(script.team_distribution[player_count])
-        sorted_keys = sorted(script.team_distribution)
-        fallback_key = None
-        for key in reversed(sorted_keys):
-            if key <= player_count:
-                fallback_key = key
-                break
-        if fallback_key is None:
-            fallback_key = sorted_keys[0]
-        return dict(script.team_distribution[fallback_key])
-
     def _auto_fill_attachments(
         self,
-        script: Script,
+        script: CompiledScript,
         assignments: dict[int, RoleAssignment],
         prng: random.Random,
     ) -> None:
-        role_by_id = {role.id: role for role in script.roles}
         pool = self._build_attachment_pool(script, assignments)
         for bundle in assignments.values():
-            role = role_by_id.get(bundle.role_id)
+            role = script.role_by_id.get(bundle.role_id)
             if not role:
                 continue
-            slots = role.meta.get("attachment_slots", [])
-            for slot_def in slots:
-                if not isinstance(slot_def, dict):
-                    continue
-                slot_id = slot_def.get("id")
-                if not slot_id:
-                    continue
-                count = int(slot_def.get("count", 1))
-                allow_duplicates = bool(slot_def.get("allow_duplicates", False))
-                team_filter = slot_def.get("team_filter")
-                for index in range(count):
+            for slot in script.slots_for(role):
+                for index in range(slot.count):
                     existing = next(
                         (
                             att
                             for att in bundle.attachments
-                            if att.slot == slot_id and att.index == index
+                            if att.slot == slot.id and att.index == index
                         ),
                         None,
                     )
                     if existing:
                         continue
                     candidate_id = self._pick_attachment_candidate(
-                        prng, pool, role_by_id, team_filter, allow_duplicates
+                        prng, pool, script, slot.team_filter, slot.allow_duplicates
                     )
                     if candidate_id is None:
                         continue
                     bundle.attachments.append(
-                        RoleAttachment(slot=slot_id, index=index, role_id=candidate_id)
+                        RoleAttachment(slot=slot.id, index=index, role_id=candidate_id)
                     )
         for bundle in assignments.values():
             bundle.attachments.sort(key=lambda item: (item.slot, item.index))
 
     def _build_attachment_pool(
-        self, script: Script, assignments: dict[int, RoleAssignment]
+        self, script: CompiledScript, assignments: dict[int, RoleAssignment]
     ) -> defaultdict[str, list[str]]:
-        role_by_id = {role.id: role for role in script.roles}
         pool: defaultdict[str, list[str]] = defaultdict(list)
         base_ids = {bundle.role_id for bundle in assignments.values()}
         for role in script.roles:
@@ -708,7 +1060,7 @@ class RoomService:
 
         for bundle in assignments.values():
             for attachment in bundle.attachments:
-                attached_role = role_by_id.get(attachment.role_id)
+                attached_role = script.role_by_id.get(attachment.role_id)
                 if not attached_role:
                     continue
                 team_roles = pool.get(attached_role.team)
@@ -720,8 +1072,8 @@ class RoomService:
         self,
         prng: random.Random,
         pool: defaultdict[str, list[str]],
-        role_by_id: dict[str, ScriptRole],
-        team_filter: list[str] | None,
+        script: CompiledScript,
+        team_filter: tuple[str, ...] | None,
         allow_duplicates: bool,
     ) -> str | None:
         if team_filter:
@@ -732,7 +1084,7 @@ class RoomService:
             return None
         role_id = prng.choice(candidates)
         if not allow_duplicates:
-            role = role_by_id.get(role_id)
+            role = script.role_by_id.get(role_id)
             if role:
                 team_roles = pool.get(role.team)
                 if team_roles and role_id in team_roles:
@@ -743,11 +1095,11 @@ class RoomService:
         self,
         room: RoomState,
         assignments: dict[int, RoleAssignment],
-        script: Script,
+        script: CompiledScript,
         *,
         require_full: bool,
     ) -> dict[int, RoleAssignment]:
-        role_by_id = {role.id: role for role in script.roles}
+        role_by_id = script.role_by_id
         validated: dict[int, RoleAssignment] = {}
         for seat, bundle in assignments.items():
             player = room.player_by_seat(seat)
@@ -756,11 +1108,7 @@ class RoomService:
             if bundle.role_id not in role_by_id:
                 raise ValueError(f"未知角色 ID {bundle.role_id}")
             role = role_by_id[bundle.role_id]
-            slot_defs = {
-                slot_def["id"]: slot_def
-                for slot_def in role.meta.get("attachment_slots", [])
-                if isinstance(slot_def, dict) and slot_def.get("id")
-            }
+            slot_defs = script.slot_map(role)
             attachments_by_slot: dict[str, dict[int, str]] = defaultdict(dict)
             for attachment in bundle.attachments:
                 if attachment.slot not in slot_defs:
@@ -768,35 +1116,29 @@ class RoomService:
                         f"角色 {role.name} 不支持 {attachment.slot} 附加槽"
                     )
                 slot_def = slot_defs[attachment.slot]
-                count = int(slot_def.get("count", 1))
-                if attachment.index < 0 or attachment.index >= count:
+                if attachment.index < 0 or attachment.index >= slot_def.count:
                     raise ValueError(
                         f"{role.name} 的 {attachment.slot} 序号超出允许范围"
                     )
                 if attachment.role_id not in role_by_id:
                     raise ValueError(f"未知角色 ID {attachment.role_id}")
-                allowed_teams = slot_def.get("team_filter")
-                if allowed_teams:
+                if slot_def.team_filter:
                     attached_role = role_by_id[attachment.role_id]
-                    if attached_role.team not in allowed_teams:
+                    if attached_role.team not in slot_def.team_filter:
                         raise ValueError(
-                            f"{role.name} 的 {slot_def.get('label', attachment.slot)} 必须选择指定阵营的角色"
+                            f"{role.name} 的 {slot_def.label} 必须选择指定阵营的角色"
                         )
                 attachments_by_slot[attachment.slot][attachment.index] = attachment.role_id
 
             normalized: list[RoleAttachment] = []
             for slot_id, slot_def in slot_defs.items():
                 entries = attachments_by_slot.get(slot_id, {})
-                count = int(slot_def.get("count", 1))
-                allow_duplicates = bool(slot_def.get("allow_duplicates", False))
-                missing = [index for index in range(count) if index not in entries]
+                missing = [index for index in range(slot_def.count) if index not in entries]
                 if require_full and missing:
-                    label = slot_def.get("label", slot_id)
-                    raise ValueError(f"{role.name} 缺少 {label} 的选择")
-                if not allow_duplicates and len(set(entries.values())) != len(entries.values()):
-                    label = slot_def.get("label", slot_id)
-                    raise ValueError(f"{role.name} 的 {label} 不能重复")
-                for index in range(count):
+                    raise ValueError(f"{role.name} 缺少 {slot_def.label} 的选择")
+                if not slot_def.allow_duplicates and len(set(entries.values())) != len(entries.values()):
+                    raise ValueError(f"{role.name} 的 {slot_def.label} 不能重复")
+                for index in range(slot_def.count):
                     role_id = entries.get(index)
                     if role_id is None:
                         continue
@@ -808,9 +1150,9 @@ class RoomService:
             validated[seat] = RoleAssignment(role_id=role.id, attachments=normalized)
         return validated
 
-    def _get_script(self, script_id: str | None) -> Script:
+    def _get_script(self, script_id: str | None) -> CompiledScript:
         if not script_id:
-            return DEFAULT_SCRIPT
+            return DEFAULT_COMPILED_SCRIPT
         try:
             return SCRIPTS[script_id]
         except KeyError as exc:  # pragma: no cover - defensive
@@ -851,7 +1193,7 @@ class RoomService:
         ]
         if not players:
             return []
-        players.sort(key=lambda p: (p.seat, p.joined_at))
+        # list_players 已按座位排序，同座位保持加入顺序，无需再次排序。
         start_index = 0
         for idx, player in enumerate(players):
             if player.seat > nominee_seat:
@@ -873,7 +1215,7 @@ class RoomService:
         auto: bool,
     ) -> VoteRecord:
         vote = VoteRecord(
-            id=uuid.uuid4().hex,
+            id=room.next_record_id(),
             room_id=room.id,
             day=room.day,
             nomination_id=nomination.id,
@@ -881,29 +1223,28 @@ class RoomService:
             voter_seat=player.seat,
             player_id=player.id,
             value=value,
+            ts=self._now_ms(),
         )
-        room.votes.append(vote)
+        room.votes_for(nomination.id).add(vote)
         session.votes[player.id] = value
         session.current_index += 1
-        if player.life_status == LifeStatus.DEAD_VOTE and value:
-            player.ghost_vote_used = True
-            player.life_status = LifeStatus.DEAD_NO_VOTE
-        elif player.life_status == LifeStatus.FAKE_DEAD_VOTE and value:
-            player.ghost_vote_used = True
-            player.life_status = LifeStatus.FAKE_DEAD_NO_VOTE
+        if value:
+            player.spend_ghost_vote()
         if session.current_index >= len(session.order):
             session.finished = True
             nomination.vote_completed = True
         room.logs.append(
             LogEntry(
-                id=uuid.uuid4().hex,
+                id=room.next_record_id(),
                 room_id=room.id,
-                ts=datetime.now(),
+                ts=self._now_ms(),
+                day=room.day,
                 kind="vote_cast",
                 payload={
                     "nominee": nomination.nominee_seat,
                     "nomination_id": nomination.id,
                     "voter": player.seat,
+                    "player_id": player.id,
                     "value": value,
                     "auto": auto,
                 },
@@ -944,6 +1285,7 @@ class RoomService:
                 count += 1
         return count
 
+    @_journaled
     def set_execution_result(
         self,
         room_id: str,
@@ -955,14 +1297,12 @@ class RoomService:
         nominee_seat = None
         votes_for = 0
         if nomination_id:
-            try:
-                nomination = next(n for n in room.nominations if n.id == nomination_id)
-            except StopIteration as exc:
-                raise ValueError("找不到提名记录") from exc
+            nomination = room.nominations.get(nomination_id)
+            if nomination is None:
+                raise ValueError("找不到提名记录")
             nominee_seat = nomination.nominee_seat
-            votes_for = sum(
-                1 for vote in room.votes if vote.nomination_id == nomination_id and vote.value
-            )
+            bucket = room.votes.get(nomination_id)
+            votes_for = bucket.yes if bucket else 0
         alive_count = self._alive_player_count(room)
         record = ExecutionRecord(
             day=room.day,
@@ -971,14 +1311,16 @@ class RoomService:
             votes_for=votes_for,
             alive_count=alive_count,
             nomination_id=nomination_id,
+            ts=self._now_ms(),
         )
         room.executions = [rec for rec in room.executions if rec.day != room.day]
         room.executions.append(record)
         room.logs.append(
             LogEntry(
-                id=uuid.uuid4().hex,
-                room_id=room_id,
-                ts=datetime.now(),
+                id=room.next_record_id(),
+                room_id=room.id,
+                ts=record.ts,
+                day=room.day,
                 kind="execution_recorded",
                 payload={
                     "nomination_id": nomination_id,
@@ -988,6 +1330,7 @@ class RoomService:
                 },
             )
         )
+        self._touch(room)
         return record
 
 
@@ -1000,7 +1343,23 @@ class RoomPrincipal:
 
     @property
     def role(self) -> str:
-        return "host" if self.is_host else "player"
+        if self.is_host:
+            return "host"
+        return "player" if self.player_id else "spectator"
+
+    @property
+    def is_spectator(self) -> bool:
+        return not self.is_host and self.player_id is None
+
+    @property
+    def view_key(self) -> str:
+        """快照可见性分类：主持人、具体玩家或旁观者，相同 key 的快照内容一致。"""
+
+        if self.is_host:
+            return f"host:{self.player_id}"
+        if self.player_id:
+            return f"player:{self.player_id}"
+        return "spectator"
 
 
 def build_snapshot(room: RoomState, principal: RoomPrincipal) -> dict[str, Any]:
@@ -1009,8 +1368,8 @@ def build_snapshot(room: RoomState, principal: RoomPrincipal) -> dict[str, Any]:
         me_player = room.players.get(principal.player_id)
 
     # 构建一个角色索引，便于在快照中返回中文名称。
-    script = SCRIPTS.get(room.script_id, DEFAULT_SCRIPT)
-    role_catalog = {role.id: role for role in script.roles}
+    script = SCRIPTS.get(room.script_id, DEFAULT_COMPILED_SCRIPT)
+    role_catalog = script.role_by_id
 
     ordered_players = room.list_players()
     player_count = sum(1 for player in ordered_players if player.seat > 0)
@@ -1037,14 +1396,14 @@ def build_snapshot(room: RoomState, principal: RoomPrincipal) -> dict[str, Any]:
             if principal.is_host:
                 attachments_payload = _attachment_payload(
                     player.role_attachments,
-                    role_catalog,
+                    script,
                     base_role=base_role,
                     hide_owner_slots=False,
                 )
             elif me_player and player.id == me_player.id:
                 attachments_payload = _attachment_payload(
                     player.role_attachments,
-                    role_catalog,
+                    script,
                     base_role=base_role,
                     hide_owner_slots=True,
                 )
@@ -1056,7 +1415,7 @@ def build_snapshot(room: RoomState, principal: RoomPrincipal) -> dict[str, Any]:
             owner_visible = _owner_visible_role(
                 base_role,
                 player.role_attachments,
-                role_catalog,
+                script,
             )
             entry["role_secret"] = _serialize_role(owner_visible)
             if attachments_payload:
@@ -1065,34 +1424,25 @@ def build_snapshot(room: RoomState, principal: RoomPrincipal) -> dict[str, Any]:
         if player.seat > 0 and seat_counts[player.seat] > 1:
             entry["seat_conflict"] = True
 
-    votes_by_nomination: dict[str, list[dict[str, Any]]] = defaultdict(list)
-    for vote in sorted(room.votes, key=lambda item: item.ts):
-        votes_by_nomination[vote.nomination_id].append(
-            {
-                "voter": vote.voter_seat,
-                "player_id": vote.player_id,
-                "value": vote.value,
-            }
-        )
-
     nominations_payload = [
         {
             "id": nomination.id,
             "day": nomination.day,
             "nominee": nomination.nominee_seat,
             "by": nomination.nominator_seat,
-            "ts": nomination.ts.isoformat(),
+            "ts": iso_utc(nomination.ts),
             "confirmed": nomination.confirmed,
             "vote_started": nomination.vote_started,
             "vote_completed": nomination.vote_completed,
-            "votes": votes_by_nomination.get(nomination.id, []),
+            "votes": _votes_payload(room.votes.get(nomination.id)),
             "manual_total": nomination.manual_vote_total,
         }
-        for nomination in room.nominations
+        for nomination in room.nominations.values()
     ]
     snapshot = {
         "room": {
             "id": room.id,
+            "version": room.version,
             "phase": room.phase.value,
             "day": room.day,
             "night": room.night,
@@ -1101,13 +1451,13 @@ def build_snapshot(room: RoomState, principal: RoomPrincipal) -> dict[str, Any]:
         },
         "players": players_payload,
         "nominations": nominations_payload,
-        "script": _script_payload(script, player_count),
+        "script": script_reference(script, player_count),
     }
     if principal.is_host:
         snapshot["room"]["join_code"] = room.join_code
         if room.pending_assignments:
             snapshot["pending_assignments"] = {
-                str(seat): _serialize_assignment(bundle, role_catalog)
+                str(seat): _serialize_assignment(bundle, script)
                 for seat, bundle in sorted(room.pending_assignments.items())
             }
             snapshot["pending_assignments_meta"] = {
@@ -1144,23 +1494,54 @@ def build_snapshot(room: RoomState, principal: RoomPrincipal) -> dict[str, Any]:
                 "votes_for": record.votes_for,
                 "alive_count": record.alive_count,
                 "nomination_id": record.nomination_id,
-                "ts": record.ts.isoformat(),
+                "ts": iso_utc(record.ts),
             }
             for record in sorted(room.executions, key=lambda item: item.day)
         ]
     return snapshot
 
 
-def _serialize_assignment(
-    bundle: RoleAssignment, role_catalog: dict[str, ScriptRole]
-) -> dict[str, Any]:
-    base_role = role_catalog.get(bundle.role_id)
+def _export_room_payload(room: RoomState) -> dict[str, Any]:
+    return {
+        "id": room.id,
+        "script_id": room.script_id,
+        "phase": room.phase.value,
+        "day": room.day,
+        "night": room.night,
+    }
+
+
+def _log_payload(log: LogEntry) -> dict[str, Any]:
+    return {
+        "id": log.id,
+        "ts": iso_local(log.ts),
+        "day": log.day,
+        "kind": log.kind,
+        "payload": log.payload,
+    }
+
+
+def _votes_payload(bucket: VoteBucket | None) -> list[dict[str, Any]]:
+    if bucket is None:
+        return []
+    return [
+        {
+            "voter": vote.voter_seat,
+            "player_id": vote.player_id,
+            "value": vote.value,
+        }
+        for vote in bucket.votes
+    ]
+
+
+def _serialize_assignment(bundle: RoleAssignment, script: CompiledScript) -> dict[str, Any]:
+    base_role = script.role_by_id.get(bundle.role_id)
     return {
         "role_id": bundle.role_id,
         "role": _serialize_role(base_role),
         "attachments": _attachment_payload(
             bundle.attachments,
-            role_catalog,
+            script,
             base_role=base_role,
             hide_owner_slots=False,
         ),
@@ -1168,7 +1549,7 @@ def _serialize_assignment(
 
 
 def _assignment_team_counts(
-    assignments: dict[int, RoleAssignment], role_catalog: dict[str, ScriptRole]
+    assignments: dict[int, RoleAssignment], role_catalog: Mapping[str, ScriptRole]
 ) -> dict[str, int]:
     counts: Counter[str] = Counter()
     for bundle in assignments.values():
@@ -1195,31 +1576,25 @@ def _serialize_role(role: ScriptRole | None) -> dict[str, Any] | None:
 
 def _attachment_payload(
     attachments: list[RoleAttachment],
-    role_catalog: dict[str, ScriptRole],
+    script: CompiledScript,
     *,
     base_role: ScriptRole | None = None,
     hide_owner_slots: bool = False,
 ) -> list[dict[str, Any]]:
-    slot_defs: dict[str, dict[str, Any]] = {}
-    if base_role and base_role.meta:
-        slot_defs = {
-            slot_def.get("id"): slot_def
-            for slot_def in base_role.meta.get("attachment_slots", [])
-            if isinstance(slot_def, dict) and slot_def.get("id")
-        }
+    slot_defs = script.slot_map(base_role)
 
     payload: list[dict[str, Any]] = []
     for attachment in sorted(attachments, key=lambda item: (item.slot, item.index)):
         slot_def = slot_defs.get(attachment.slot)
-        if hide_owner_slots and slot_def and slot_def.get("owner_view") == "replace_primary":
+        if hide_owner_slots and slot_def and slot_def.owner_view == "replace_primary":
             continue
         payload.append(
             {
                 "slot": attachment.slot,
-                "slot_label": slot_def.get("label") if slot_def else None,
+                "slot_label": slot_def.raw.get("label") if slot_def else None,
                 "index": attachment.index,
                 "role_id": attachment.role_id,
-                "role": _serialize_role(role_catalog.get(attachment.role_id)),
+                "role": _serialize_role(script.role_by_id.get(attachment.role_id)),
             }
         )
     return payload
@@ -1228,25 +1603,19 @@ def _attachment_payload(
 def _owner_visible_role(
     role: ScriptRole | None,
     attachments: list[RoleAttachment],
-    role_catalog: dict[str, ScriptRole],
+    script: CompiledScript,
 ) -> ScriptRole | None:
     if role is None:
         return None
-    slots = role.meta.get("attachment_slots", []) if role.meta else []
-    for slot_def in slots:
-        if not isinstance(slot_def, dict):
-            continue
-        if slot_def.get("owner_view") != "replace_primary":
-            continue
-        slot_id = slot_def.get("id")
-        if not slot_id:
+    for slot in script.slots_for(role):
+        if slot.owner_view != "replace_primary":
             continue
         attachment = next(
-            (item for item in attachments if item.slot == slot_id and item.index == 0),
+            (item for item in attachments if item.slot == slot.id and item.index == 0),
             None,
         )
         if attachment:
-            return role_catalog.get(attachment.role_id)
+            return script.role_by_id.get(attachment.role_id)
     return role
 
 
@@ -1274,44 +1643,3 @@ def _can_vote(player: PlayerState | None) -> bool:
     if player.life_status == LifeStatus.DEAD_VOTE:
         return not player.ghost_vote_used
     return False
-
-
-def _script_payload(script: Script, player_count: int) -> dict[str, Any]:
-    if script.team_distribution:
-        if player_count in script.team_distribution:
-            team_counts = dict(script.team_distribution[player_count])
-        else:
-            sorted_keys = sorted(script.team_distribution)
-            fallback_key = None
-            for key in reversed(sorted_keys):
-                if key <= player_count:
-                    fallback_key = key
-                    break
-            if fallback_key is None:
-                fallback_key = sorted_keys[0]
-            team_counts = dict(script.team_distribution[fallback_key])
-    else:
-        team_counts = dict(Counter(role.team for role in script.roles))
-
-    team_distribution = {players: dict(counts) for players, counts in script.team_distribution.items()}
-    roles_payload = [
-        {
-            "id": role.id,
-            "name": role.name,
-            "name_localized": role.name_localized,
-            "team": role.team,
-            "team_label": TEAM_LABELS.get(role.team),
-            "description": role.meta.get("description") if role.meta else None,
-            "attachment_slots": role.meta.get("attachment_slots", []) if role.meta else [],
-        }
-        for role in script.roles
-    ]
-    return {
-        "id": script.id,
-        "name": script.name,
-        "version": script.version,
-        "team_counts": dict(team_counts),
-        "team_distribution": team_distribution,
-        "roles": roles_payload,
-        "rules": dict(script.rules),
-    }
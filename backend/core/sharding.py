@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+"""分片部署中的房间归属。
+
+每个 worker 进程只持有 shard_for(room_id) 等于自身编号的房间；加入码与房间码同样按哈希归属，
+前端路由进程只凭路径中的 room_id 或请求体中的码即可确定目标 worker，无需共享任何状态。
+"""
+
+import zlib
+from dataclasses import dataclass
+
+
+def shard_for(key: str, shard_count: int) -> int:
+    # 不能用内置 hash()：字符串哈希在每个进程中随机化，各进程必须算出相同结果。
+    return zlib.crc32(key.encode("utf-8")) % shard_count
+
+
+@dataclass(frozen=True)
+class ShardSpec:
+    index: int
+    count: int
+
+    def owns(self, key: str) -> bool:
+        return shard_for(key, self.count) == self.index
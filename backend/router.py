@@ -0,0 +1,308 @@
+from __future__ import annotations
+
+"""分片部署的前端路由进程。
+
+启动 N 个 worker 进程（各自运行 backend.app，只持有归属本分片的房间），并在对外端口上运行一个
+轻量的 ASGI 反向代理：
+
+- /api/rooms/{room_id}/... 与 /ws/rooms/{room_id} 按 room_id 的哈希转发；
+- POST /api/rooms/join、/api/rooms/spectate 按请求体中加入码 / 房间码的哈希转发；
+- POST /api/rooms（创建房间）转发给当前房间数最少的 worker；
+- /api/auth/...（注册、登录等账号请求）固定转发给 0 号 worker：邀请码文件只有进程内的锁保护，
+  分散到多个进程会让同一个一次性邀请码被重复使用；
+- 其余无状态请求（剧本、静态页面）轮流转发；/metrics 汇总所有 worker 的指标。
+
+运行：python -m backend.router --shards 4 [--host 0.0.0.0] [--port 8000]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Any, Awaitable, Callable
+
+import httpx
+import uvicorn
+import websockets
+
+from backend.core.sharding import shard_for
+
+Receive = Callable[[], Awaitable[dict[str, Any]]]
+Send = Callable[[dict[str, Any]], Awaitable[None]]
+
+# 逐跳头部只对单条连接有意义，转发时去掉。
+HOP_BY_HOP_HEADERS = frozenset(
+    {
+        b"connection",
+        b"keep-alive",
+        b"proxy-authenticate",
+        b"proxy-authorization",
+        b"te",
+        b"trailers",
+        b"transfer-encoding",
+        b"upgrade",
+        b"host",
+    }
+)
+# 按请求体中的码路由的接口。
+CODE_ROUTES = {"/api/rooms/join", "/api/rooms/spectate"}
+# 账号相关请求固定由该 worker 处理。
+ACCOUNT_SHARD = 0
+# worker 启动的最长等待时间（秒）。
+WORKER_STARTUP_TIMEOUT = 30.0
+
+
+class ShardRouter:
+    """按房间归属把 HTTP / WebSocket 请求转发到对应 worker 的 ASGI 应用。"""
+
+    def __init__(self, workers: list[str]) -> None:
+        # workers[i] 为第 i 个分片的 http://host:port 地址。
+        self.workers = workers
+        self._round_robin = itertools.cycle(range(len(workers)))
+        self._client: httpx.AsyncClient | None = None
+
+    async def __call__(self, scope: dict[str, Any], receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            await self._handle_http(scope, receive, send)
+        elif scope["type"] == "websocket":
+            await self._handle_websocket(scope, receive, send)
+        elif scope["type"] == "lifespan":
+            await self._handle_lifespan(receive, send)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            # SSE 与长轮询会长时间挂起，不设读取超时。
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(10.0, read=None))
+        return self._client
+
+    # Routing ------------------------------------------------------------
+    async def select_shard(self, method: str, path: str, body: bytes) -> int:
+        parts = path.strip("/").split("/")
+        if path in CODE_ROUTES and method == "POST":
+            code = _json_field(body, "code")
+            if code is not None:
+                return shard_for(code, len(self.workers))
+        elif parts[:2] == ["api", "rooms"] and len(parts) > 2:
+            return shard_for(parts[2], len(self.workers))
+        elif parts[:2] == ["ws", "rooms"] and len(parts) > 2:
+            return shard_for(parts[2], len(self.workers))
+        elif parts == ["api", "rooms"] and method == "POST":
+            return await self._least_loaded()
+        elif parts[:2] == ["api", "auth"]:
+            return ACCOUNT_SHARD
+        return next(self._round_robin)
+
+    async def _least_loaded(self) -> int:
+        metrics = await self._collect_metrics()
+        loads = [shard_metrics.get("rooms", 0) if shard_metrics else float("inf") for shard_metrics in metrics]
+        return min(range(len(loads)), key=loads.__getitem__)
+
+    async def _collect_metrics(self) -> list[dict[str, Any] | None]:
+        async def fetch(worker: str) -> dict[str, Any] | None:
+            try:
+                response = await self.client.get(f"{worker}/metrics")
+                return response.json()
+            except httpx.HTTPError:
+                return None
+
+        return list(await asyncio.gather(*(fetch(worker) for worker in self.workers)))
+
+    # HTTP ---------------------------------------------------------------
+    async def _handle_http(self, scope: dict[str, Any], receive: Receive, send: Send) -> None:
+        body = await _read_body(receive)
+        if scope["path"] == "/metrics":
+            await self._send_metrics(send)
+            return
+        shard = await self.select_shard(scope["method"], scope["path"], body)
+        url = self.workers[shard] + scope.get("raw_path", scope["path"].encode()).decode("latin-1")
+        if scope.get("query_string"):
+            url += "?" + scope["query_string"].decode("latin-1")
+        headers = [(name, value) for name, value in scope["headers"] if name not in HOP_BY_HOP_HEADERS]
+        request = self.client.build_request(scope["method"], url, headers=headers, content=body)
+        try:
+            response = await self.client.send(request, stream=True)
+        except httpx.HTTPError:
+            await _send_plain(send, 502, b"shard unavailable")
+            return
+
+        async def relay() -> None:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": response.status_code,
+                    "headers": [
+                        (name, value)
+                        for name, value in response.headers.raw
+                        if name.lower() not in HOP_BY_HOP_HEADERS
+                    ],
+                }
+            )
+            # 逐块转发原始字节（不解压），SSE 等流式响应无需等待完整响应体。
+            async for chunk in response.aiter_raw():
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+
+        # 客户端断开时立即停止转发并关闭上游连接，避免挂起的 SSE 流一直占用 worker。
+        tasks = [asyncio.create_task(relay()), asyncio.create_task(_wait_disconnect(receive))]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await response.aclose()
+
+    async def _send_metrics(self, send: Send) -> None:
+        metrics = await self._collect_metrics()
+        totals: dict[str, Any] = {"shards": len(self.workers), "shards_unavailable": 0}
+        for shard_metrics in metrics:
+            if shard_metrics is None:
+                totals["shards_unavailable"] += 1
+                continue
+            for key, value in shard_metrics.items():
+                totals[key] = totals.get(key, 0) + value
+        await _send_plain(send, 200, json.dumps(totals).encode(), content_type=b"application/json")
+
+    # WebSocket ----------------------------------------------------------
+    async def _handle_websocket(self, scope: dict[str, Any], receive: Receive, send: Send) -> None:
+        message = await receive()
+        if message["type"] != "websocket.connect":
+            return
+        shard = await self.select_shard("GET", scope["path"], b"")
+        url = "ws" + self.workers[shard][len("http") :] + scope["path"]
+        if scope.get("query_string"):
+            url += "?" + scope["query_string"].decode("latin-1")
+        try:
+            upstream = await websockets.connect(url, max_size=None)
+        except (OSError, websockets.InvalidHandshake):
+            # worker 在握手阶段拒绝（如令牌无效）时同样在握手阶段拒绝客户端。
+            await send({"type": "websocket.close", "code": 1008})
+            return
+        await send({"type": "websocket.accept"})
+
+        async def client_to_upstream() -> None:
+            while True:
+                event = await receive()
+                if event["type"] == "websocket.disconnect":
+                    await upstream.close()
+                    return
+                if event.get("text") is not None:
+                    await upstream.send(event["text"])
+                elif event.get("bytes") is not None:
+                    await upstream.send(event["bytes"])
+
+        async def upstream_to_client() -> None:
+            with contextlib.suppress(websockets.ConnectionClosed):
+                async for frame in upstream:
+                    if isinstance(frame, str):
+                        await send({"type": "websocket.send", "text": frame})
+                    else:
+                        await send({"type": "websocket.send", "bytes": frame})
+            # 原样转发 worker 的关闭码（心跳超时、慢连接、房间关闭等），客户端据此决定是否重连。
+            await send({"type": "websocket.close", "code": upstream.close_code or 1000})
+
+        tasks = [asyncio.create_task(client_to_upstream()), asyncio.create_task(upstream_to_client())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await upstream.close()
+
+    # Lifespan -----------------------------------------------------------
+    async def _handle_lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._client is not None:
+                    await self._client.aclose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+async def _read_body(receive: Receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def _wait_disconnect(receive: Receive) -> None:
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _send_plain(send: Send, status: int, body: bytes, *, content_type: bytes = b"text/plain") -> None:
+    await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", content_type)]})
+    await send({"type": "http.response.body", "body": body})
+
+
+def _json_field(body: bytes, name: str) -> str | None:
+    try:
+        value = json.loads(body).get(name)
+    except (ValueError, AttributeError):
+        return None
+    return value if isinstance(value, str) else None
+
+
+def start_workers(shards: int, base_port: int) -> tuple[list[subprocess.Popen], list[str]]:
+    processes = []
+    workers = []
+    for index in range(shards):
+        port = base_port + index
+        env = {**os.environ, "SHARD_INDEX": str(index), "SHARD_COUNT": str(shards)}
+        processes.append(
+            subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "backend.app:app", "--host", "127.0.0.1", "--port", str(port)],
+                env=env,
+            )
+        )
+        workers.append(f"http://127.0.0.1:{port}")
+    return processes, workers
+
+
+def wait_until_ready(workers: list[str], timeout: float = WORKER_STARTUP_TIMEOUT) -> None:
+    deadline = time.monotonic() + timeout
+    for worker in workers:
+        while True:
+            try:
+                httpx.get(f"{worker}/health").raise_for_status()
+                break
+            except httpx.HTTPError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"worker {worker} 未能在 {timeout} 秒内启动")
+                time.sleep(0.1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="按房间分片的多进程部署")
+    parser.add_argument("--shards", type=int, default=int(os.getenv("SHARD_COUNT", "2")))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--worker-base-port", type=int, default=None, help="worker 端口起始值，默认 port+1")
+    args = parser.parse_args()
+
+    processes, workers = start_workers(args.shards, args.worker_base_port or args.port + 1)
+    try:
+        wait_until_ready(workers)
+        uvicorn.run(ShardRouter(workers), host=args.host, port=args.port)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
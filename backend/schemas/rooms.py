@@ -29,6 +29,15 @@ class JoinRoomResponse(BaseModel):
     player_token: str
 
 
+class SpectateRoomRequest(BaseModel):
+    code: str = Field(..., description="主持人分享的房间码（非玩家加入码）")
+
+
+class SpectateRoomResponse(BaseModel):
+    room_id: str
+    spectator_token: str
+
+
 class UpdateSeatRequest(BaseModel):
     seat: int = Field(..., ge=0, description="玩家可自行选择的座位号，0 表示未选择")
     player_id: str | None = Field(
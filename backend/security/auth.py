@@ -60,6 +60,22 @@ def principal_dependency(room_service: RoomService):
     return _get_principal
 
 
+def stream_principal_dependency(room_service: RoomService):
+    """SSE 使用的鉴权依赖：浏览器 EventSource 无法设置请求头，允许与 WebSocket 一样通过 ?token= 传递。"""
+
+    async def _get_principal(
+        token: str | None = None,
+        credentials: HTTPAuthorizationCredentials = Depends(auth_scheme),
+    ) -> AuthenticatedPrincipal:
+        if credentials:
+            return principal_from_token(room_service, credentials.credentials)
+        if not token:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing credentials")
+        return principal_from_token(room_service, token)
+
+    return _get_principal
+
+
 def principal_from_token(room_service: RoomService, token: str) -> AuthenticatedPrincipal:
     token_data = decode_token(token)
     room_id = token_data.get("room_id")
@@ -71,8 +87,9 @@ def principal_from_token(room_service: RoomService, token: str) -> Authenticated
     if role not in {"host", "player", "spectator"}:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token role")
     is_host = role == "host"
+    # 旁观者令牌同样要求房间仍然存在，房间被回收后的令牌不再有效（抛出 RoomNotFoundError）。
+    room = room_service.get_room(room_id)
     if player_id:
-        room = room_service.get_room(room_id)
         player = room.players.get(player_id)
         if not player:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unknown player")
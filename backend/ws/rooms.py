@@ -3,73 +3,590 @@ from __future__ import annotations
 """WebSocket 管理器，用于实时同步房间状态。"""
 
 import asyncio
-from dataclasses import dataclass
-from typing import Dict, List
+import contextlib
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List
 
 from fastapi import WebSocket, WebSocketDisconnect
 
-from backend.core.service import RoomPrincipal, RoomService
+from backend.core.encoding import dumps, wrap_frame
+from backend.core.events import RoomChanged
+from backend.core.patch import make_patch
+from backend.core.service import RoomNotFoundError, RoomPrincipal, RoomService
+
+# 已发送但未被客户端确认的版本数超过该值时，视为客户端严重落后，改发完整快照。
+STATE_DIFF_MAX_LAG = 20
+# 补丁操作数超过该值时，完整快照通常更省流量。
+STATE_DIFF_MAX_OPS = 200
+# 服务器主动断开连接时使用的关闭码，前端收到后应重连并重新拉取快照。
+CLOSE_HEARTBEAT_TIMEOUT = 4408
+CLOSE_SLOW_CONSUMER = 4409
+CLOSE_ROOM_CLOSED = 4410
+CLOSE_TOO_MANY_CONNECTIONS = 4429
+
+# 出站队列中的消息类型：state 在发送时才计算增量/快照，snapshot 强制完整快照，frame 为已编码文本。
+_STATE = "state"
+_SNAPSHOT = "snapshot"
+_FRAME = "frame"
+
+
+@dataclass
+class OutboundMessage:
+    kind: str
+    enqueued_at: float
+    frame: str | None = None
 
 
 @dataclass
 class RoomConnection:
     websocket: WebSocket
     principal: RoomPrincipal
+    # 最近一次发给该连接的快照及其版本号，作为下一条增量的基准。
+    version: int | None = None
+    snapshot: dict[str, Any] | None = None
+    acked_version: int | None = None
+    # 每个连接独立的出站队列与写协程，慢连接不会拖住其他连接的广播。
+    outbox: Deque[OutboundMessage] = field(default_factory=deque)
+    wakeup: asyncio.Event = field(default_factory=asyncio.Event)
+    writer: asyncio.Task | None = None
+    sending_since: float | None = None
+    # 最近一次收到客户端消息（含 pong / ack）的时间，用于心跳超时判断。
+    last_seen: float = field(default_factory=time.monotonic)
+    dropped: int = 0
+    closed: bool = False
+
+
+@dataclass
+class PublicView:
+    """房间对旁观者公开的视图：所有旁观者共享同一份脱敏快照与已编码的帧。"""
+
+    version: int
+    snapshot: dict[str, Any]
+    snapshot_frame: str
 
 
 class RoomWebSocketManager:
-    def __init__(self, room_service: RoomService) -> None:
+    def __init__(
+        self,
+        room_service: RoomService,
+        *,
+        coalesce_window: float = 0.02,
+        send_queue_size: int = 32,
+        max_send_lag: float = 10.0,
+        heartbeat_interval: float = 20.0,
+        heartbeat_timeout: float = 60.0,
+        max_connections: int = 5000,
+        max_connections_per_room: int = 64,
+        max_spectators_per_room: int = 500,
+        public_view_delay: float = 0.0,
+    ) -> None:
         self.room_service = room_service
-        self._connections: Dict[str, List[RoomConnection]] = {}
-        self._lock = asyncio.Lock()
+        # 连接注册表：按房间索引（room_id -> {id(websocket): 连接}）并按 websocket 身份反查，
+        # 注册与注销均为 O(1)。注册表操作中没有 await，在事件循环内天然原子，无需加锁，
+        # 因此不同房间之间也不会互相争用。
+        self._connections: Dict[str, Dict[int, RoomConnection]] = {}
+        self._by_socket: Dict[int, RoomConnection] = {}
+        # 广播合并窗口（秒），窗口内同一房间的多次广播请求只发送一次最新状态。
+        self._coalesce_window = coalesce_window
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._fan_outs: Dict[str, asyncio.Task] = {}
+        self._dirty: set[str] = set()
+        # 出站队列上限与最长滞后时间（秒），超出任一阈值的连接会被断开。
+        self._send_queue_size = send_queue_size
+        self._max_send_lag = max_send_lag
+        # 写协程在发送时才计算消息，按房间缓存当前版本已编码的帧，保证每种消息只编码一次。
+        self._frames: Dict[str, tuple[int, dict[tuple[str, int | None], str]]] = {}
+        self._dropped_total = 0
+        self._evicted_total = 0
+        # 心跳：定期向客户端发送 ping，超时未收到任何消息的连接会被回收。
+        self._heartbeat_interval = heartbeat_interval
+        self._heartbeat_timeout = heartbeat_timeout
+        self._heartbeat_task: asyncio.Task | None = None
+        self._reaped_total = 0
+        # 连接数上限，0 表示不限制。
+        self._max_connections = max_connections
+        self._max_connections_per_room = max_connections_per_room
+        self._max_spectators_per_room = max_spectators_per_room
+        self._rejected_total = 0
+        # 旁观者不进入逐连接的增量通道，而是订阅房间的公开视图：每个版本只构建、编码一次，
+        # 可选延迟 public_view_delay 秒后再推送，用于直播时防止场外信息。
+        self._spectators: Dict[str, Dict[int, RoomConnection]] = {}
+        self._public_views: Dict[str, PublicView] = {}
+        self._public_view_delay = public_view_delay
+        # 已安排、尚未送达的延迟公开视图数；最后一位旁观者离开后，公开视图只保留到这些视图送达为止。
+        self._public_view_pending: Dict[str, int] = {}
+
+    async def start(self) -> None:
+        if self._heartbeat_interval > 0:
+            self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
 
-    async def connect(self, websocket: WebSocket, principal: RoomPrincipal) -> None:
+    async def stop(self) -> None:
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._heartbeat_task
+            self._heartbeat_task = None
+
+    async def connect(
+        self, websocket: WebSocket, principal: RoomPrincipal, *, since: int | None = None
+    ) -> RoomConnection | None:
         await websocket.accept()
+        if self._at_capacity(principal):
+            # 先完成握手再关闭，客户端才能拿到明确的关闭码。
+            self._rejected_total += 1
+            await self._close_quietly(websocket, CLOSE_TOO_MANY_CONNECTIONS)
+            return None
         connection = RoomConnection(websocket=websocket, principal=principal)
-        async with self._lock:
-            self._connections.setdefault(principal.room_id, []).append(connection)
-        # 初次连接立即推送一次完整快照，确保前端状态与服务器同步。
-        await self._send_snapshot(connection)
+        connection.writer = asyncio.create_task(self._write_loop(connection))
+        self._by_socket[id(websocket)] = connection
+        if principal.is_spectator:
+            self._spectators.setdefault(principal.room_id, {})[id(websocket)] = connection
+            try:
+                self._send_public_snapshot(connection)
+            except RoomNotFoundError:
+                # 鉴权之后、连接注册之前房间被回收：与玩家连接一样以 4410 关闭。
+                self._unregister(connection)
+                await self._close_quietly(websocket, CLOSE_ROOM_CLOSED)
+                return None
+            return connection
+        self._connections.setdefault(principal.room_id, {})[id(websocket)] = connection
+        base = None
+        if since is not None:
+            base = self.room_service.snapshot_at(principal.room_id, principal, since)
+        if base is not None:
+            # 断线重连且客户端版本仍在回放缓冲内：以客户端已有的快照为基准，只补发错过的变更。
+            connection.version = since
+            connection.snapshot = base
+            connection.acked_version = since
+            self._enqueue(connection, OutboundMessage(kind=_STATE, enqueued_at=time.monotonic()))
+        else:
+            # 初次连接或客户端落后太多时推送一次完整快照，确保前端状态与服务器同步。
+            self._enqueue(connection, OutboundMessage(kind=_SNAPSHOT, enqueued_at=time.monotonic()))
+        return connection
 
     async def disconnect(self, websocket: WebSocket) -> None:
-        async with self._lock:
-            for room_id, connections in list(self._connections.items()):
-                self._connections[room_id] = [
-                    connection for connection in connections if connection.websocket is not websocket
-                ]
-                if not self._connections[room_id]:
-                    self._connections.pop(room_id, None)
+        connection = self._by_socket.get(id(websocket))
+        if connection is not None:
+            self._unregister(connection)
+
+    def close_room(self, room_id: str) -> None:
+        """房间被回收后断开其全部连接（关闭码 4410），并清理按房间缓存的帧、公开视图与定时器。"""
+
+        connections = [
+            *self._connections.get(room_id, {}).values(),
+            *self._spectators.get(room_id, {}).values(),
+        ]
+        for connection in connections:
+            self._close(connection, CLOSE_ROOM_CLOSED)
+        timer = self._timers.pop(room_id, None)
+        if timer is not None:
+            timer.cancel()
+        self._dirty.discard(room_id)
+        self._frames.pop(room_id, None)
+        self._public_views.pop(room_id, None)
+        self._public_view_pending.pop(room_id, None)
+
+    def handle_room_changed(self, event: RoomChanged) -> None:
+        """事件总线回调：只为本进程持有连接的房间安排广播。"""
+
+        room_id = event.room_id
+        if room_id in self._connections or room_id in self._spectators:
+            self.schedule_broadcast(room_id, flush=event.flush)
+
+    def schedule_broadcast(self, room_id: str, *, flush: bool = False) -> None:
+        """安排一次房间状态广播，调用方无需等待发送完成。
+
+        合并窗口内的多次调用只触发一次广播，发送的是届时最新的状态；
+        flush=True 跳过窗口立即广播，用于轮到下一位投票者等对延迟敏感的场景。
+        """
+
+        if flush or self._coalesce_window <= 0:
+            timer = self._timers.pop(room_id, None)
+            if timer is not None:
+                timer.cancel()
+            self._start_fan_out(room_id)
+            return
+        if room_id in self._timers:
+            return
+        loop = asyncio.get_running_loop()
+        self._timers[room_id] = loop.call_later(self._coalesce_window, self._on_window_elapsed, room_id)
+
+    def _on_window_elapsed(self, room_id: str) -> None:
+        self._timers.pop(room_id, None)
+        self._start_fan_out(room_id)
+
+    def _start_fan_out(self, room_id: str) -> None:
+        if room_id in self._fan_outs:
+            # 正在广播时只做标记，当前广播结束后立即补发一次最新状态，避免同一连接乱序。
+            self._dirty.add(room_id)
+            return
+        self._fan_outs[room_id] = asyncio.create_task(self._fan_out(room_id))
+
+    async def _fan_out(self, room_id: str) -> None:
+        try:
+            while True:
+                self._dirty.discard(room_id)
+                try:
+                    await self.broadcast_state(room_id)
+                except RoomNotFoundError:
+                    break
+                if room_id not in self._dirty:
+                    break
+        finally:
+            self._fan_outs.pop(room_id, None)
 
     async def broadcast_state(self, room_id: str) -> None:
-        connections = await self._connections_for_room(room_id)
-        await asyncio.gather(*(self._send_state_diff(connection) for connection in connections), return_exceptions=True)
+        # 只入队一个“发送最新状态”的标记，具体内容由各连接的写协程在发送时计算。
+        now = time.monotonic()
+        for connection in self._connections_for_room(room_id):
+            self._enqueue(connection, OutboundMessage(kind=_STATE, enqueued_at=now))
+        if room_id in self._spectators:
+            self._publish_public_view(room_id)
 
     async def broadcast_log(self, room_id: str) -> None:
-        connections = await self._connections_for_room(room_id)
-        await asyncio.gather(*(self._send_log_tail(connection) for connection in connections), return_exceptions=True)
+        connections = self._connections_for_room(room_id)
+        frames: dict[str, str] = {}
+        now = time.monotonic()
+        for connection in connections:
+            view_key = connection.principal.view_key
+            frame = frames.get(view_key)
+            if frame is None:
+                payload = self.room_service.snapshot_for(room_id, connection.principal)
+                frame = dumps({"type": "log", "data": payload.get("log_tail", [])}).decode("utf-8")
+                frames[view_key] = frame
+            self._enqueue(connection, OutboundMessage(kind=_FRAME, enqueued_at=now, frame=frame))
 
-    async def handle_client(self, websocket: WebSocket, principal: RoomPrincipal) -> None:
+    async def handle_client(
+        self, websocket: WebSocket, principal: RoomPrincipal, *, since: int | None = None
+    ) -> None:
         try:
-            await self.connect(websocket, principal)
+            connection = await self.connect(websocket, principal, since=since)
+            if connection is None:
+                return
             while True:
                 message = await websocket.receive_json()
-                if message.get("type") == "request_snapshot":
-                    await self._send_snapshot(RoomConnection(websocket=websocket, principal=principal))
+                connection.last_seen = time.monotonic()
+                message_type = message.get("type")
+                if message_type == "request_snapshot" and principal.is_spectator:
+                    self._send_public_snapshot(connection)
+                elif message_type == "request_snapshot":
+                    self._enqueue(
+                        connection, OutboundMessage(kind=_SNAPSHOT, enqueued_at=time.monotonic())
+                    )
+                elif message_type == "ack":
+                    self._record_ack(connection, message.get("version"))
         except WebSocketDisconnect:
+            pass
+        finally:
+            # 无论以何种方式退出都注销连接，避免异常断开的连接残留在注册表中。
             await self.disconnect(websocket)
 
-    async def _connections_for_room(self, room_id: str) -> List[RoomConnection]:
-        async with self._lock:
-            return list(self._connections.get(room_id, []))
+    def metrics(self) -> dict[str, int]:
+        """连接与出站队列相关指标，供 /metrics 暴露。"""
+
+        depths = [len(connection.outbox) for connection in self._by_socket.values()]
+        return {
+            "connections": len(depths),
+            "connection_rooms": len(self._connections),
+            "spectators": sum(len(spectators) for spectators in self._spectators.values()),
+            "connections_reaped_total": self._reaped_total,
+            "connections_rejected_total": self._rejected_total,
+            "send_queue_depth_total": sum(depths),
+            "send_queue_depth_max": max(depths, default=0),
+            "send_dropped_total": self._dropped_total,
+            "slow_consumers_evicted_total": self._evicted_total,
+        }
+
+    def _at_capacity(self, principal: RoomPrincipal) -> bool:
+        if self._max_connections and len(self._by_socket) >= self._max_connections:
+            return True
+        if principal.is_spectator:
+            limit = self._max_spectators_per_room
+            room_connections = self._spectators.get(principal.room_id, {})
+        else:
+            limit = self._max_connections_per_room
+            room_connections = self._connections.get(principal.room_id, {})
+        return bool(limit) and len(room_connections) >= limit
+
+    def _unregister(self, connection: RoomConnection) -> None:
+        socket_id = id(connection.websocket)
+        self._by_socket.pop(socket_id, None)
+        self._stop_writer(connection)
+        room_id = connection.principal.room_id
+        if connection.principal.is_spectator:
+            spectators = self._spectators.get(room_id)
+            if spectators is not None:
+                spectators.pop(socket_id, None)
+                if not spectators:
+                    self._spectators.pop(room_id, None)
+                    # 无人旁观后不再为该房间构建公开视图。仍有延迟视图待送达时先保留，送达后再丢弃：
+                    # 期间重连的旁观者拿到的仍是旧视图；之后重连时首份视图同样要等满延迟，不会看到实时状态。
+                    if not self._public_view_pending.get(room_id):
+                        self._public_views.pop(room_id, None)
+            return
+        room_connections = self._connections.get(room_id)
+        if room_connections is None:
+            return
+        room_connections.pop(socket_id, None)
+        if not room_connections:
+            self._connections.pop(room_id, None)
+            self._frames.pop(room_id, None)
+            self.room_service.release_history(room_id)
+
+    async def _heartbeat_loop(self) -> None:
+        ping = dumps({"type": "ping"}).decode("utf-8")
+        while True:
+            await asyncio.sleep(self._heartbeat_interval)
+            now = time.monotonic()
+            for connection in list(self._by_socket.values()):
+                if now - connection.last_seen > self._heartbeat_timeout:
+                    # 半开连接（如手机休眠）不会再回应，直接回收，避免继续为其编码与发送。
+                    self._reaped_total += 1
+                    self._close(connection, CLOSE_HEARTBEAT_TIMEOUT)
+                else:
+                    self._enqueue(connection, OutboundMessage(kind=_FRAME, enqueued_at=now, frame=ping))
+
+    def _connections_for_room(self, room_id: str) -> List[RoomConnection]:
+        # 复制一份列表，遍历期间连接注销不会影响本次广播。
+        return list(self._connections.get(room_id, {}).values())
+
+    # Outbound queue -----------------------------------------------------
+    def _enqueue(self, connection: RoomConnection, message: OutboundMessage) -> None:
+        if connection.closed:
+            return
+        if message.kind in (_STATE, _SNAPSHOT):
+            # 状态消息只需保留最新一条：旧的状态标记已被新的取代，直接丢弃。
+            for pending in list(connection.outbox):
+                if pending.kind not in (_STATE, _SNAPSHOT):
+                    continue
+                if pending.kind == _SNAPSHOT:
+                    message.kind = _SNAPSHOT
+                # 沿用被取代消息的入队时间，滞后时长从最早未发出的状态算起。
+                message.enqueued_at = min(message.enqueued_at, pending.enqueued_at)
+                connection.outbox.remove(pending)
+                connection.dropped += 1
+                self._dropped_total += 1
+        if self._lag_of(connection, time.monotonic()) > self._max_send_lag:
+            self._evict(connection)
+            return
+        if len(connection.outbox) >= self._send_queue_size:
+            self._evict(connection)
+            return
+        connection.outbox.append(message)
+        connection.wakeup.set()
+
+    async def _write_loop(self, connection: RoomConnection) -> None:
+        try:
+            while not connection.closed:
+                if not connection.outbox:
+                    connection.wakeup.clear()
+                    await connection.wakeup.wait()
+                    continue
+                message = connection.outbox.popleft()
+                frame = self._resolve_frame(connection, message)
+                if frame is not None:
+                    connection.sending_since = message.enqueued_at
+                    await connection.websocket.send_text(frame)
+                    connection.sending_since = None
+        except RoomNotFoundError:
+            pass
+        except Exception:  # pragma: no cover - network scenario
+            # 发送失败说明连接已断开，交给接收循环触发 disconnect 清理。
+            connection.closed = True
+
+    def _lag_of(self, connection: RoomConnection, now: float) -> float:
+        """连接最早一条未送达消息已等待的秒数。"""
+
+        oldest = [connection.outbox[0].enqueued_at] if connection.outbox else []
+        if connection.sending_since is not None:
+            oldest.append(connection.sending_since)
+        return now - min(oldest) if oldest else 0.0
+
+    def _resolve_frame(self, connection: RoomConnection, message: OutboundMessage) -> str | None:
+        if message.kind == _FRAME:
+            return message.frame
+        frames = self._frames_for_room(connection.principal.room_id)
+        if message.kind == _SNAPSHOT:
+            return self._snapshot_frame(connection, frames)
+        return self._state_frame(connection, frames)
+
+    def _evict(self, connection: RoomConnection) -> None:
+        """断开跟不上推送节奏的连接，客户端重连后会重新获得完整快照。"""
+
+        self._evicted_total += 1
+        self._close(connection, CLOSE_SLOW_CONSUMER)
+
+    def _close(self, connection: RoomConnection, code: int) -> None:
+        self._unregister(connection)
+        asyncio.create_task(self._close_quietly(connection.websocket, code))
+
+    def _stop_writer(self, connection: RoomConnection) -> None:
+        connection.closed = True
+        connection.outbox.clear()
+        connection.wakeup.set()
+        if connection.writer is not None and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+
+    async def _close_quietly(self, websocket: WebSocket, code: int) -> None:
+        try:
+            await websocket.close(code=code)
+        except Exception:  # pragma: no cover - network scenario
+            pass
+
+    # Frames -------------------------------------------------------------
+    def _frames_for_room(self, room_id: str) -> dict[tuple[str, int | None], str]:
+        version = self.room_service.room_version(room_id)
+        cached = self._frames.get(room_id)
+        if cached is None or cached[0] != version:
+            cached = (version, {})
+            self._frames[room_id] = cached
+        return cached[1]
+
+    def _record_ack(self, connection: RoomConnection, version: Any) -> None:
+        if not isinstance(version, int):
+            return
+        if connection.acked_version is None or version > connection.acked_version:
+            connection.acked_version = version
+
+    def _is_lagging(self, connection: RoomConnection) -> bool:
+        if connection.version is None:
+            return True
+        acked = connection.acked_version if connection.acked_version is not None else connection.version
+        return connection.version - acked > STATE_DIFF_MAX_LAG
+
+    def _snapshot_frame(
+        self, connection: RoomConnection, frames: dict[tuple[str, int | None], str]
+    ) -> str:
+        room_id = connection.principal.room_id
+        key = (connection.principal.view_key, None)
+        frame = frames.get(key)
+        if frame is None:
+            encoded = self.room_service.encoded_snapshot_for(room_id, connection.principal)
+            version = self.room_service.room_version(room_id)
+            frame = wrap_frame("snapshot", encoded, version=version).decode("utf-8")
+            frames[key] = frame
+        self._mark_sent(connection)
+        # 完整快照视为新的同步起点，重置确认进度。
+        connection.acked_version = connection.version
+        return frame
+
+    def _state_frame(
+        self, connection: RoomConnection, frames: dict[tuple[str, int | None], str]
+    ) -> str | None:
+        """计算连接应收到的状态消息；返回 None 表示该连接已是最新版本。"""
+
+        room_id = connection.principal.room_id
+        version = self.room_service.room_version(room_id)
+        if connection.snapshot is None or self._is_lagging(connection):
+            return self._snapshot_frame(connection, frames)
+        if connection.version == version:
+            return None
+        key = (connection.principal.view_key, connection.version)
+        frame = frames.get(key)
+        if frame is None:
+            payload = self.room_service.snapshot_for(room_id, connection.principal)
+            patch = make_patch(connection.snapshot, payload)
+            if len(patch) > STATE_DIFF_MAX_OPS:
+                return self._snapshot_frame(connection, frames)
+            frame = dumps(
+                {
+                    "type": "state_diff",
+                    "base_version": connection.version,
+                    "version": version,
+                    "patch": patch,
+                }
+            ).decode("utf-8")
+            frames[key] = frame
+        self._mark_sent(connection)
+        return frame
+
+    # Public view --------------------------------------------------------
+    def _public_view_for(self, room_id: str) -> PublicView | None:
+        view = self._public_views.get(room_id)
+        if view is None:
+            if self._public_view_delay > 0:
+                # 有延迟时首份公开视图同样要等满延迟才发布，期间进入的旁观者届时一并收到完整快照。
+                self._publish_public_view(room_id)
+                return None
+            version = self.room_service.room_version(room_id)
+            snapshot = self.room_service.snapshot_for(room_id, _spectator(room_id))
+            view = self._make_public_view(version, snapshot)
+            self._public_views[room_id] = view
+        return view
+
+    def _make_public_view(self, version: int, snapshot: dict[str, Any]) -> PublicView:
+        frame = wrap_frame("snapshot", dumps(snapshot), version=version).decode("utf-8")
+        return PublicView(version=version, snapshot=snapshot, snapshot_frame=frame)
+
+    def _send_public_snapshot(self, connection: RoomConnection) -> None:
+        view = self._public_view_for(connection.principal.room_id)
+        if view is None:
+            return
+        connection.version = view.version
+        self._enqueue(
+            connection,
+            OutboundMessage(kind=_FRAME, enqueued_at=time.monotonic(), frame=view.snapshot_frame),
+        )
+
+    def _publish_public_view(self, room_id: str) -> None:
+        # 在变更发生时就取下当前版本的快照；快照字典只读，延迟期间房间继续变化也不受影响。
+        version = self.room_service.room_version(room_id)
+        snapshot = self.room_service.snapshot_for(room_id, _spectator(room_id))
+        if self._public_view_delay > 0:
+            loop = asyncio.get_running_loop()
+            loop.call_later(self._public_view_delay, self._deliver_delayed_public_view, room_id, version, snapshot)
+            self._public_view_pending[room_id] = self._public_view_pending.get(room_id, 0) + 1
+        else:
+            self._deliver_public_view(room_id, version, snapshot)
+
+    def _deliver_delayed_public_view(self, room_id: str, version: int, snapshot: dict[str, Any]) -> None:
+        pending = self._public_view_pending.get(room_id, 0) - 1
+        if pending > 0:
+            self._public_view_pending[room_id] = pending
+        else:
+            self._public_view_pending.pop(room_id, None)
+        if room_id in self._spectators:
+            self._deliver_public_view(room_id, version, snapshot)
+        elif not pending:
+            self._public_views.pop(room_id, None)
+
+    def _deliver_public_view(self, room_id: str, version: int, snapshot: dict[str, Any]) -> None:
+        previous = self._public_views.get(room_id)
+        if previous is not None and version <= previous.version:
+            return
+        spectators = self._spectators.get(room_id)
+        if not spectators:
+            return
+        view = self._make_public_view(version, snapshot)
+        self._public_views[room_id] = view
+        diff_frame = None
+        patch = make_patch(previous.snapshot, snapshot) if previous is not None else []
+        if previous is not None and len(patch) <= STATE_DIFF_MAX_OPS:
+            diff_frame = dumps(
+                {
+                    "type": "state_diff",
+                    "base_version": previous.version,
+                    "version": version,
+                    "patch": patch,
+                }
+            ).decode("utf-8")
+        now = time.monotonic()
+        for connection in list(spectators.values()):
+            # 旁观者不回传确认，按发送顺序推断其版本：与上一版公开视图一致时发增量，否则发完整快照。
+            if diff_frame is not None and connection.version == previous.version:
+                frame = diff_frame
+            else:
+                frame = view.snapshot_frame
+            connection.version = version
+            self._enqueue(connection, OutboundMessage(kind=_FRAME, enqueued_at=now, frame=frame))
 
-    async def _send_snapshot(self, connection: RoomConnection) -> None:
-        payload = self.room_service.snapshot_for(connection.principal.room_id, connection.principal)
-        await connection.websocket.send_json({"type": "snapshot", "data": payload})
+    def _mark_sent(self, connection: RoomConnection) -> None:
+        room_id = connection.principal.room_id
+        connection.version = self.room_service.room_version(room_id)
+        connection.snapshot = self.room_service.snapshot_for(room_id, connection.principal)
 
-    async def _send_state_diff(self, connection: RoomConnection) -> None:
-        payload = self.room_service.snapshot_for(connection.principal.room_id, connection.principal)
-        await connection.websocket.send_json({"type": "state_diff", "data": payload})
 
-    async def _send_log_tail(self, connection: RoomConnection) -> None:
-        payload = self.room_service.snapshot_for(connection.principal.room_id, connection.principal)
-        await connection.websocket.send_json({"type": "log", "data": payload.get("log_tail", [])})
+def _spectator(room_id: str) -> RoomPrincipal:
+    return RoomPrincipal(room_id=room_id, player_id=None, seat=None, is_host=False)
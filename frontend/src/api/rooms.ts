@@ -58,6 +58,16 @@ export async function joinRoom(code: string, name?: string) {
   return data;
 }
 
+export async function spectateRoom(code: string) {
+  const response = await apiClient.post(`/rooms/spectate`, { code });
+  const data = response.data as {
+    room_id: string;
+    spectator_token: string;
+  };
+  setAuthToken(data.spectator_token);
+  return data;
+}
+
 export async function updateSeat(roomId: string, seat: number, options: { playerId?: string } = {}) {
   const payload: Record<string, unknown> = { seat };
   if (options.playerId) {
@@ -152,7 +162,7 @@ export async function sendVote(
     payload.player_id = options.playerId;
   }
   const response = await apiClient.post(`/rooms/${roomId}/vote`, payload);
-  return response.data as { id: string };
+  return response.data as { id: number };
 }
 
 export async function updatePlayerStatus(
@@ -192,5 +202,5 @@ export async function sendNightAction(
     target: options.target,
     payload: options.payload ?? {}
   });
-  return response.data as { id: string };
+  return response.data as { id: number };
 }
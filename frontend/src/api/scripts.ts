@@ -0,0 +1,8 @@
+import { apiClient } from "./client";
+import type { ScriptSummary } from "./types";
+
+export async function fetchScript(scriptId: string) {
+  // 接口返回 ETag 且要求重新验证，浏览器会自动携带 If-None-Match 复用缓存。
+  const response = await apiClient.get(`/scripts/${encodeURIComponent(scriptId)}`);
+  return response.data as ScriptSummary;
+}
@@ -2,6 +2,7 @@
 export interface RoomSnapshot {
   room: {
     id: string;
+    version?: number;
     phase: string;
     day: number;
     night: number;
@@ -11,7 +12,7 @@ export interface RoomSnapshot {
   };
   players: Array<RoomPlayer>;
   nominations: Array<RoomNomination>;
-  script: ScriptSummary;
+  script: ScriptReference;
   pending_assignments?: Record<string, PendingAssignmentView>;
   pending_assignments_meta?: {
     team_counts: Record<string, number>;
@@ -69,11 +70,18 @@ export interface ScriptRoleInfo {
   attachment_slots?: Array<RoleAttachmentSlot>;
 }
 
+// 快照中只包含剧本引用，完整剧本通过 GET /api/scripts/{id} 获取。
+export interface ScriptReference {
+  id: string;
+  version: string;
+  team_counts: Record<string, number>;
+}
+
 export interface ScriptSummary {
   id: string;
   name: string;
   version: string;
-  team_counts: Record<string, number>;
+  team_counts?: Record<string, number>;
   team_distribution: Record<number, Record<string, number>>;
   roles: Array<ScriptRoleInfo>;
   rules?: Record<string, unknown>;
@@ -2,7 +2,7 @@ import { FormEvent, useEffect, useState } from "react";
 import { useNavigate } from "react-router-dom";
 
 import { loginUser, logoutUser, registerUser, fetchCurrentUser } from "../api/auth";
-import { createRoom, fetchSnapshot, joinRoom } from "../api/rooms";
+import { createRoom, fetchSnapshot, joinRoom, spectateRoom } from "../api/rooms";
 import { useAuthStore } from "../store/authStore";
 import { useRoomStore } from "../store/roomStore";
 import { clearAuthToken } from "../api/client";
@@ -112,7 +112,7 @@ export function JoinPage() {
       } catch (error) {
         console.error("prefetch host snapshot failed", error);
       }
-      setCreateMessage(`房间创建成功，加入码：${data.join_code}`);
+      setCreateMessage(`房间创建成功，加入码：${data.join_code}，观战房间码：${data.room_code}`);
       setScriptId("");
       setHostDisplayName("");
       navigate(`/room/${data.room_id}`);
@@ -146,6 +146,26 @@ export function JoinPage() {
     }
   };
 
+  const handleSpectateRoom = async () => {
+    if (!joinCode.trim()) {
+      setJoinMessage("请输入主持人分享的观战房间码。");
+      return;
+    }
+    setJoinBusy(true);
+    setJoinMessage(null);
+    try {
+      const response = await spectateRoom(joinCode.trim());
+      // 旁观者的快照由 WebSocket 公开频道推送，无需预取。
+      connect({ roomId: response.room_id, token: response.spectator_token, seat: null });
+      navigate(`/room/${response.room_id}`);
+    } catch (error) {
+      console.error("spectate room failed", error);
+      setJoinMessage("进入观战失败，请检查观战房间码。");
+    } finally {
+      setJoinBusy(false);
+    }
+  };
+
   return (
     <div className="min-h-screen bg-slate-900 text-slate-100">
       <div className="mx-auto flex max-w-6xl flex-col gap-10 px-6 py-10">
@@ -327,6 +347,14 @@ export function JoinPage() {
                 >
                   加入房间
                 </button>
+                <button
+                  type="button"
+                  onClick={handleSpectateRoom}
+                  className="w-full rounded border border-emerald-600 py-2 font-semibold hover:border-emerald-400 disabled:opacity-50"
+                  disabled={joinBusy}
+                >
+                  以旁观者身份观战（填写观战房间码）
+                </button>
               </form>
               {joinMessage && <p className="mt-3 text-sm text-slate-300">{joinMessage}</p>}
             </div>
@@ -27,6 +27,7 @@ import type {
     ScriptRoleInfo
 } from "../api/types";
 import {useRoomStore} from "../store/roomStore";
+import {useScript} from "../store/scriptStore";
 
 const ROLE_TEAM_ORDER = ["townsfolk", "outsider", "minion", "demon"];
 const TEAM_LABEL: Record<string, string> = {
@@ -291,7 +292,7 @@ export function RoomPage() {
     const myStatus = me ? describePlayerStatus(me, isHost) : "";
     const myAttachments = me?.role_attachments ?? [];
 
-    const scriptInfo = snapshot?.script;
+    const scriptInfo = useScript(snapshot?.script);
     const scriptRoles = scriptInfo?.roles ?? [];
     const roleSections = useMemo(() => {
         if (!scriptRoles.length) {
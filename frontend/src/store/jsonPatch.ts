@@ -0,0 +1,51 @@
+// 后端 state_diff 使用的 JSON Patch 子集（add / remove / replace）。
+export interface PatchOperation {
+  op: "add" | "remove" | "replace";
+  path: string;
+  value?: unknown;
+}
+
+function decodeToken(token: string) {
+  return token.replace(/~1/g, "/").replace(/~0/g, "~");
+}
+
+// 沿路径浅拷贝后修改，保证未变化的子树引用不变，便于 React 跳过重渲染。
+function applyAt(node: unknown, tokens: string[], operation: PatchOperation): unknown {
+  const [head, ...rest] = tokens;
+  if (Array.isArray(node)) {
+    const copy = node.slice();
+    const index = head === "-" ? copy.length : Number(head);
+    if (rest.length === 0) {
+      if (operation.op === "remove") {
+        copy.splice(index, 1);
+      } else if (operation.op === "add") {
+        copy.splice(index, 0, operation.value);
+      } else {
+        copy[index] = operation.value;
+      }
+      return copy;
+    }
+    copy[index] = applyAt(copy[index], rest, operation);
+    return copy;
+  }
+  const record = { ...(node as Record<string, unknown>) };
+  if (rest.length === 0) {
+    if (operation.op === "remove") {
+      delete record[head];
+    } else {
+      record[head] = operation.value;
+    }
+    return record;
+  }
+  record[head] = applyAt(record[head], rest, operation);
+  return record;
+}
+
+export function applyPatch<T>(document: T, operations: PatchOperation[]): T {
+  let result: unknown = document;
+  for (const operation of operations) {
+    const tokens = operation.path.split("/").slice(1).map(decodeToken);
+    result = tokens.length === 0 ? operation.value : applyAt(result, tokens, operation);
+  }
+  return result as T;
+}
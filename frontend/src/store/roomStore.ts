@@ -1,8 +1,13 @@
 import { create } from "zustand";
 
 import type { RoomCredentials, RoomSnapshot } from "../api/types";
+import { applyPatch, type PatchOperation } from "./jsonPatch";
 
 function deriveStateFromSnapshot(snapshot: RoomSnapshot, state: RoomState) {
+  // REST 返回的快照可能比 WS 推送的更旧，按版本号丢弃过期数据。
+  if (state.snapshot && (snapshot.room.version ?? 0) < (state.snapshot.room.version ?? 0)) {
+    return {};
+  }
   const me = snapshot.players.find((player) => player.me);
   if (me && state.credentials) {
     return { snapshot, credentials: { ...state.credentials, seat: me.seat } };
@@ -23,50 +28,138 @@ interface RoomState {
 }
 
 let socket: WebSocket | null = null;
+// WebSocket 无法建立时（代理、企业网络）退回的 SSE 连接。
+let eventSource: EventSource | null = null;
+
+function sendMessage(message: Record<string, unknown>) {
+  if (socket && socket.readyState === WebSocket.OPEN) {
+    socket.send(JSON.stringify(message));
+  }
+}
+
+function closeConnections() {
+  if (socket) {
+    socket.close();
+    socket = null;
+  }
+  if (eventSource) {
+    eventSource.close();
+    eventSource = null;
+  }
+}
+
+interface ServerMessage {
+  type: string;
+  version?: number;
+  base_version?: number;
+  data?: unknown;
+  patch?: PatchOperation[];
+  message?: string;
+}
+
+// WS 与 SSE 共用的消息处理；SSE 是单向通道，回复与重新同步由调用方决定。
+function handleMessage(
+  data: ServerMessage,
+  reply: (message: Record<string, unknown>) => void,
+  resync: () => void
+) {
+  const { setSnapshot, setError } = useRoomStore.getState();
+  if (data.type === "snapshot") {
+    setSnapshot(data.data as RoomSnapshot);
+    reply({ type: "ack", version: data.version });
+  } else if (data.type === "state_diff") {
+    const current = useRoomStore.getState().snapshot;
+    if (!current || current.room.version !== data.base_version) {
+      // 本地基准版本与服务器不一致，重新获取完整快照。
+      resync();
+      return;
+    }
+    setSnapshot(applyPatch(current, data.patch ?? []));
+    reply({ type: "ack", version: data.version });
+  } else if (data.type === "ping") {
+    reply({ type: "pong" });
+  } else if (data.type === "error") {
+    setError(data.message ?? "Unknown error");
+  }
+}
 
-export const useRoomStore = create<RoomState>((set) => ({
+function openEventStream(credentials: RoomCredentials) {
+  const source = new EventSource(
+    `/api/rooms/${credentials.roomId}/events?token=${encodeURIComponent(credentials.token)}`
+  );
+  eventSource = source;
+  source.addEventListener("open", () => {
+    useRoomStore.setState({ status: "connected" });
+  });
+  source.addEventListener("message", (event) => {
+    try {
+      handleMessage(JSON.parse(event.data), () => undefined, () => {
+        // 新开的流不带 Last-Event-ID，首条消息即为完整快照。
+        source.close();
+        if (eventSource === source) {
+          openEventStream(credentials);
+        }
+      });
+    } catch (error) {
+      console.error("Invalid event stream message", error);
+    }
+  });
+  source.addEventListener("error", () => {
+    // EventSource 会自动携带 Last-Event-ID 重连，这里只同步连接状态。
+    useRoomStore.setState({ status: source.readyState === EventSource.CLOSED ? "disconnected" : "connecting" });
+  });
+}
+
+export const useRoomStore = create<RoomState>((set, get) => ({
   snapshot: null,
   status: "disconnected",
   credentials: null,
   lastError: null,
   connect: (credentials: RoomCredentials) => {
-    if (socket) {
-      socket.close();
-      socket = null;
-    }
+    closeConnections();
     // 重新建立连接前重置状态，避免旧的房间信息残留。
     set({ status: "connecting", credentials, lastError: null });
     const protocol = window.location.protocol === "https:" ? "wss" : "ws";
-    const wsUrl = `${protocol}://${window.location.host}/ws/rooms/${credentials.roomId}?token=${credentials.token}`;
-    socket = new WebSocket(wsUrl);
-    socket.addEventListener("open", () => {
+    let wsUrl = `${protocol}://${window.location.host}/ws/rooms/${credentials.roomId}?token=${credentials.token}`;
+    // 重连同一房间时带上已持有的快照版本，服务器只补发错过的增量。
+    const previous = get().snapshot;
+    if (previous && previous.room.id === credentials.roomId && previous.room.version !== undefined) {
+      wsUrl += `&since=${previous.room.version}`;
+    }
+    const current = new WebSocket(wsUrl);
+    socket = current;
+    let opened = false;
+    current.addEventListener("open", () => {
+      opened = true;
       set({ status: "connected" });
     });
-    socket.addEventListener("message", (event) => {
+    current.addEventListener("message", (event) => {
       try {
-        const data = JSON.parse(event.data.toString());
-        if (data.type === "snapshot" || data.type === "state_diff") {
-          set((state) => deriveStateFromSnapshot(data.data as RoomSnapshot, state));
-        } else if (data.type === "error") {
-          set({ lastError: data.message ?? "Unknown error" });
-        }
+        handleMessage(JSON.parse(event.data.toString()), sendMessage, () =>
+          sendMessage({ type: "request_snapshot" })
+        );
       } catch (error) {
         console.error("Invalid websocket message", error);
       }
     });
-    socket.addEventListener("close", () => {
-      set({ status: "disconnected" });
+    current.addEventListener("close", (event) => {
+      if (socket !== current) {
+        return;
+      }
       socket = null;
+      // 握手阶段即被网络中断（而非服务器按关闭码拒绝）时改用 SSE。
+      if (!opened && event.code === 1006 && get().credentials === credentials) {
+        openEventStream(credentials);
+        return;
+      }
+      set({ status: "disconnected" });
     });
-    socket.addEventListener("error", () => {
+    current.addEventListener("error", () => {
       set({ lastError: "Connection error" });
     });
   },
   disconnect: () => {
-    if (socket) {
-      socket.close();
-      socket = null;
-    }
+    closeConnections();
     set({ status: "disconnected", credentials: null });
   },
   setSnapshot: (snapshot: RoomSnapshot) => set((state) => deriveStateFromSnapshot(snapshot, state)),
@@ -0,0 +1,58 @@
+import { useEffect, useMemo } from "react";
+import { create } from "zustand";
+
+import { fetchScript } from "../api/scripts";
+import type { ScriptReference, ScriptSummary } from "../api/types";
+
+function scriptKey(reference: { id: string; version: string }) {
+  return `${reference.id}@${reference.version}`;
+}
+
+// 按剧本 ID 与版本缓存完整剧本，同一剧本在整个会话中只请求一次。
+interface ScriptState {
+  scripts: Record<string, ScriptSummary>;
+  pending: Record<string, boolean>;
+  load: (reference: ScriptReference) => void;
+}
+
+export const useScriptStore = create<ScriptState>((set, get) => ({
+  scripts: {},
+  pending: {},
+  load: (reference: ScriptReference) => {
+    const key = scriptKey(reference);
+    if (get().scripts[key] || get().pending[key]) {
+      return;
+    }
+    set((state) => ({ pending: { ...state.pending, [key]: true } }));
+    fetchScript(reference.id)
+      .then((script) => {
+        set((state) => ({ scripts: { ...state.scripts, [scriptKey(script)]: script } }));
+      })
+      .catch((error: unknown) => {
+        console.error("Failed to fetch script", error);
+      })
+      .finally(() => {
+        set((state) => {
+          const pending = { ...state.pending };
+          delete pending[key];
+          return { pending };
+        });
+      });
+  }
+}));
+
+// 返回快照所引用的完整剧本，并合并当前人数对应的阵营配置。
+export function useScript(reference: ScriptReference | undefined): ScriptSummary | undefined {
+  const load = useScriptStore((state) => state.load);
+  const script = useScriptStore((state) => (reference ? state.scripts[scriptKey(reference)] : undefined));
+  useEffect(() => {
+    if (reference) {
+      load(reference);
+    }
+  }, [load, reference?.id, reference?.version]);
+  const teamCounts = reference?.team_counts;
+  return useMemo(
+    () => (script && teamCounts ? { ...script, team_counts: teamCounts } : undefined),
+    [script, teamCounts]
+  );
+}
@@ -40,11 +40,18 @@ export interface ScriptRoleInfo {
   attachment_slots?: RoleAttachmentSlot[];
 }
 
+// 快照中只包含剧本引用，完整剧本通过 GET /api/scripts/{id} 获取。
+export interface ScriptReference {
+  id: string;
+  version: string;
+  team_counts: Record<string, number>;
+}
+
 export interface ScriptSummary {
   id: string;
   name: string;
   version: string;
-  team_counts: Record<string, number>;
+  team_counts?: Record<string, number>;
   team_distribution: Record<number, Record<string, number>>;
   roles: ScriptRoleInfo[];
   rules?: Record<string, unknown>;
@@ -101,6 +108,7 @@ export interface ExecutionRecordView {
 export interface SnapshotPayload {
   room: {
     id: string;
+    version?: number;
     phase: string;
     day: number;
     night: number;
@@ -121,7 +129,7 @@ export interface SnapshotPayload {
     votes: Array<{ voter: number; player_id: string; value: boolean }>;
     manual_total?: number | null;
   }>;
-  script: ScriptSummary;
+  script: ScriptReference;
   pending_assignments?: Record<string, PendingAssignmentView>;
   pending_assignments_meta?: {
     team_counts: Record<string, number>;